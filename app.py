@@ -15,7 +15,7 @@ except ImportError:
 import os
 import sys
 import logging
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, jsonify, request, send_from_directory, current_app
 from flask_cors import CORS
 from datetime import datetime
 
@@ -29,10 +29,16 @@ logger = logging.getLogger(__name__)
 logger.info("环境变量文件加载成功")
 
 # 導入配置和管理器
-from config import get_app_config, get_app_info
+from config import get_app_config, get_app_info, get_queue_config
 from database_manager import get_database_manager, reset_database_manager
 from storage_management import register_storage_routes
 from app_utils import discover_and_register_blueprints
+from services.job_queue import JobQueue
+from services.download_cache import download_cache
+from services.transcription_cache import transcription_cache
+from services.file_index import file_index
+from services.font_registry import font_registry
+from services.database_logger import database_logger
 
 # 重置数据库管理器以使用新的环境变量
 reset_database_manager()
@@ -51,6 +57,24 @@ def create_app():
         CORS(app, origins=config.security_config['cors_origins'])
         logger.info(f"CORS已啟用 - 允許來源: {config.security_config['cors_origins']}")
     
+    # 初始化任務隊列（queue_task_wrapper 通過 current_app.queue_task 使用）
+    queue_config = get_queue_config()
+    job_queue = JobQueue(
+        app,
+        max_queue_length=queue_config['max_queue_length'],
+        workers=queue_config['workers']
+    )
+    job_queue.start()
+    app.job_queue = job_queue
+    app.queue_task = job_queue.queue_task
+    
+    # 預加載 Whisper 模型（WHISPER_PRELOAD=true 時於後台線程加載）
+    try:
+        from services.whisper_models import preload_whisper_model_async
+        preload_whisper_model_async()
+    except Exception as e:
+        logger.warning(f"Whisper模型預加載失敗: {e}")
+    
     # 註冊路由
     register_routes(app)
     
@@ -89,6 +113,16 @@ def create_app():
     except Exception as e:
         logger.error(f"動態藍圖註冊失敗: {e}")
     
+    # 後台建立 /nca/files 的文件索引，避免首個請求掃描 output/
+    file_index.build_async()
+    
+    # 後台載入字體索引，字幕任務的字體檢查只查內存
+    font_registry.load_async()
+    
+    # 後台對賬存儲用量賬本，/api/v1/storage/usage 只讀賬本
+    from services.storage_manager import storage_manager
+    storage_manager.start_usage_reconciler()
+    
     # 初始化數據庫（可選）
     try:
         from database_manager import get_database_manager, init_database_tables
@@ -160,6 +194,12 @@ def register_routes(app):
                     'environment': app_info['environment']
                 },
                 'database': db_status,
+                'queue': current_app.job_queue.get_stats(),
+                'download_cache': download_cache.get_stats(),
+                'transcription_cache': transcription_cache.get_stats(),
+                'file_index': file_index.get_stats(),
+                'font_registry': font_registry.get_stats(),
+                'database_logger': database_logger.get_stats(),
                 'uptime': 'running'
             }
             
@@ -18,6 +18,7 @@
 
 from flask import request, jsonify, current_app
 from functools import wraps
+from contextlib import contextmanager
 import jsonschema
 import os
 import json
@@ -60,8 +61,28 @@ def log_job_status(job_id, data):
     with open(job_file, 'w') as f:
         json.dump(data, f, indent=2)
 
+@contextmanager
+def timed_stage(timings, stage):
+    """
+    Record the wall time of a pipeline stage in seconds
+    
+    The stage is recorded even when the block raises, and a stage timed in
+    several blocks accumulates their total.
+    
+    Args:
+        timings (dict or None): Stage name -> seconds; nothing is recorded when None
+        stage (str): Stage name
+    """
+    start_time = time.time()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[stage] = round(timings.get(stage, 0) + time.time() - start_time, 3)
+
 def queue_task_wrapper(bypass_queue=False):
     def decorator(f):
+        @wraps(f)
         def wrapper(*args, **kwargs):
             return current_app.queue_task(bypass_queue=bypass_queue)(f)(*args, **kwargs)
         return wrapper
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+比較 ass_toolkit 五種字幕樣式生成 ASS 事件的耗時
+用法: python benchmark_caption_styles.py [轉錄小時數] [每段詞數] [替換詞條數]
+"""
+
+import sys
+import time
+import random
+import logging
+
+WORDS_PER_SECOND = 2.5
+
+VOCABULARY = [
+    'the', 'video', 'caption', 'today', 'we', 'are', 'going', 'to', 'talk', 'about',
+    'performance', 'subtitle', 'render', 'quick', 'brown', 'fox', 'jumps', 'over', 'lazy', 'dog',
+]
+
+def build_transcript(hours, words_per_segment):
+    """生成帶詞級時間戳的模擬轉錄結果，格式與 generate_transcription 相同"""
+    rng = random.Random(42)
+    total_words = int(hours * 3600 * WORDS_PER_SECOND)
+    segments = []
+    now = 0.0
+    for offset in range(0, total_words, words_per_segment):
+        words = []
+        for _ in range(min(words_per_segment, total_words - offset)):
+            duration = rng.uniform(0.2, 0.6)
+            words.append({'word': ' ' + rng.choice(VOCABULARY), 'start': now, 'end': now + duration})
+            now += duration
+        segments.append({
+            'start': words[0]['start'],
+            'end': words[-1]['end'],
+            'text': ''.join(w['word'] for w in words),
+            'words': words
+        })
+    return {'segments': segments}, total_words
+
+def build_replace_dict(count):
+    """前幾條命中詞表，其餘為不會命中的詞，模擬用戶的替換清單"""
+    replace_dict = {word: word.upper() for word in VOCABULARY[:min(count, 5)]}
+    for i in range(count - len(replace_dict)):
+        replace_dict[f'term{i}'] = f'TERM{i}'
+    return replace_dict
+
+def main():
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else 2
+    words_per_segment = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    replace_count = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+
+    # 處理函數每次調用都會記錄日誌，避免輸出干擾計時
+    logging.disable(logging.INFO)
+    from services.ass_toolkit import STYLE_HANDLERS, format_dialogue
+
+    transcript, total_words = build_transcript(hours, words_per_segment)
+    replace_dict = build_replace_dict(replace_count)
+    resolution = (1920, 1080)
+
+    print(f"轉錄: {hours} 小時, {total_words} 詞, {len(transcript['segments'])} 段, 替換詞條 {len(replace_dict)}")
+    print(f"{'樣式':<16}{'每行詞數':>8}{'耗時':>10}{'事件數':>10}{'輸出大小':>12}")
+    print("-" * 56)
+    for style, handler in STYLE_HANDLERS.items():
+        for max_words_per_line in (0, 5):
+            style_options = {'font_size': None, 'max_words_per_line': max_words_per_line, 'all_caps': False}
+            events = 0
+            size = 0
+            # 處理函數是生成器，計時包含事件生成與序列化為 Dialogue 行
+            start_time = time.perf_counter()
+            for event in handler(transcript, style_options, replace_dict, resolution):
+                size += len(format_dialogue(event)) + 1
+                events += 1
+            elapsed = time.perf_counter() - start_time
+            print(f"{style:<16}{max_words_per_line:>8}{elapsed:>9.3f}s{events:>10}{size / 1024 / 1024:>10.2f}MB")
+
+if __name__ == '__main__':
+    main()
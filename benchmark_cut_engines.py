@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+比較 /v1/video/cut 各種切割引擎的耗時
+用法: python benchmark_cut_engines.py [影片秒數] [切割段數] [影片路徑]
+未指定影片路徑時用 lavfi 生成 1280x720 30fps 的測試影片
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import subprocess
+import functools
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+def create_test_video(path, duration):
+    """用 lavfi 生成帶音軌的測試影片"""
+    cmd = [
+        'ffmpeg', '-y',
+        '-f', 'lavfi', '-i', f'testsrc2=size=1280x720:rate=30:duration={duration}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration}',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-g', '60',
+        '-c:a', 'aac', '-shortest',
+        path
+    ]
+    subprocess.run(cmd, check=True, capture_output=True)
+
+def get_duration(path):
+    """用 ffprobe 讀取影片時長（秒）"""
+    result = subprocess.run([
+        'ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+        '-of', 'default=noprint_wrappers=1:nokey=1', path
+    ], check=True, capture_output=True, text=True)
+    return float(result.stdout)
+
+def serve_directory(directory):
+    """在後台線程中以 HTTP 提供目錄，cut_media 只接受 URL"""
+    handler = functools.partial(SimpleHTTPRequestHandler, directory=directory)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def build_cuts(duration, count):
+    """在影片中均勻分佈 count 段 1 秒的切割"""
+    step = duration / (count + 1)
+    cuts = []
+    for i in range(1, count + 1):
+        start = step * i
+        cuts.append({"start": f"{start:.3f}", "end": f"{start + 1:.3f}"})
+    return cuts
+
+def main():
+    duration = int(sys.argv[1]) if len(sys.argv) > 1 else 120
+    cut_count = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    clip_path = sys.argv[3] if len(sys.argv) > 3 else None
+
+    work_dir = tempfile.mkdtemp(prefix='cut_bench_')
+    os.environ['STORAGE_UPLOAD_FOLDER'] = os.path.join(work_dir, 'storage')
+    os.environ['DOWNLOAD_CACHE_ENABLED'] = 'false'
+
+    from services.v1.video.cut import cut_media
+
+    try:
+        source_dir = os.path.join(work_dir, 'source')
+        os.makedirs(source_dir)
+        source_name = 'input' + (os.path.splitext(clip_path)[1] if clip_path else '.mp4')
+        if clip_path:
+            shutil.copy(clip_path, os.path.join(source_dir, source_name))
+            duration = get_duration(clip_path)
+            print(f"使用影片 {clip_path} ({duration:.1f} 秒)")
+        else:
+            print(f"生成 {duration} 秒測試影片...")
+            create_test_video(os.path.join(source_dir, source_name), duration)
+
+        server = serve_directory(source_dir)
+        video_url = f"http://127.0.0.1:{server.server_address[1]}/{source_name}"
+        cuts = build_cuts(duration, cut_count)
+
+        variants = [
+            ('exact / segments', {'accuracy': 'exact', 'engine': 'segments'}),
+            ('exact / filter', {'accuracy': 'exact', 'engine': 'filter'}),
+            ('smart', {'accuracy': 'smart'}),
+            ('fast', {'accuracy': 'fast'}),
+        ]
+
+        print(f"切割段數: {cut_count}")
+        print("-" * 40)
+        for index, (name, options) in enumerate(variants):
+            start_time = time.time()
+            output_filename, input_filename = cut_media(video_url, cuts, job_id=f"bench{index}", **options)
+            elapsed = time.time() - start_time
+            print(f"{name:<20} {elapsed:8.2f}s  {os.path.getsize(output_filename) / 1024 / 1024:8.2f} MB")
+            os.remove(output_filename)
+            os.remove(input_filename)
+
+        server.shutdown()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
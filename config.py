@@ -60,6 +60,12 @@ class AppConfig:
             'compression_quality': int(os.getenv('STORAGE_COMPRESSION_QUALITY', '85'))
         }
         
+        # 任務隊列配置
+        self.queue_config = {
+            'max_queue_length': int(os.getenv('MAX_QUEUE_LENGTH', '0')),  # 0 表示不限制
+            'workers': int(os.getenv('QUEUE_WORKERS', '2'))
+        }
+        
         # 日誌配置
         self.logging_config = {
             'level': os.getenv('LOG_LEVEL', 'INFO'),
@@ -184,6 +190,10 @@ class AppConfig:
                 'allowed_extensions': len(self.storage_config['allowed_extensions']),
                 'cleanup_days': self.storage_config['cleanup_days']
             },
+            'queue': {
+                'max_queue_length': self.queue_config['max_queue_length'],
+                'workers': self.queue_config['workers']
+            },
             'security': {
                 'cors_enabled': self.security_config['cors_enabled'],
                 'rate_limit_enabled': self.security_config['rate_limit_enabled']
@@ -208,6 +218,10 @@ def get_storage_config() -> Dict[str, Any]:
     """獲取存儲配置"""
     return get_app_config().storage_config
 
+def get_queue_config() -> Dict[str, Any]:
+    """獲取任務隊列配置"""
+    return get_app_config().queue_config
+
 def get_app_info() -> Dict[str, Any]:
     """獲取應用信息"""
     return get_app_config().get_app_info()
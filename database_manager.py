@@ -11,22 +11,62 @@ import pymysql
 from typing import Optional, Dict, Any, List
 from contextlib import contextmanager
 import time
-from threading import Lock
+from threading import Lock, Condition
 
 # 配置日誌
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class PoolTimeoutError(Exception):
+    """等待連接池空閒連接超時"""
+    pass
+
+# 連接在此秒數內使用過則視為存活，借出時不再ping
+DB_POOL_PING_INTERVAL = float(os.getenv('DB_POOL_PING_INTERVAL', '30'))
+
+# 這些錯誤說明連接本身已不可用，歸還時直接關閉而不放回池中
+_BROKEN_CONNECTION_ERRORS = (pymysql.err.OperationalError, pymysql.err.InterfaceError)
+
 class DatabaseManager:
     """統一的MySQL數據庫管理器"""
     
     def __init__(self):
-        self.connection_pool = []
-        self.pool_size = 5
+        self.connection_pool = []  # 空閒連接（後進先出）
         self.pool_lock = Lock()
+        self._pool_available = Condition(self.pool_lock)
         self.config = self._load_config()
+        self.pool_size, self.pool_timeout, self.pool_recycle = self._load_pool_config()
         self.is_connected = False
         
+        # 連接元數據：創建時間和最後使用時間（monotonic）
+        self._created_at = {}
+        self._last_used = {}
+        self._open_count = 0  # 已打開的連接數（空閒 + 借出）
+        self._in_use = 0
+        self._stats = {
+            'created': 0,
+            'recycled': 0,
+            'discarded': 0,
+            'pings': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0
+        }
+        
+    def _load_pool_config(self):
+        """從 config.AppConfig.database_config 讀取 DB_POOL_SIZE / DB_POOL_TIMEOUT / DB_POOL_RECYCLE"""
+        try:
+            from config import get_database_config
+            db_config = get_database_config()
+            pool_size = db_config['pool_size']
+            pool_timeout = db_config['pool_timeout']
+            pool_recycle = db_config['pool_recycle']
+        except Exception as e:
+            logger.warning(f"讀取連接池配置失敗，使用默認值: {e}")
+            pool_size, pool_timeout, pool_recycle = 10, 30, 3600
+        return max(int(pool_size), 1), float(pool_timeout), float(pool_recycle)
+        
     def _load_config(self) -> Dict[str, Any]:
         """加載數據庫配置"""
         config = {
@@ -67,61 +107,153 @@ class DatabaseManager:
             logger.error(f"創建MySQL連接失敗: {e}")
             raise
     
+    def _count(self, key):
+        with self.pool_lock:
+            self._stats[key] += 1
+    
+    def _register(self, connection):
+        now = time.monotonic()
+        self._created_at[connection] = now
+        self._last_used[connection] = now
+        self._count('created')
+    
+    def _close(self, connection):
+        """關閉連接（在鎖外調用）"""
+        self._created_at.pop(connection, None)
+        self._last_used.pop(connection, None)
+        try:
+            connection.close()
+        except:
+            pass
+    
     def initialize_pool(self) -> bool:
         """初始化連接池"""
         try:
             with self.pool_lock:
-                # 清空現有連接池
-                for conn in self.connection_pool:
-                    try:
-                        conn.close()
-                    except:
-                        pass
+                # 清空現有空閒連接，借出中的連接歸還後照常回池
+                stale = list(self.connection_pool)
                 self.connection_pool.clear()
-                
-                # 創建新連接池
-                for i in range(self.pool_size):
+                self._open_count -= len(stale)
+                # 預先佔用名額，建連過程不持有鎖
+                to_create = max(self.pool_size - self._open_count, 0)
+                self._open_count += to_create
+            for conn in stale:
+                self._close(conn)
+            
+            created = []
+            try:
+                for i in range(to_create):
                     conn = self._create_connection()
-                    self.connection_pool.append(conn)
-                    
-                self.is_connected = True
-                logger.info(f"連接池初始化成功，大小: {self.pool_size}")
-                return True
+                    self._register(conn)
+                    created.append(conn)
+            finally:
+                with self.pool_lock:
+                    self._open_count -= to_create - len(created)
+                    self.connection_pool.extend(created)
+                    self._pool_available.notify_all()
+                
+            self.is_connected = True
+            logger.info(f"連接池初始化成功，大小: {self.pool_size}")
+            return True
                 
         except Exception as e:
             logger.error(f"連接池初始化失敗: {e}")
             self.is_connected = False
             return False
     
+    def _checkout(self):
+        """借出連接：空閒連接優先，未達上限時新建，否則最多等待 pool_timeout 秒"""
+        wait_start = None
+        with self.pool_lock:
+            while True:
+                if self.connection_pool:
+                    connection = self.connection_pool.pop()
+                    break
+                if self._open_count < self.pool_size:
+                    self._open_count += 1
+                    connection = None
+                    break
+                if wait_start is None:
+                    wait_start = time.monotonic()
+                    self._stats['waits'] += 1
+                remaining = self.pool_timeout - (time.monotonic() - wait_start)
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(f"等待數據庫連接超時 ({self.pool_timeout}s, 連接池大小 {self.pool_size})")
+                self._pool_available.wait(remaining)
+            
+            if wait_start is not None:
+                waited = time.monotonic() - wait_start
+                self._stats['wait_time_total'] += waited
+                self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+            self._in_use += 1
+        
+        # 建連、回收和存活檢查都在鎖外進行，不阻塞其他線程
+        try:
+            if connection is not None:
+                connection = self._validate(connection)
+            else:
+                connection = self._create_connection()
+                self._register(connection)
+            return connection
+        except Exception:
+            with self.pool_lock:
+                self._open_count -= 1
+                self._in_use -= 1
+                self._pool_available.notify()
+            raise
+    
+    def _validate(self, connection):
+        """超過 pool_recycle 的連接重建；閒置超過 DB_POOL_PING_INTERVAL 的連接先ping"""
+        now = time.monotonic()
+        if self.pool_recycle > 0 and now - self._created_at.get(connection, now) >= self.pool_recycle:
+            self._close(connection)
+            self._count('recycled')
+        elif now - self._last_used.get(connection, 0) < DB_POOL_PING_INTERVAL:
+            return connection
+        else:
+            self._count('pings')
+            if self._is_connection_alive(connection):
+                return connection
+            self._close(connection)
+            self._count('discarded')
+        
+        connection = self._create_connection()
+        self._register(connection)
+        return connection
+    
+    def _release(self, connection, broken=False):
+        """歸還連接；已損壞的連接直接關閉並釋放名額"""
+        if not broken:
+            self._last_used[connection] = time.monotonic()
+        with self.pool_lock:
+            self._in_use -= 1
+            if broken:
+                self._open_count -= 1
+                self._stats['discarded'] += 1
+            else:
+                self.connection_pool.append(connection)
+            self._pool_available.notify()
+        if broken:
+            self._close(connection)
+    
     @contextmanager
     def get_connection(self):
         """獲取數據庫連接（上下文管理器）"""
-        connection = None
+        connection = self._checkout()
+        broken = False
         try:
-            with self.pool_lock:
-                if not self.connection_pool:
-                    # 如果連接池為空，創建新連接
-                    connection = self._create_connection()
-                else:
-                    connection = self.connection_pool.pop()
-                    
-                # 檢查連接是否有效
-                if not self._is_connection_alive(connection):
-                    connection = self._create_connection()
-                    
             yield connection
-            
+        except _BROKEN_CONNECTION_ERRORS as e:
+            broken = True
+            logger.error(f"數據庫操作錯誤: {e}")
+            raise
         except Exception as e:
             logger.error(f"數據庫操作錯誤: {e}")
             raise
         finally:
             # 歸還連接到池中
-            if connection:
-                with self.pool_lock:
-                    if len(self.connection_pool) < self.pool_size:
-                        self.connection_pool.append(connection)
-                    else:
-                        connection.close()
+            self._release(connection, broken or not getattr(connection, 'open', True))
     
     def _is_connection_alive(self, connection) -> bool:
         """檢查連接是否存活"""
@@ -131,6 +263,22 @@ class DatabaseManager:
         except:
             return False
     
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """連接池指標"""
+        with self.pool_lock:
+            stats = dict(self._stats)
+            stats.update({
+                'size': self.pool_size,
+                'open': self._open_count,
+                'in_use': self._in_use,
+                'idle': len(self.connection_pool),
+                'timeout': self.pool_timeout,
+                'recycle': self.pool_recycle
+            })
+        stats['wait_time_total_ms'] = round(stats.pop('wait_time_total') * 1000, 1)
+        stats['wait_time_max_ms'] = round(stats.pop('wait_time_max') * 1000, 1)
+        return stats
+    
     def health_check(self) -> Dict[str, Any]:
         """健康檢查"""
         try:
@@ -144,6 +292,7 @@ class DatabaseManager:
                     'status': 'healthy',
                     'connected': True,
                     'pool_size': len(self.connection_pool),
+                    'pool': self.get_pool_stats(),
                     'config': {
                         'host': self.config['host'],
                         'port': self.config['port'],
@@ -156,7 +305,8 @@ class DatabaseManager:
                 'status': 'unhealthy',
                 'connected': False,
                 'error': str(e),
-                'pool_size': len(self.connection_pool)
+                'pool_size': len(self.connection_pool),
+                'pool': self.get_pool_stats()
             }
     
     def execute_query(self, query: str, params: tuple = None) -> List[Dict]:
@@ -188,14 +338,14 @@ class DatabaseManager:
     def close_all_connections(self):
         """關閉所有連接"""
         with self.pool_lock:
-            for conn in self.connection_pool:
-                try:
-                    conn.close()
-                except:
-                    pass
+            idle = list(self.connection_pool)
             self.connection_pool.clear()
+            self._open_count -= len(idle)
             self.is_connected = False
-            logger.info("所有數據庫連接已關閉")
+            self._pool_available.notify_all()
+        for conn in idle:
+            self._close(conn)
+        logger.info("所有數據庫連接已關閉")
 
 def init_database_tables(db_manager: DatabaseManager) -> bool:
     """初始化數據庫表結構"""
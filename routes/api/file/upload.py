@@ -12,6 +12,7 @@ import tempfile
 import uuid
 import base64
 from datetime import datetime
+from services.storage_manager import storage_manager
 
 # 創建文件上傳藍圖
 api_file_upload_bp = Blueprint('api_file_upload', __name__)
@@ -72,6 +73,7 @@ def _handle_formdata_upload():
     # 獲取文件信息
     file_size = os.path.getsize(file_path)
     file_type = _get_file_type(file_extension)
+    storage_manager.record_file_added(file_path, file_size)
     
     logger.info(f"FormData文件上傳成功: {original_filename} -> {safe_filename} ({file_size} bytes)")
     
@@ -135,6 +137,7 @@ def _handle_base64_upload():
     # 獲取文件信息
     file_size = len(file_bytes)
     file_type = _get_file_type(file_extension)
+    storage_manager.record_file_added(file_path, file_size)
     
     logger.info(f"Base64文件上傳成功: {filename} -> {safe_filename} ({file_size} bytes)")
     
@@ -1,8 +1,9 @@
 # File server for serving local output files
 import os
 import logging
-from flask import Blueprint, send_file, jsonify
+from flask import Blueprint, jsonify
 from werkzeug.utils import safe_join
+from services.media_serving import serve_media_file
 
 file_server_bp = Blueprint('file_server', __name__)
 logger = logging.getLogger(__name__)
@@ -15,9 +16,9 @@ def serve_output_file(filename):
         output_dir = os.path.join(os.getcwd(), 'output')
         file_path = safe_join(output_dir, filename)
         
-        if file_path and os.path.exists(file_path):
+        if file_path and os.path.isfile(file_path):
             logger.info(f"Serving file: {file_path}")
-            return send_file(file_path)
+            return serve_media_file(file_path)
         else:
             logger.warning(f"File not found: {filename}")
             return jsonify({"error": "File not found"}), 404
@@ -5,11 +5,13 @@ NCA文件存儲訪問路由
 為測試中心上傳的文件提供外部訪問
 """
 
-from flask import Blueprint, send_file, jsonify, abort
+from flask import Blueprint, jsonify, abort
 import os
 import logging
 import mimetypes
 from werkzeug.security import safe_join
+from services.file_index import file_index
+from services.media_serving import serve_media_file, EXPOSE_HEADERS
 
 # 創建NCA文件訪問藍圖
 nca_files_bp = Blueprint('nca_files', __name__)
@@ -43,12 +45,6 @@ def serve_nca_file(file_type, file_path):
         output_dir = os.path.join(os.getcwd(), 'output')
         nca_storage_dir = os.path.join(output_dir, 'nca', file_type)
         
-        # 🚨 Debug: 記錄路徑信息
-        logger.info(f"🔍 工作目錄: {os.getcwd()}")
-        logger.info(f"🔍 基礎輸出目錄: {output_dir}")
-        logger.info(f"🔍 NCA存儲目錄: {nca_storage_dir}")
-        logger.info(f"🔍 目標文件路徑: {file_path}")
-        
         # 🚨 標準化路徑分隔符 - Windows兼容性修復
         # 保持使用正斜杠，讓safe_join自動處理路徑分隔符
         normalized_file_path = file_path
@@ -84,93 +80,22 @@ def serve_nca_file(file_type, file_path):
         found_strategy = None
         
         for strategy, path in potential_paths:
-            logger.info(f"🔍 檢查{strategy}: {path}")
-            if os.path.exists(path):
+            if os.path.isfile(path):
                 found_file_path = path
                 found_strategy = strategy
-                logger.info(f"✅ 找到文件 - {strategy}: {path}")
                 break
-            else:
-                logger.info(f"❌ 文件不存在 - {strategy}: {path}")
         
-        # 🚨 新增：如果精確匹配失敗，嘗試前綴匹配（處理帶後綴的文件）
+        # 精確路徑未命中時查文件索引（處理帶後綴的文件），不再遍歷 output/ 目錄樹
         if not found_file_path:
-            logger.info("🔍 精確匹配失敗，嘗試前綴匹配...")
-            
-            # 提取原始文件名（不含擴展名）
-            original_filename = os.path.splitext(os.path.basename(normalized_file_path))[0]
-            file_extension = os.path.splitext(normalized_file_path)[1]
-            
-            logger.info(f"🔍 原始文件名: {original_filename}, 擴展名: {file_extension}")
-            
-            # 在每個可能的目錄中搜索前綴匹配的文件
-            search_directories = [
-                nca_storage_dir,  # 標準目錄
-                os.path.join(output_dir, file_type),  # 舊版目錄
-                output_dir  # 根目錄
-            ]
-            
-            for search_dir in search_directories:
-                if not os.path.exists(search_dir):
-                    continue
-                    
-                # 檢查目錄及其子目錄
-                for root, dirs, files in os.walk(search_dir):
-                    for filename in files:
-                        # 檢查文件是否以原始文件名開頭且有相同擴展名
-                        if (filename.startswith(original_filename) and 
-                            filename.endswith(file_extension) and 
-                            filename != os.path.basename(normalized_file_path)):
-                            
-                            candidate_path = os.path.join(root, filename)
-                            logger.info(f"🔍 找到前綴匹配文件: {candidate_path}")
-                            
-                            # 驗證這是一個有效的變體（包含常見後綴）
-                            valid_suffixes = ['_trim_', '_cut_', '_process_', '_convert_', '_captioned']
-                            if any(suffix in filename for suffix in valid_suffixes):
-                                found_file_path = candidate_path
-                                found_strategy = f"前綴匹配 ({os.path.relpath(search_dir, output_dir)})"
-                                logger.info(f"✅ 前綴匹配成功 - {found_strategy}: {found_file_path}")
-                                break
-                    
-                    if found_file_path:
-                        break
-                
-                if found_file_path:
-                    break
+            found_file_path = file_index.find_variant(file_type, os.path.basename(normalized_file_path))
+            found_strategy = "前綴匹配"
         
         if not found_file_path:
             logger.warning(f"🚨 所有路徑都未找到文件: {file_path}")
-            
-            # 🚨 Debug: 列出目錄內容進行診斷
-            try:
-                if os.path.exists(nca_storage_dir):
-                    logger.info(f"🔍 NCA存儲目錄內容: {os.listdir(nca_storage_dir)}")
-                    # 嘗試遞歸列出子目錄
-                    for root, dirs, files in os.walk(nca_storage_dir):
-                        if files:  # 只顯示有文件的目錄
-                            logger.info(f"🔍 {root}: files={files[:5]}{'...' if len(files) > 5 else ''}")
-                else:
-                    logger.warning(f"🔍 NCA存儲目錄不存在: {nca_storage_dir}")
-                    
-                    # 檢查父目錄
-                    if os.path.exists(output_dir):
-                        logger.info(f"🔍 輸出目錄內容: {os.listdir(output_dir)}")
-                    else:
-                        logger.warning(f"🔍 輸出目錄不存在: {output_dir}")
-                        
-                    # 🚨 嘗試創建基礎目錄結構
-                    try:
-                        os.makedirs(nca_storage_dir, exist_ok=True)
-                        logger.info(f"✅ 創建NCA存儲目錄: {nca_storage_dir}")
-                    except Exception as create_e:
-                        logger.error(f"❌ 創建目錄失敗: {create_e}")
-                        
-            except Exception as debug_e:
-                logger.error(f"🔍 Debug列表錯誤: {debug_e}")
-            
             abort(404)
         
+        logger.info(f"✅ 找到文件 - {found_strategy}: {found_file_path}")
+        
         # 使用找到的文件路徑
         full_file_path = found_file_path
         
@@ -199,24 +124,18 @@ def serve_nca_file(file_type, file_path):
         # 記錄文件訪問
         logger.info(f"✅ 提供文件訪問: {file_type}/{file_path} (MIME: {mime_type})")
         
-        # 返回文件（添加跨域和緩存頭）
-        response = send_file(
+        # 返回文件：支持Range(206)和條件請求(304)，便於播放器拖動進度而不重新下載
+        # 🚨 修復：音頻文件使用 inline 且不帶文件名，確保在瀏覽器中播放而不是下載
+        response = serve_media_file(
             full_file_path,
             mimetype=mime_type,
-            as_attachment=False,
-            download_name=os.path.basename(file_path)
+            download_name=None if file_type == 'audio' else os.path.basename(file_path)
         )
         
         # 🚨 重要：添加跨域頭，允許外部API訪問
         response.headers['Access-Control-Allow-Origin'] = '*'
         response.headers['Access-Control-Allow-Methods'] = 'GET, HEAD, OPTIONS'
-        response.headers['Cache-Control'] = 'public, max-age=86400'  # 24小時緩存
-        
-        # 🚨 修復：強制設置正確的Content-Type，確保音頻文件在瀏覽器中播放而不是下載
-        if file_type == 'audio':
-            response.headers['Content-Type'] = mime_type  # 強制設置正確的MIME類型
-            response.headers['Content-Disposition'] = 'inline'
-            response.headers['Accept-Ranges'] = 'bytes'  # 支持音頻播放器的範圍請求
+        response.headers['Access-Control-Expose-Headers'] = EXPOSE_HEADERS
         
         return response
         
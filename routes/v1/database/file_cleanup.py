@@ -10,6 +10,7 @@ import logging
 from flask import Blueprint, jsonify, request
 from routes.authenticate import auth_bp
 from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
 import os
 
 # 創建認證裝飾器
@@ -30,10 +31,36 @@ from services.database_logger import database_logger
 v1_database_file_cleanup_bp = Blueprint('v1_database_file_cleanup', __name__)
 logger = logging.getLogger(__name__)
 
+# 文件存在性檢查的並行度（掛載的持久化存儲上 stat 延遲較高）
+FILE_CHECK_WORKERS = int(os.environ.get('FILE_CHECK_WORKERS', '16'))
+# 每批從數據庫讀取的記錄數
+FILE_CHECK_BATCH_SIZE = 500
+
+UPLOADED_CHECK_COLUMNS = ['file_id', 'original_filename', 'file_path', 'file_url', 'upload_time']
+OUTPUT_CHECK_COLUMNS = ['file_id', 'original_filename', 'file_path', 'file_url', 'operation_type', 'created_at']
+
+def _file_exists(file_path):
+    return bool(file_path) and os.path.exists(file_path)
+
+def _check_records(batches, executor):
+    """逐批並行檢查記錄對應的物理文件，產出 (記錄, 文件是否存在)"""
+    for batch in batches:
+        exists = executor.map(_file_exists, [record.get('file_path', '') for record in batch])
+        yield from zip(batch, exists)
+
+def _iter_checked_files(executor):
+    """遍歷全部上傳和輸出文件記錄，產出 (表名, 記錄, 文件是否存在)"""
+    uploaded = database_logger.iter_uploaded_files(FILE_CHECK_BATCH_SIZE, columns=UPLOADED_CHECK_COLUMNS)
+    for file_record, exists in _check_records(uploaded, executor):
+        yield 'nca_uploaded_files', file_record, exists
+    output = database_logger.iter_output_files(FILE_CHECK_BATCH_SIZE, columns=OUTPUT_CHECK_COLUMNS)
+    for file_record, exists in _check_records(output, executor):
+        yield 'nca_output_files', file_record, exists
+
 @v1_database_file_cleanup_bp.route('/v1/database/file-cleanup/check', methods=['GET'])
 @authenticate
 def check_file_records():
-    """檢查數據庫文件記錄與物理文件的對應關係"""
+    """檢查數據庫文件記錄與物理文件的對應關係（分批遍歷全部記錄）"""
     try:
         # 檢查數據庫連接
         connection_test = database_logger.test_database_connection()
@@ -44,56 +71,53 @@ def check_file_records():
                 "available": False
             }), 400
         
-        # 獲取所有上傳文件記錄
-        uploaded_files = database_logger.get_uploaded_files(limit=1000)
-        output_files = database_logger.get_output_files(limit=1000)
+        # 返回的無效記錄明細上限，統計數字不受影響
+        invalid_limit = request.args.get('invalid_limit', 1000, type=int)
         
         # 檢查結果統計
         check_results = {
             "uploaded_files": {
-                "total": len(uploaded_files),
+                "total": 0,
                 "valid": 0,
                 "invalid": 0,
                 "invalid_records": []
             },
             "output_files": {
-                "total": len(output_files),
+                "total": 0,
                 "valid": 0,
                 "invalid": 0,
                 "invalid_records": []
             }
         }
         
-        # 檢查上傳文件
-        for file_record in uploaded_files:
-            file_path = file_record.get('file_path', '')
-            if file_path and os.path.exists(file_path):
-                check_results["uploaded_files"]["valid"] += 1
-            else:
-                check_results["uploaded_files"]["invalid"] += 1
-                check_results["uploaded_files"]["invalid_records"].append({
-                    "file_id": file_record.get('file_id'),
-                    "filename": file_record.get('original_filename'),
-                    "file_path": file_path,
-                    "file_url": file_record.get('file_url'),
-                    "upload_time": str(file_record.get('upload_time', ''))
-                })
+        with ThreadPoolExecutor(max_workers=FILE_CHECK_WORKERS) as executor:
+            for table_name, file_record, exists in _iter_checked_files(executor):
+                if table_name == 'nca_uploaded_files':
+                    result = check_results["uploaded_files"]
+                    detail = {"upload_time": str(file_record.get('upload_time', ''))}
+                else:
+                    result = check_results["output_files"]
+                    detail = {
+                        "operation_type": file_record.get('operation_type'),
+                        "created_at": str(file_record.get('created_at', ''))
+                    }
+                
+                result["total"] += 1
+                if exists:
+                    result["valid"] += 1
+                    continue
+                result["invalid"] += 1
+                if len(result["invalid_records"]) < invalid_limit:
+                    result["invalid_records"].append({
+                        "file_id": file_record.get('file_id'),
+                        "filename": file_record.get('original_filename'),
+                        "file_path": file_record.get('file_path', ''),
+                        "file_url": file_record.get('file_url'),
+                        **detail
+                    })
         
-        # 檢查輸出文件
-        for file_record in output_files:
-            file_path = file_record.get('file_path', '')
-            if file_path and os.path.exists(file_path):
-                check_results["output_files"]["valid"] += 1
-            else:
-                check_results["output_files"]["invalid"] += 1
-                check_results["output_files"]["invalid_records"].append({
-                    "file_id": file_record.get('file_id'),
-                    "filename": file_record.get('original_filename'),
-                    "file_path": file_path,
-                    "file_url": file_record.get('file_url'),
-                    "operation_type": file_record.get('operation_type'),
-                    "created_at": str(file_record.get('created_at', ''))
-                })
+        for result in check_results.values():
+            result["invalid_records_truncated"] = result["invalid"] > len(result["invalid_records"])
         
         return jsonify({
             "message": "文件記錄檢查完成",
@@ -133,73 +157,32 @@ def cleanup_invalid_records():
             "deleted_records": []
         }
         
+        # 先完整遍歷收集無效記錄，再刪除，避免邊讀邊刪影響分頁
+        invalid_ids = {'nca_uploaded_files': [], 'nca_output_files': []}
+        with ThreadPoolExecutor(max_workers=FILE_CHECK_WORKERS) as executor:
+            for table_name, file_record, exists in _iter_checked_files(executor):
+                if exists:
+                    continue
+                invalid_ids[table_name].append(file_record.get('file_id'))
+                cleanup_results["deleted_records"].append({
+                    "table": table_name,
+                    "file_id": file_record.get('file_id'),
+                    "filename": file_record.get('original_filename')
+                })
+        cleanup_results["uploaded_files_deleted"] = len(invalid_ids['nca_uploaded_files'])
+        cleanup_results["output_files_deleted"] = len(invalid_ids['nca_output_files'])
+        
         if not dry_run:
-            # 實際清理模式
-            connection = database_logger.get_connection()
-            if not connection:
-                return jsonify({
-                    "message": "無法獲取數據庫連接",
-                    "status": "error"
-                }), 500
-            
-            try:
+            # 實際清理模式（從共享連接池借用連接，按批刪除）
+            with database_logger.get_connection() as connection:
                 with connection.cursor() as cursor:
-                    # 清理上傳文件表中的無效記錄
-                    uploaded_files = database_logger.get_uploaded_files(limit=1000)
-                    for file_record in uploaded_files:
-                        file_path = file_record.get('file_path', '')
-                        if not file_path or not os.path.exists(file_path):
-                            delete_sql = "DELETE FROM `nca_uploaded_files` WHERE `file_id` = %s"
-                            cursor.execute(delete_sql, (file_record.get('file_id'),))
-                            cleanup_results["uploaded_files_deleted"] += 1
-                            cleanup_results["deleted_records"].append({
-                                "table": "nca_uploaded_files",
-                                "file_id": file_record.get('file_id'),
-                                "filename": file_record.get('original_filename')
-                            })
-                    
-                    # 清理輸出文件表中的無效記錄
-                    output_files = database_logger.get_output_files(limit=1000)
-                    for file_record in output_files:
-                        file_path = file_record.get('file_path', '')
-                        if not file_path or not os.path.exists(file_path):
-                            delete_sql = "DELETE FROM `nca_output_files` WHERE `file_id` = %s"
-                            cursor.execute(delete_sql, (file_record.get('file_id'),))
-                            cleanup_results["output_files_deleted"] += 1
-                            cleanup_results["deleted_records"].append({
-                                "table": "nca_output_files",
-                                "file_id": file_record.get('file_id'),
-                                "filename": file_record.get('original_filename')
-                            })
-                    
-                    connection.commit()
-                    logger.info(f"清理完成：刪除了 {cleanup_results['uploaded_files_deleted']} 個上傳文件記錄，{cleanup_results['output_files_deleted']} 個輸出文件記錄")
-                    
-            finally:
-                connection.close()
-        else:
-            # 試運行模式，只統計不實際刪除
-            uploaded_files = database_logger.get_uploaded_files(limit=1000)
-            for file_record in uploaded_files:
-                file_path = file_record.get('file_path', '')
-                if not file_path or not os.path.exists(file_path):
-                    cleanup_results["uploaded_files_deleted"] += 1
-                    cleanup_results["deleted_records"].append({
-                        "table": "nca_uploaded_files",
-                        "file_id": file_record.get('file_id'),
-                        "filename": file_record.get('original_filename')
-                    })
-            
-            output_files = database_logger.get_output_files(limit=1000)
-            for file_record in output_files:
-                file_path = file_record.get('file_path', '')
-                if not file_path or not os.path.exists(file_path):
-                    cleanup_results["output_files_deleted"] += 1
-                    cleanup_results["deleted_records"].append({
-                        "table": "nca_output_files",
-                        "file_id": file_record.get('file_id'),
-                        "filename": file_record.get('original_filename')
-                    })
+                    for table_name, file_ids in invalid_ids.items():
+                        for i in range(0, len(file_ids), FILE_CHECK_BATCH_SIZE):
+                            chunk = file_ids[i:i + FILE_CHECK_BATCH_SIZE]
+                            placeholders = ', '.join(['%s'] * len(chunk))
+                            cursor.execute(f"DELETE FROM `{table_name}` WHERE `file_id` IN ({placeholders})", chunk)
+                connection.commit()
+            logger.info(f"清理完成：刪除了 {cleanup_results['uploaded_files_deleted']} 個上傳文件記錄，{cleanup_results['output_files_deleted']} 個輸出文件記錄")
         
         return jsonify({
             "message": f"文件記錄清理{'模擬' if dry_run else '實際'}完成",
@@ -93,7 +93,7 @@ def init_database():
     try:
         from services.database_logger import database_logger
         
-        success = database_logger.create_table_if_not_exists()
+        success = database_logger.create_table_if_not_exists(force=True)
         
         if success:
             return jsonify({
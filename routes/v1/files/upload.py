@@ -13,11 +13,18 @@ from datetime import datetime
 from werkzeug.utils import secure_filename
 from services.authentication import authenticate  # 🚨 修復：使用正確的導入路徑
 from services.database_logger import database_logger  # 🚨 新增：導入數據庫記錄器
+from services.storage_manager import storage_manager
 
 # 創建文件上傳藍圖
 v1_files_upload_bp = Blueprint('v1_files_upload', __name__)
 logger = logging.getLogger(__name__)
 
+# 輸出文件列表接口返回的字段
+OUTPUT_LIST_COLUMNS = [
+    'file_id', 'safe_filename', 'original_filename', 'file_type', 'file_size',
+    'file_url', 'operation_type', 'metadata', 'created_at'
+]
+
 ALLOWED_EXTENSIONS = {
     'audio': {'mp3', 'wav', 'aac', 'flac', 'ogg', 'm4a', 'wma'},
     'video': {'mp4', 'avi', 'mkv', 'mov', 'wmv', 'flv', 'webm'}
@@ -185,6 +192,7 @@ def handle_file_upload(file_type):
         # 獲取文件信息
         file_size = os.path.getsize(file_path)
         file_size_mb = get_file_size_mb(file_size)
+        storage_manager.record_file_added(file_path, file_size)
         
         # 生成文件URL（外部可訪問）- 使用最終的safe_filename
         final_filename = os.path.basename(file_path)
@@ -235,24 +243,36 @@ def get_output_files():
     獲取輸出文件列表
     支持查詢參數：
     - limit: 返回數量限制 (默認50)
+    - cursor: 上一頁返回的 next_cursor，用於翻頁
     - file_type: 文件類型過濾 (audio/video/image)
     - operation_type: 操作類型過濾 (cut/trim/thumbnail等)
+    - created_from / created_to: 創建時間範圍 (如 2025-09-01 或 2025-09-01 12:00:00)
     """
     try:
         # 獲取查詢參數
         limit = request.args.get('limit', 50, type=int)
+        cursor = request.args.get('cursor')
         file_type = request.args.get('file_type')
         operation_type = request.args.get('operation_type')
+        created_from = request.args.get('created_from')
+        created_to = request.args.get('created_to')
         
         # 限制最大返回數量
-        limit = min(limit, 100)
+        limit = max(min(limit, 100), 1)
         
-        # 從數據庫獲取輸出文件列表
-        files = database_logger.get_output_files(
-            file_type=file_type,
-            operation_type=operation_type,
-            limit=limit
-        )
+        # 從數據庫獲取輸出文件列表（只查詢需要返回的字段）
+        try:
+            files, next_cursor = database_logger.list_output_files(
+                limit=limit,
+                cursor=cursor,
+                file_type=file_type,
+                operation_type=operation_type,
+                created_from=created_from,
+                created_to=created_to,
+                columns=OUTPUT_LIST_COLUMNS
+            )
+        except ValueError as e:
+            return jsonify({"message": str(e), "status": "error"}), 400
         
         # 格式化文件信息
         formatted_files = []
@@ -276,9 +296,12 @@ def get_output_files():
             "status": "success",
             "files": formatted_files,
             "total": len(formatted_files),
+            "next_cursor": next_cursor,
             "filters": {
                 "file_type": file_type,
                 "operation_type": operation_type,
+                "created_from": created_from,
+                "created_to": created_to,
                 "limit": limit
             }
         }), 200
@@ -294,24 +317,43 @@ def get_output_files():
 @v1_files_upload_bp.route('/v1/files/list', methods=['GET'])
 @authenticate
 def list_uploaded_files():
-    """獲取上傳文件列表"""
+    """
+    獲取上傳文件列表
+    支持查詢參數：
+    - limit: 返回數量限制 (默認20)
+    - cursor: 上一頁返回的 next_cursor，用於翻頁
+    - type: 文件類型過濾 (audio/video)
+    - created_from / created_to: 創建時間範圍
+    - fields: 逗號分隔的返回字段，如 file_id,file_url,file_size
+    """
     try:
-        from services.database_logger import database_logger
-        
         # 獲取查詢參數
         limit = request.args.get('limit', 20, type=int)
+        cursor = request.args.get('cursor')
         file_type = request.args.get('type', None)  # 可選：audio 或 video
+        fields = request.args.get('fields')
+        columns = [field.strip() for field in fields.split(',') if field.strip()] if fields else None
         
-        if limit > 100:  # 限制最大查詢數量
-            limit = 100
+        limit = max(min(limit, 100), 1)  # 限制最大查詢數量
         
-        files = database_logger.get_uploaded_files(limit, file_type)
+        try:
+            files, next_cursor = database_logger.list_uploaded_files(
+                limit=limit,
+                cursor=cursor,
+                file_type=file_type,
+                created_from=request.args.get('created_from'),
+                created_to=request.args.get('created_to'),
+                columns=columns
+            )
+        except ValueError as e:
+            return jsonify({"message": str(e), "status": "error"}), 400
         
         return jsonify({
             "message": f"成功獲取 {len(files)} 個文件記錄",
             "status": "success",
             "count": len(files),
-            "files": files
+            "files": files,
+            "next_cursor": next_cursor
         }), 200
         
     except Exception as e:
@@ -7,6 +7,7 @@ from datetime import datetime
 from flask import Blueprint, request, jsonify
 from services.authentication import authenticate
 from services.local_storage import local_storage
+from services.audio_extract import extract_transcription_audio
 
 v1_media_transcribe_enhanced_bp = Blueprint('v1_media_transcribe_enhanced', __name__)
 logger = logging.getLogger(__name__)
@@ -14,7 +15,8 @@ logger = logging.getLogger(__name__)
 # Try to import faster-whisper (should be available in global environment)
 WHISPER_AVAILABLE = False
 try:
-    from faster_whisper import WhisperModel
+    import faster_whisper
+    from services.whisper_models import get_whisper_model
     WHISPER_AVAILABLE = True
     logger.info("faster-whisper is available (global environment)")
 except ImportError:
@@ -47,9 +49,9 @@ def transcribe_with_faster_whisper(audio_path: str, task: str = "transcribe", la
     """Transcribe audio using faster-whisper (CPU optimized)"""
     try:
         # Use small model (balance between accuracy and performance)
-        logger.info("Loading faster-whisper small model...")
-        model = WhisperModel("small", device="cpu", compute_type="int8", num_workers=1)
-        logger.info("Model loaded successfully")
+        logger.info("Getting shared faster-whisper model...")
+        model = get_whisper_model()
+        logger.info("Model ready")
         
         # Check audio file size and duration
         import os
@@ -235,11 +237,14 @@ def transcribe_media_enhanced():
             # Download media file
             input_media_path = download_media(media_url, temp_dir)
             
+            # Extract a 16 kHz mono track so the model does not decode the container
+            audio_path = extract_transcription_audio(input_media_path, os.path.join(temp_dir, 'audio.16k.flac'))
+            
             # Perform transcription
             logger.info(f"Starting transcription for: {media_url}")
             start_time = datetime.now()
             transcription_result = transcribe_with_faster_whisper(
-                input_media_path, 
+                audio_path, 
                 task=task, 
                 language=language if language != "auto" else None
             )
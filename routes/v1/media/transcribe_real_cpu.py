@@ -7,12 +7,14 @@ from datetime import datetime
 from flask import Blueprint, request, jsonify
 from services.authentication import authenticate
 from services.output_file_manager import output_file_manager
+from services.audio_extract import extract_transcription_audio
 
 v1_media_transcribe_real_cpu_bp = Blueprint('v1_media_transcribe_real_cpu', __name__)
 logger = logging.getLogger(__name__)
 
 try:
-    from faster_whisper import WhisperModel
+    import faster_whisper
+    from services.whisper_models import get_whisper_model
     WHISPER_AVAILABLE = True
     logger.info("faster-whisper is available")
 except ImportError:
@@ -45,8 +47,8 @@ def download_media(url: str, temp_dir: str) -> str:
 def transcribe_with_faster_whisper(audio_path: str, task: str = "transcribe", language: str = None) -> dict:
     """使用 faster-whisper 進行轉錄 (CPU優化)"""
     try:
-        # 使用 small 模型 (平衡準確性和性能)
-        model = WhisperModel("small", device="cpu", compute_type="int8")
+        # 使用共享的 small 模型 (平衡準確性和性能)
+        model = get_whisper_model()
         
         # 進行轉錄
         segments, info = model.transcribe(
@@ -156,10 +158,13 @@ def transcribe_media_real_cpu():
             # 下載媒體文件
             input_media_path = download_media(media_url, temp_dir)
             
+            # 抽出16kHz單聲道音軌，避免模型解碼整個容器
+            audio_path = extract_transcription_audio(input_media_path, os.path.join(temp_dir, 'audio.16k.flac'))
+            
             # 使用 faster-whisper 進行轉錄
             start_time = datetime.now()
             transcription_result = transcribe_with_faster_whisper(
-                input_media_path, 
+                audio_path, 
                 task=task, 
                 language=language if language != "auto" else None
             )
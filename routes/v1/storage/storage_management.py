@@ -93,6 +93,7 @@ def get_storage_usage():
     獲取存儲使用情況
     
     GET /api/v1/storage/usage
+    GET /api/v1/storage/usage?refresh=true  （先全量對賬，耗時與文件數量成正比）
     
     Returns:
         JSON: 存儲使用統計
@@ -100,8 +101,9 @@ def get_storage_usage():
     try:
         logger.info("📊 收到存儲使用情況查詢請求")
         
-        # 獲取存儲使用情況
-        usage_stats = storage_manager.get_storage_usage()
+        # 獲取存儲使用情況（默認讀取用量賬本）
+        refresh = request.args.get('refresh', 'false').lower() == 'true'
+        usage_stats = storage_manager.get_storage_usage(refresh=refresh)
         
         response_data = {
             'success': True,
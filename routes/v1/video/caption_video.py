@@ -17,11 +17,15 @@
 
 
 from flask import Blueprint, jsonify, request
-from app_utils import validate_payload
+from app_utils import validate_payload, log_job_status, timed_stage
 import logging
-from services.ass_toolkit import generate_ass_captions_v1
+from services.ass_toolkit import generate_ass_captions_v1, validate_caption_settings
+from services.font_registry import REPO_FONTS_DIR
+from services.caption_render import render_captions_segmented, CAPTION_RENDER_MODES, CAPTION_RENDER_MODE
 from services.authentication import authenticate
 from services.cloud_storage import upload_file
+from services.file_management import download_file
+from config import LOCAL_STORAGE_PATH
 import os
 import requests  # Ensure requests is imported for webhook handling
 
@@ -97,6 +101,8 @@ logger = logging.getLogger(__name__)
                 "additionalProperties": False
             }
         },
+        "render_mode": {"type": "string", "enum": list(CAPTION_RENDER_MODES)},
+        "render_chunks": {"type": "integer", "minimum": 1, "maximum": 64},
         "webhook_url": {"type": "string", "format": "uri"},
         "id": {"type": "string"},
         "language": {"type": "string"}
@@ -114,6 +120,8 @@ def caption_video_v1():
     webhook_url = data.get('webhook_url')
     id = data.get('id')
     language = data.get('language', 'auto')
+    render_mode = data.get('render_mode', CAPTION_RENDER_MODE)
+    render_chunks = data.get('render_chunks')
     
     # Generate a simple job ID for logging
     import uuid
@@ -127,30 +135,68 @@ def caption_video_v1():
     logger.info(f"Job {job_id}: [步驟1/10] 樣式設置: {settings}")
     logger.info(f"Job {job_id}: [步驟1/10] 文本替換規則: {replace}")
     logger.info(f"Job {job_id}: [步驟1/10] 排除時間範圍: {exclude_time_ranges}")
+    logger.info(f"Job {job_id}: [步驟1/10] 渲染模式: {render_mode}")
     logger.info(f"Job {job_id}: [步驟1/10] 請求驗證完成，準備調用核心服務")
 
+    stage_timings = {}
+
+    def report_stage(stage, status="running"):
+        log_job_status(job_id, {
+            "job_status": status,
+            "job_id": job_id,
+            "stage": stage,
+            "stage_timings": stage_timings
+        })
+
+    def caption_error_response(output):
+        # Only font errors carry 'available_fonts'
+        if 'available_fonts' in output:
+            return jsonify({"error": output['error'], "available_fonts": output['available_fonts']}), 400
+        return jsonify({"error": output['error']}), 400
+
+    def failed_caption_stage():
+        # timed_stage records a stage even when it fails, so the last caption stage recorded is
+        # the one that failed; before any of them the failure was in preparing the captions
+        for stage in reversed(list(stage_timings)):
+            if stage in ("probe", "transcribe", "ass_build"):
+                return stage
+        return "ass_build"
+
+    # 先做不需要視頻的設置與字體檢查，無效請求不必下載視頻
+    settings_error = validate_caption_settings(settings, replace)
+    if settings_error:
+        logger.error(f"Job {job_id}: [步驟1/10] 設置驗證失敗: {settings_error['error']}")
+        report_stage("validate", "failed")
+        return caption_error_response(settings_error)
+
+    video_path = None
     try:
+        # 十步法 - 第三步：視頻文件下載（每個任務只下載一次，後續階段共用本地文件）
+        try:
+            logger.info(f"Job {job_id}: [步驟3/10] 視頻文件下載 - 開始下載視頻文件")
+            report_stage("download")
+            with timed_stage(stage_timings, "download"):
+                video_path = download_file(video_url, LOCAL_STORAGE_PATH)
+            logger.info(f"Job {job_id}: [步驟3/10] 視頻下載完成 - 本地路徑: {video_path}")
+        except Exception as e:
+            logger.error(f"Job {job_id}: [步驟3/10] 視頻下載失敗: {str(e)}")
+            report_stage("download", "failed")
+            return jsonify({"error": str(e)}), 500
+
         # Do NOT combine position and alignment. Keep them separate.
         # Just pass settings directly to process_captioning_v1.
         # This ensures position and alignment remain independent keys.
         
-        # 十步法 - 第二步：核心字幕生成服務調用
+        # 十步法 - 第二步：核心字幕生成服務調用（探測、轉錄、ASS生成）
         logger.info(f"Job {job_id}: [步驟2/10] 核心字幕生成服務調用 - 開始調用generate_ass_captions_v1")
-        logger.info(f"Job {job_id}: [步驟4/10] 視頻分辨率檢測 - 即將開始檢測視頻分辨率")
-        logger.info(f"Job {job_id}: [步驟5/10] 自動語音轉錄 - 準備進行語音識別處理")
-        logger.info(f"Job {job_id}: [步驟6/10] 字幕格式處理 - 開始處理字幕格式轉換")
-        logger.info(f"Job {job_id}: [步驟7/10] 字幕樣式處理 - 開始應用字幕樣式設置")
-        output = generate_ass_captions_v1(video_url, captions, settings, replace, exclude_time_ranges, job_id, language)
+        report_stage("ass_build" if captions else "transcribe")
+        output = generate_ass_captions_v1(video_url, captions, settings, replace, exclude_time_ranges, job_id, language,
+                                          video_path=video_path, stage_timings=stage_timings)
         logger.info(f"Job {job_id}: [步驟2/10] 核心服務調用完成")
         
         if isinstance(output, dict) and 'error' in output:
-            # Check if this is a font-related error by checking for 'available_fonts' key
-            if 'available_fonts' in output:
-                # Font error scenario
-                return jsonify({"error": output['error'], "available_fonts": output['available_fonts']}), 400
-            else:
-                # Non-font error scenario, do not return available_fonts
-                return jsonify({"error": output['error']}), 400
+            report_stage(failed_caption_stage(), "failed")
+            return caption_error_response(output)
 
         # If processing was successful, output is the ASS file path
         ass_path = output
@@ -160,18 +206,6 @@ def caption_video_v1():
         output_filename = f"{job_id}_captioned.mp4"
         output_path = os.path.join(os.path.dirname(ass_path), output_filename)
 
-        # 十步法 - 第三步：視頻文件下載（如果尚未本地化）
-        video_path = None
-        try:
-            logger.info(f"Job {job_id}: [步驟3/10] 視頻文件下載 - 開始下載視頻文件")
-            from services.file_management import download_file
-            from config import LOCAL_STORAGE_PATH
-            video_path = download_file(video_url, LOCAL_STORAGE_PATH)
-            logger.info(f"Job {job_id}: [步驟3/10] 視頻下載完成 - 本地路徑: {video_path}")
-        except Exception as e:
-            logger.error(f"Job {job_id}: [步驟3/10] 視頻下載失敗: {str(e)}")
-            return jsonify({"error": str(e)}), 500
-
         # 十步法 - 第九步：視頻渲染（FFmpeg處理）
         try:
             import ffmpeg
@@ -179,37 +213,46 @@ def caption_video_v1():
             logger.info(f"Job {job_id}: [步驟9/10] 輸入視頻: {video_path}")
             logger.info(f"Job {job_id}: [步驟9/10] 字幕文件: {ass_path}")
             logger.info(f"Job {job_id}: [步驟9/10] 輸出路徑: {output_path}")
+            report_stage("render")
             
-            # Get the directory containing the files
-            video_dir = os.path.dirname(os.path.abspath(video_path))
-            
-            # Get relative filenames
-            rel_video = os.path.basename(video_path)
-            rel_ass = os.path.basename(ass_path)
-            rel_output = os.path.basename(output_path)
-            
-            logger.info(f"Job {job_id}: Working directory: {video_dir}")
-            logger.info(f"Job {job_id}: Relative paths - Video: {rel_video}, ASS: {rel_ass}, Output: {rel_output}")
-            
-            # Change to the directory containing the files and run FFmpeg with relative paths
-            original_cwd = os.getcwd()
-            try:
-                os.chdir(video_dir)
-                logger.info(f"Job {job_id}: Changed working directory to: {video_dir}")
+            if render_mode == 'segmented':
+                # 按關鍵幀切塊並行燒錄字幕，再無損拼接並複製原音軌
+                with timed_stage(stage_timings, "render"):
+                    chunk_count = render_captions_segmented(video_path, ass_path, output_path, chunk_count=render_chunks)
+                logger.info(f"Job {job_id}: [步驟9/10] 分段並行渲染完成 - {chunk_count} 段")
+            else:
+                # Get the directory containing the files
+                video_dir = os.path.dirname(os.path.abspath(video_path))
+                
+                # Get relative filenames
+                rel_video = os.path.basename(video_path)
+                rel_ass = os.path.basename(ass_path)
+                rel_output = os.path.basename(output_path)
                 
-                ffmpeg.input(rel_video).output(
-                    rel_output,
-                    vf=f"subtitles={rel_ass}",
-                    acodec='copy'
-                ).run(overwrite_output=True)
+                logger.info(f"Job {job_id}: Working directory: {video_dir}")
+                logger.info(f"Job {job_id}: Relative paths - Video: {rel_video}, ASS: {rel_ass}, Output: {rel_output}")
                 
-            finally:
-                # Always restore original working directory
-                os.chdir(original_cwd)
-                logger.info(f"Job {job_id}: Restored working directory to: {original_cwd}")
+                # Change to the directory containing the files and run FFmpeg with relative paths
+                original_cwd = os.getcwd()
+                try:
+                    os.chdir(video_dir)
+                    logger.info(f"Job {job_id}: Changed working directory to: {video_dir}")
+                    
+                    with timed_stage(stage_timings, "render"):
+                        ffmpeg.input(rel_video).output(
+                            rel_output,
+                            vf=f"subtitles={rel_ass}:fontsdir='{REPO_FONTS_DIR}'",
+                            acodec='copy'
+                        ).run(overwrite_output=True)
+                    
+                finally:
+                    # Always restore original working directory
+                    os.chdir(original_cwd)
+                    logger.info(f"Job {job_id}: Restored working directory to: {original_cwd}")
             logger.info(f"Job {job_id}: [步驟9/10] FFmpeg處理完成 - 帶字幕視頻已生成: {output_path}")
         except Exception as e:
             logger.error(f"Job {job_id}: [步驟9/10] FFmpeg處理失敗: {str(e)}")
+            report_stage("render", "failed")
             return jsonify({"error": f"FFmpeg error: {str(e)}"}), 500
 
         # Clean up the ASS file after use
@@ -217,20 +260,30 @@ def caption_video_v1():
 
         # 十步法 - 第十步：響應返回
         logger.info(f"Job {job_id}: [步驟10/10] 響應返回 - 開始上傳到雲端存儲")
-        cloud_url = upload_file(output_path)
+        report_stage("upload")
+        with timed_stage(stage_timings, "upload"):
+            cloud_url = upload_file(output_path)
         logger.info(f"Job {job_id}: [步驟10/10] 雲端上傳完成 - URL: {cloud_url}")
 
         # Clean up the output file after upload
         os.remove(output_path)
         logger.info(f"Job {job_id}: [步驟10/10] 本地文件清理完成")
+        logger.info(f"Job {job_id}: [步驟10/10] 階段耗時: {stage_timings}")
         logger.info(f"Job {job_id}: [步驟10/10] 影片字幕處理流程全部完成！")
+        report_stage("upload", "done")
 
         return jsonify({
             "job_id": job_id,
             "response": cloud_url,
-            "message": "success"
+            "message": "success",
+            "stage_timings": stage_timings
         }), 200
 
     except Exception as e:
         logger.error(f"Job {job_id}: Error during captioning process - {str(e)}", exc_info=True)
+        report_stage("error", "failed")
         return jsonify({"error": str(e)}), 500
+    finally:
+        # The source is only needed until the render finishes
+        if video_path and os.path.exists(video_path):
+            os.remove(video_path)
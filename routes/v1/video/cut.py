@@ -49,6 +49,8 @@ logger = logging.getLogger(__name__)
         "video_crf": {"type": "number", "minimum": 0, "maximum": 51},
         "audio_codec": {"type": "string"},
         "audio_bitrate": {"type": "string"},
+        "accuracy": {"type": "string", "enum": ["fast", "exact", "smart"]},
+        "engine": {"type": "string", "enum": ["segments", "filter"]},
         "webhook_url": {"type": "string", "format": "uri"},
         "id": {"type": "string"}
     },
@@ -67,6 +69,8 @@ def video_cut(job_id, data):
     video_crf = data.get('video_crf', 23)
     audio_codec = data.get('audio_codec', 'aac')
     audio_bitrate = data.get('audio_bitrate', '128k')
+    accuracy = data.get('accuracy', 'exact')
+    engine = data.get('engine', 'segments')
     
     logger.info(f"Job {job_id}: Received video cut request for {video_url}")
     
@@ -80,7 +84,9 @@ def video_cut(job_id, data):
             video_preset=video_preset,
             video_crf=video_crf,
             audio_codec=audio_codec,
-            audio_bitrate=audio_bitrate
+            audio_bitrate=audio_bitrate,
+            accuracy=accuracy,
+            engine=engine
         )
         
         # Upload the processed file to cloud storage
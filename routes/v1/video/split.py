@@ -49,6 +49,8 @@ logger = logging.getLogger(__name__)
         "video_crf": {"type": "number", "minimum": 0, "maximum": 51},
         "audio_codec": {"type": "string"},
         "audio_bitrate": {"type": "string"},
+        "accuracy": {"type": "string", "enum": ["fast", "exact", "smart"]},
+        "render_mode": {"type": "string", "enum": ["parallel", "single_decode"]},
         "webhook_url": {"type": "string", "format": "uri"},
         "id": {"type": "string"}
     },
@@ -67,6 +69,8 @@ def video_split(job_id, data):
     video_crf = data.get('video_crf', 23)
     audio_codec = data.get('audio_codec', 'aac')
     audio_bitrate = data.get('audio_bitrate', '128k')
+    accuracy = data.get('accuracy', 'exact')
+    render_mode = data.get('render_mode', 'parallel')
     
     logger.info(f"Job {job_id}: Received video split request for {video_url}")
     
@@ -80,7 +84,9 @@ def video_split(job_id, data):
             video_preset=video_preset,
             video_crf=video_crf,
             audio_codec=audio_codec,
-            audio_bitrate=audio_bitrate
+            audio_bitrate=audio_bitrate,
+            accuracy=accuracy,
+            render_mode=render_mode
         )
         
         # Upload all output files to cloud storage
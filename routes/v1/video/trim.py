@@ -81,7 +81,8 @@ def video_trim(job_id, data):
         
         # Clean up temporary files
         import os
-        os.remove(input_filename)
+        if input_filename:
+            os.remove(input_filename)
         os.remove(output_filename)
         logger.info(f"Job {job_id}: Removed temporary files")
         
@@ -7,11 +7,12 @@ Vidspark存儲文件訪問路由
 根據genhuman开发错误.md中的成功案例創建
 """
 
-from flask import Blueprint, send_file, jsonify, abort
+from flask import Blueprint, jsonify, abort, request
 import os
 import logging
 import mimetypes
 from werkzeug.utils import safe_join
+from services.media_serving import serve_media_file, EXPOSE_HEADERS
 
 # 創建存儲訪問藍圖
 vidspark_storage_bp = Blueprint('vidspark_storage', __name__)
@@ -46,7 +47,7 @@ def serve_storage_file(file_path):
             return jsonify({"error": "Invalid file path"}), 400
         
         # 檢查文件是否存在
-        if not os.path.exists(full_file_path):
+        if not os.path.isfile(full_file_path):
             logger.warning(f"File not found: {full_file_path}")
             return jsonify({
                 "error": "File not found",
@@ -59,23 +60,16 @@ def serve_storage_file(file_path):
         if not mime_type:
             mime_type = 'application/octet-stream'
         
-        logger.info(f"✅ Serving vidspark storage file: {file_path}")
-        logger.info(f"📁 Full path: {full_file_path}")
-        logger.info(f"📊 MIME type: {mime_type}")
-        logger.info(f"📦 File size: {os.path.getsize(full_file_path)} bytes")
+        logger.info(f"✅ Serving vidspark storage file: {file_path} ({mime_type}, Range: {request.headers.get('Range', '-')})")
         
-        # 返回文件，設置正確的CORS頭
-        response = send_file(
-            full_file_path,
-            mimetype=mime_type,
-            as_attachment=False
-        )
+        # 返回文件（支持Range/206和ETag/304），設置正確的CORS頭
+        response = serve_media_file(full_file_path, mimetype=mime_type)
         
         # 🚨 關鍵：設置CORS頭，允許GenHuman API訪問
         response.headers['Access-Control-Allow-Origin'] = '*'
         response.headers['Access-Control-Allow-Methods'] = 'GET, HEAD'
-        response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
-        response.headers['Cache-Control'] = 'public, max-age=86400'
+        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Range, If-None-Match, If-Modified-Since'
+        response.headers['Access-Control-Expose-Headers'] = EXPOSE_HEADERS
         
         return response
         
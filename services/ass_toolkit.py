@@ -17,18 +17,25 @@
 
 
 import os
-import ffmpeg
 import logging
 import subprocess
-from faster_whisper import WhisperModel
+from services.whisper_models import get_whisper_model, DEFAULT_MODEL_SIZE, DEFAULT_COMPUTE_TYPE
 from datetime import timedelta
 import srt
 import re
+from typing import NamedTuple
 from services.file_management import download_file
+from services.media_probe import probe, get_duration, content_hash
+from services.transcription_cache import transcription_cache
+from services.audio_extract import extract_transcription_audio
+from services.chunked_transcription import transcribe_chunked, segments_to_dicts, CHUNKED_TRANSCRIPTION_MIN_SECONDS
 from services.cloud_storage import upload_file  # Ensure this import is present
+from services.font_registry import font_registry
+from services.intervals import IntervalSet
 import requests  # Ensure requests is imported for webhook handling
 from urllib.parse import urlparse
 from config import LOCAL_STORAGE_PATH
+from app_utils import timed_stage
 
 # Initialize logger
 logger = logging.getLogger(__name__)
@@ -39,6 +46,9 @@ if not logger.hasHandlers():
     handler.setFormatter(formatter)
     logger.addHandler(handler)
 
+# Generated ASS files are written event by event through a buffer of this size
+ASS_WRITE_BUFFER_SIZE = 1024 * 1024
+
 POSITION_ALIGNMENT_MAP = {
     "bottom_left": 1,
     "bottom_center": 2,
@@ -62,51 +72,62 @@ def rgb_to_ass_color(rgb_color):
             return f"&H00{b:02X}{g:02X}{r:02X}"
     return "&H00FFFFFF"
 
-def generate_transcription(video_path, language='auto'):
+def _run_transcription(video_path, language, chunked):
+    # 先抽出16kHz單聲道音軌，模型不必再解碼整個視頻容器
+    audio_path = extract_transcription_audio(video_path)
     try:
-        # 使用faster-whisper small模型統一轉錄
-        model = WhisperModel("small", device="cpu", compute_type="int8")
+        if chunked:
+            # 長音頻按停頓切塊並行轉錄
+            result = transcribe_chunked(audio_path, language=language, word_timestamps=True)
+            logger.info(f"Chunked transcription generated successfully for video: {video_path}")
+            return result
+
+        # 使用共享的faster-whisper模型統一轉錄（默認 small/int8/cpu）
+        model = get_whisper_model()
         
         # faster-whisper的API調用
         segments, info = model.transcribe(
-            video_path, 
-            language=None if language == 'auto' else language,
+            audio_path, 
+            language=language,
             word_timestamps=True
         )
         
         # 轉換為openai-whisper格式以保持兼容性
-        result = {
-            "text": "",
-            "segments": [],
-            "language": info.language
-        }
-        
-        full_text = []
-        for i, segment in enumerate(segments):
-            segment_data = {
-                "id": i,
-                "start": segment.start,
-                "end": segment.end,
-                "text": segment.text.strip()
-            }
-            
-            # 添加詞級時間戳
-            if hasattr(segment, 'words') and segment.words:
-                segment_data["words"] = []
-                for word in segment.words:
-                    segment_data["words"].append({
-                        "start": word.start,
-                        "end": word.end,
-                        "word": word.word,
-                        "probability": word.probability
-                    })
-            
-            result["segments"].append(segment_data)
-            full_text.append(segment.text.strip())
-        
-        result["text"] = " ".join(full_text)
-        
-        logger.info(f"Transcription generated successfully for video: {video_path} using faster-whisper small model")
+        segment_dicts = segments_to_dicts(segments)
+    finally:
+        os.remove(audio_path)
+
+    logger.info(f"Transcription generated successfully for video: {video_path} using faster-whisper {DEFAULT_MODEL_SIZE} model")
+    return {
+        "text": " ".join(segment["text"] for segment in segment_dicts),
+        "segments": segment_dicts,
+        "language": info.language
+    }
+
+def generate_transcription(video_path, language='auto', chunked=None, use_cache=True):
+    """Transcribe with word timestamps; chunked=None chunks media longer than CHUNKED_TRANSCRIPTION_MIN_SECONDS.
+
+    Results are cached by media content and model parameters, so re-styling
+    captions for the same video skips the model entirely.
+    """
+    try:
+        language = None if language == 'auto' else language
+        # Decided before the cache lookup: chunked and whole-file transcripts differ
+        if chunked is None:
+            chunked = (get_duration(video_path) or 0) >= CHUNKED_TRANSCRIPTION_MIN_SECONDS
+        media_hash = content_hash(video_path) if use_cache else None
+        cache_params = {'compute_type': DEFAULT_COMPUTE_TYPE, 'chunked': chunked}
+
+        if use_cache:
+            result = transcription_cache.get(media_hash, DEFAULT_MODEL_SIZE, language, **cache_params)
+            if result is not None:
+                logger.info(f"Using cached transcription for video: {video_path}")
+                return result
+
+        result = _run_transcription(video_path, language, chunked)
+
+        if use_cache:
+            transcription_cache.put(media_hash, DEFAULT_MODEL_SIZE, language, result, **cache_params)
         return result
     except Exception as e:
         logger.error(f"Error in transcription: {str(e)}")
@@ -114,11 +135,9 @@ def generate_transcription(video_path, language='auto'):
 
 def get_video_resolution(video_path):
     try:
-        probe = ffmpeg.probe(video_path)
-        video_streams = [s for s in probe['streams'] if s['codec_type'] == 'video']
-        if video_streams:
-            width = int(video_streams[0]['width'])
-            height = int(video_streams[0]['height'])
+        resolution = probe(video_path).resolution
+        if resolution:
+            width, height = resolution
             logger.info(f"Video resolution determined: {width}x{height}")
             return width, height
         else:
@@ -129,23 +148,8 @@ def get_video_resolution(video_path):
         return 384, 288
 
 def get_available_fonts():
-    """Get the list of available fonts on the system."""
-    try:
-        import matplotlib.font_manager as fm
-    except ImportError:
-        logger.error("matplotlib not installed. Install via 'pip install matplotlib'.")
-        return []
-    font_list = fm.findSystemFonts(fontpaths=None, fontext='ttf')
-    font_names = set()
-    for font in font_list:
-        try:
-            font_prop = fm.FontProperties(fname=font)
-            font_name = font_prop.get_name()
-            font_names.add(font_name)
-        except Exception:
-            continue
-    logger.info(f"Available fonts retrieved: {font_names}")
-    return list(font_names)
+    """Get the list of available font families (system fonts and the repo's fonts/)."""
+    return font_registry.get_families()
 
 def format_ass_time(seconds):
     """Convert float seconds to ASS time format H:MM:SS.cc"""
@@ -155,10 +159,37 @@ def format_ass_time(seconds):
     centiseconds = int(round((seconds - int(seconds)) * 100))
     return f"{hours}:{minutes:02}:{secs:02}.{centiseconds:02}"
 
+class TextReplacer:
+    """Applies a find -> replace dict in one pass over the text.
+
+    All finds are compiled into a single case-insensitive alternation, so
+    each word is scanned once instead of once per dict entry. Build it once
+    per caption job and pass it wherever a replace_dict is accepted.
+    """
+
+    def __init__(self, replace_dict):
+        finds = [old_word for old_word in replace_dict if old_word]
+        self._replacements = [replace_dict[old_word] for old_word in finds]
+        self._pattern = None
+        if finds:
+            # One group per find, earlier entries win where finds overlap; the
+            # lookahead on first characters skips positions no find can start at
+            first_chars = ''.join(sorted({re.escape(old_word[0]) for old_word in finds}))
+            alternation = '|'.join(f'({re.escape(old_word)})' for old_word in finds)
+            self._pattern = re.compile(f'(?=[{first_chars}])(?:{alternation})', re.IGNORECASE)
+
+    def _replace(self, match):
+        return self._replacements[match.lastindex - 1]
+
+    def __call__(self, text):
+        if self._pattern is None:
+            return text
+        return self._pattern.sub(self._replace, text)
+
 def process_subtitle_text(text, replace_dict, all_caps, max_words_per_line):
     """Apply text transformations: replacements, all caps, and optional line splitting."""
-    for old_word, new_word in replace_dict.items():
-        text = re.sub(re.escape(old_word), new_word, text, flags=re.IGNORECASE)
+    replacer = replace_dict if isinstance(replace_dict, TextReplacer) else TextReplacer(replace_dict)
+    text = replacer(text)
     if all_caps:
         text = text.upper()
     if max_words_per_line > 0:
@@ -282,10 +313,9 @@ def create_style_line(style_options, video_resolution):
     Create the style line for ASS subtitles.
     """
     font_family = style_options.get('font_family', 'Arial')
-    available_fonts = get_available_fonts()
-    if font_family not in available_fonts:
+    if not font_registry.is_available(font_family):
         logger.warning(f"Font '{font_family}' not found.")
-        return {'error': f"Font '{font_family}' not available.", 'available_fonts': available_fonts}
+        return {'error': f"Font '{font_family}' not available.", 'available_fonts': get_available_fonts()}
 
     line_color = rgb_to_ass_color(style_options.get('line_color', '#FFFFFF'))
     secondary_color = line_color
@@ -345,6 +375,44 @@ Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour,
 
 ### STYLE HANDLERS ###
 
+class DialogueEvent(NamedTuple):
+    """One Dialogue line before serialization; start/end in seconds."""
+    start: float
+    end: float
+    text: str
+    layer: int = 0
+
+def format_dialogue(event):
+    """Serialize a DialogueEvent as an ASS Dialogue line on the Default style."""
+    return f"Dialogue: {event.layer},{format_ass_time(event.start)},{format_ass_time(event.end)},Default,,0,0,0,,{event.text}"
+
+def _word_table(words, replacer, all_caps, keep_empty=False):
+    """Process each word once: (text, start, end), dropping empty words unless keep_empty."""
+    table = []
+    for w_info in words:
+        text = process_subtitle_text(w_info.get('word', ''), replacer, all_caps, 0)
+        if text or keep_empty:
+            table.append((text, w_info['start'], w_info['end']))
+    return table
+
+def _line_sets(items, max_words_per_line):
+    if max_words_per_line > 0:
+        return [items[i:i+max_words_per_line] for i in range(0, len(items), max_words_per_line)]
+    return [items]
+
+def _marked_lines(texts, open_tag, close_tag):
+    """
+    Yield the line once per word, with that word wrapped in open_tag/close_tag.
+    The line is joined once and each variant splices the tags in at the word's
+    offset, instead of rebuilding the word list for every word.
+    """
+    line = ' '.join(texts)
+    offset = 0
+    for text in texts:
+        end = offset + len(text)
+        yield f"{line[:offset]}{open_tag}{text}{close_tag}{line[end:]}"
+        offset = end + 1
+
 def handle_classic(transcription_result, style_options, replace_dict, video_resolution):
     """
     Classic style handler: Centers the text based on position and alignment.
@@ -367,17 +435,16 @@ def handle_classic(transcription_result, style_options, replace_dict, video_reso
 
     logger.info(f"[Classic] position={position_str}, alignment={alignment_str}, x={final_x}, y={final_y}, an_code={an_code}")
 
-    events = []
+    replacer = TextReplacer(replace_dict)
+    position_tag = f"{{\\an{an_code}\\pos({final_x},{final_y})}}"
+    count = 0
     for segment in transcription_result['segments']:
         text = segment['text'].strip().replace('\n', ' ')
         lines = split_lines(text, max_words_per_line)
-        processed_text = '\\N'.join(process_subtitle_text(line, replace_dict, all_caps, 0) for line in lines)
-        start_time = format_ass_time(segment['start'])
-        end_time = format_ass_time(segment['end'])
-        position_tag = f"{{\\an{an_code}\\pos({final_x},{final_y})}}"
-        events.append(f"Dialogue: 0,{start_time},{end_time},Default,,0,0,0,,{position_tag}{processed_text}")
-    logger.info(f"Handled {len(events)} dialogues in classic style.")
-    return "\n".join(events)
+        processed_text = '\\N'.join(process_subtitle_text(line, replacer, all_caps, 0) for line in lines)
+        count += 1
+        yield DialogueEvent(segment['start'], segment['end'], f"{position_tag}{processed_text}")
+    logger.info(f"Handled {count} dialogues in classic style.")
 
 def handle_karaoke(transcription_result, style_options, replace_dict, video_resolution):
     """
@@ -402,44 +469,21 @@ def handle_karaoke(transcription_result, style_options, replace_dict, video_reso
 
     logger.info(f"[Karaoke] position={position_str}, alignment={alignment_str}, x={final_x}, y={final_y}, an_code={an_code}")
 
-    events = []
+    replacer = TextReplacer(replace_dict)
+    line_prefix = f"{{\\an{an_code}\\pos({final_x},{final_y})}}{{\\c{word_color}}}"
+    count = 0
     for segment in transcription_result['segments']:
-        words = segment.get('words', [])
-        if not words:
+        word_table = _word_table(segment.get('words', []), replacer, all_caps, keep_empty=True)
+        if not word_table:
             continue
 
-        if max_words_per_line > 0:
-            lines_content = []
-            current_line = []
-            current_line_words = 0
-            for w_info in words:
-                w = process_subtitle_text(w_info.get('word', ''), replace_dict, all_caps, 0)
-                duration_cs = int(round((w_info['end'] - w_info['start']) * 100))
-                highlighted_word = f"{{\\k{duration_cs}}}{w} "
-                current_line.append(highlighted_word)
-                current_line_words += 1
-                if current_line_words >= max_words_per_line:
-                    lines_content.append(''.join(current_line).strip())
-                    current_line = []
-                    current_line_words = 0
-            if current_line:
-                lines_content.append(''.join(current_line).strip())
-        else:
-            line_content = []
-            for w_info in words:
-                w = process_subtitle_text(w_info.get('word', ''), replace_dict, all_caps, 0)
-                duration_cs = int(round((w_info['end'] - w_info['start']) * 100))
-                highlighted_word = f"{{\\k{duration_cs}}}{w} "
-                line_content.append(highlighted_word)
-            lines_content = [''.join(line_content).strip()]
+        karaoke_words = [f"{{\\k{int(round((w_end - w_start) * 100))}}}{w} " for w, w_start, w_end in word_table]
+        lines_content = [''.join(line).strip() for line in _line_sets(karaoke_words, max_words_per_line)]
 
         dialogue_text = '\\N'.join(lines_content)
-        start_time = format_ass_time(words[0]['start'])
-        end_time = format_ass_time(words[-1]['end'])
-        position_tag = f"{{\\an{an_code}\\pos({final_x},{final_y})}}"
-        events.append(f"Dialogue: 0,{start_time},{end_time},Default,,0,0,0,,{position_tag}{{\\c{word_color}}}{dialogue_text}")
-    logger.info(f"Handled {len(events)} dialogues in karaoke style.")
-    return "\n".join(events)
+        count += 1
+        yield DialogueEvent(word_table[0][1], word_table[-1][2], f"{line_prefix}{dialogue_text}")
+    logger.info(f"Handled {count} dialogues in karaoke style.")
 
 def handle_highlight(transcription_result, style_options, replace_dict, video_resolution):
     """
@@ -463,63 +507,34 @@ def handle_highlight(transcription_result, style_options, replace_dict, video_re
 
     word_color = rgb_to_ass_color(style_options.get('word_color', '#FFFF00'))
     line_color = rgb_to_ass_color(style_options.get('line_color', '#FFFFFF'))
-    events = []
 
     logger.info(f"[Highlight] position={position_str}, alignment={alignment_str}, x={final_x}, y={final_y}, an_code={an_code}")
 
-    for segment in transcription_result['segments']:
-        words = segment.get('words', [])
-        if not words:
-            continue
-
-        # Process all words in the segment
-        processed_words = []
-        for w_info in words:
-            w = process_subtitle_text(w_info.get('word', ''), replace_dict, all_caps, 0)
-            if w:
-                processed_words.append((w, w_info['start'], w_info['end']))
+    replacer = TextReplacer(replace_dict)
+    line_prefix = f"{{\\an{an_code}\\pos({final_x},{final_y})}}{{\\c{line_color}}}"
+    highlight_open = f"{{\\c{word_color}}}"
+    highlight_close = f"{{\\c{line_color}}}"
+    count = 0
 
-        if not processed_words:
+    for segment in transcription_result['segments']:
+        word_table = _word_table(segment.get('words', []), replacer, all_caps)
+        if not word_table:
             continue
 
-        # Split into lines if max_words_per_line is specified
-        if max_words_per_line > 0:
-            line_sets = [processed_words[i:i+max_words_per_line] for i in range(0, len(processed_words), max_words_per_line)]
-        else:
-            line_sets = [processed_words]
+        for line_set in _line_sets(word_table, max_words_per_line):
+            texts = [word for word, _, _ in line_set]
 
-        for line_set in line_sets:
-            # Get the start time of the first word and end time of the last word
-            line_start = line_set[0][1]
-            line_end = line_set[-1][2]
-            
             # Create a persistent line that stays visible during the entire segment
-            base_text = ' '.join(word for word, _, _ in line_set)
-            start_time = format_ass_time(line_start)
-            end_time = format_ass_time(line_end)
-            position_tag = f"{{\\an{an_code}\\pos({final_x},{final_y})}}"
-            events.append(f"Dialogue: 0,{start_time},{end_time},Default,,0,0,0,,{position_tag}{{\\c{line_color}}}{base_text}")
-            
+            count += 1
+            yield DialogueEvent(line_set[0][1], line_set[-1][2], f"{line_prefix}{' '.join(texts)}")
+
             # Add individual highlighting for each word
-            for idx, (word, w_start, w_end) in enumerate(line_set):
-                # Create the highlighted version of this word within the line
-                highlighted_words = []
-                
-                for i, (w, _, _) in enumerate(line_set):
-                    if i == idx:
-                        # This is the current word - highlight it
-                        highlighted_words.append(f"{{\\c{word_color}}}{w}{{\\c{line_color}}}")
-                    else:
-                        # Add the word without highlighting
-                        highlighted_words.append(w)
-                
-                highlighted_text = ' '.join(highlighted_words)
-                word_start_time = format_ass_time(w_start)
-                word_end_time = format_ass_time(w_end)
-                events.append(f"Dialogue: 1,{word_start_time},{word_end_time},Default,,0,0,0,,{position_tag}{{\\c{line_color}}}{highlighted_text}")
-
-    logger.info(f"Handled {len(events)} dialogues in highlight style.")
-    return "\n".join(events)
+            highlighted_lines = _marked_lines(texts, highlight_open, highlight_close)
+            for (_, w_start, w_end), highlighted_text in zip(line_set, highlighted_lines):
+                count += 1
+                yield DialogueEvent(w_start, w_end, f"{line_prefix}{highlighted_text}", 1)
+
+    logger.info(f"Handled {count} dialogues in highlight style.")
 
 def handle_underline(transcription_result, style_options, replace_dict, video_resolution):
     """
@@ -541,49 +556,30 @@ def handle_underline(transcription_result, style_options, replace_dict, video_re
         video_height=video_resolution[1]
     )
     line_color = rgb_to_ass_color(style_options.get('line_color', '#FFFFFF'))
-    events = []
 
     logger.info(f"[Underline] position={position_str}, alignment={alignment_str}, x={final_x}, y={final_y}, an_code={an_code}")
 
-    for segment in transcription_result['segments']:
-        words = segment.get('words', [])
-        if not words:
-            continue
-        processed_words = []
-        for w_info in words:
-            w = process_subtitle_text(w_info.get('word', ''), replace_dict, all_caps, 0)
-            if w:
-                processed_words.append((w, w_info['start'], w_info['end']))
+    replacer = TextReplacer(replace_dict)
+    line_prefix = f"{{\\an{an_code}\\pos({final_x},{final_y})}}{{\\c{line_color}}}"
+    count = 0
 
-        if not processed_words:
+    for segment in transcription_result['segments']:
+        word_table = _word_table(segment.get('words', []), replacer, all_caps)
+        if not word_table:
             continue
 
-        if max_words_per_line > 0:
-            line_sets = [processed_words[i:i+max_words_per_line] for i in range(0, len(processed_words), max_words_per_line)]
-        else:
-            line_sets = [processed_words]
-
-        for line_set in line_sets:
-            for idx, (word, w_start, w_end) in enumerate(line_set):
-                line_words = []
-                for w_idx, (w_text, _, _) in enumerate(line_set):
-                    if w_idx == idx:
-                        line_words.append(f"{{\\u1}}{w_text}{{\\u0}}")
-                    else:
-                        line_words.append(w_text)
-                full_text = ' '.join(line_words)
-                start_time = format_ass_time(w_start)
-                end_time = format_ass_time(w_end)
-                position_tag = f"{{\\an{an_code}\\pos({final_x},{final_y})}}"
-                events.append(f"Dialogue: 0,{start_time},{end_time},Default,,0,0,0,,{position_tag}{{\\c{line_color}}}{full_text}")
-    logger.info(f"Handled {len(events)} dialogues in underline style.")
-    return "\n".join(events)
+        for line_set in _line_sets(word_table, max_words_per_line):
+            texts = [word for word, _, _ in line_set]
+            underlined_lines = _marked_lines(texts, "{\\u1}", "{\\u0}")
+            for (_, w_start, w_end), full_text in zip(line_set, underlined_lines):
+                count += 1
+                yield DialogueEvent(w_start, w_end, f"{line_prefix}{full_text}")
+    logger.info(f"Handled {count} dialogues in underline style.")
 
 def handle_word_by_word(transcription_result, style_options, replace_dict, video_resolution):
     """
     Word-by-Word style handler: Displays each word individually.
     """
-    max_words_per_line = int(style_options.get('max_words_per_line', 0))
     all_caps = style_options.get('all_caps', False)
     if style_options['font_size'] is None:
         style_options['font_size'] = int(video_resolution[1] * 0.05)
@@ -599,31 +595,19 @@ def handle_word_by_word(transcription_result, style_options, replace_dict, video
         video_height=video_resolution[1]
     )
     word_color = rgb_to_ass_color(style_options.get('word_color', '#FFFF00'))
-    events = []
 
     logger.info(f"[Word-by-Word] position={position_str}, alignment={alignment_str}, x={final_x}, y={final_y}, an_code={an_code}")
 
-    for segment in transcription_result['segments']:
-        words = segment.get('words', [])
-        if not words:
-            continue
-
-        if max_words_per_line > 0:
-            grouped_words = [words[i:i+max_words_per_line] for i in range(0, len(words), max_words_per_line)]
-        else:
-            grouped_words = [words]
+    replacer = TextReplacer(replace_dict)
+    word_prefix = f"{{\\an{an_code}\\pos({final_x},{final_y})}}{{\\c{word_color}}}"
+    count = 0
 
-        for word_group in grouped_words:
-            for w_info in word_group:
-                w = process_subtitle_text(w_info.get('word', ''), replace_dict, all_caps, 0)
-                if not w:
-                    continue
-                start_time = format_ass_time(w_info['start'])
-                end_time = format_ass_time(w_info['end'])
-                position_tag = f"{{\\an{an_code}\\pos({final_x},{final_y})}}"
-                events.append(f"Dialogue: 0,{start_time},{end_time},Default,,0,0,0,,{position_tag}{{\\c{word_color}}}{w}")
-    logger.info(f"Handled {len(events)} dialogues in word-by-word style.")
-    return "\n".join(events)
+    # Every word is its own event, so max_words_per_line does not change the output
+    for segment in transcription_result['segments']:
+        for w, w_start, w_end in _word_table(segment.get('words', []), replacer, all_caps):
+            count += 1
+            yield DialogueEvent(w_start, w_end, f"{word_prefix}{w}")
+    logger.info(f"Handled {count} dialogues in word-by-word style.")
 
 STYLE_HANDLERS = {
     'classic': handle_classic,
@@ -633,9 +617,10 @@ STYLE_HANDLERS = {
     'word_by_word': handle_word_by_word
 }
 
-def srt_to_ass(transcription_result, style_type, settings, replace_dict, video_resolution):
+def build_ass_events(transcription_result, style_type, settings, replace_dict, video_resolution):
     """
-    Convert transcription result to ASS based on the specified style.
+    Build the ASS header and a lazy iterator of DialogueEvents for the specified style.
+    Returns (header, events), or an error dict when the header cannot be built.
     """
     default_style_settings = {
         'line_color': '#FFFFFF',
@@ -676,7 +661,38 @@ def srt_to_ass(transcription_result, style_type, settings, replace_dict, video_r
         logger.warning(f"Unknown style '{style_type}', defaulting to 'classic'.")
         handler = handle_classic
 
-    dialogue_lines = handler(transcription_result, style_options, replace_dict, video_resolution)
+    return ass_header, handler(transcription_result, style_options, replace_dict, video_resolution)
+
+def exclude_events(events, exclude_time_ranges):
+    """Drop events overlapping any of exclude_time_ranges, before they are serialized."""
+    excluded = exclude_intervals(exclude_time_ranges)
+    for event in events:
+        if not excluded.overlaps(event.start, event.end):
+            yield event
+
+def write_ass_file(path, ass_header, events):
+    """
+    Stream the header and events to path through a buffered writer, one line at a time.
+    Returns the number of Dialogue lines written.
+    """
+    count = 0
+    with open(path, 'w', encoding='utf-8', buffering=ASS_WRITE_BUFFER_SIZE) as f:
+        f.write(ass_header)
+        for event in events:
+            f.write(format_dialogue(event))
+            f.write("\n")
+            count += 1
+    return count
+
+def srt_to_ass(transcription_result, style_type, settings, replace_dict, video_resolution):
+    """
+    Convert transcription result to ASS based on the specified style.
+    """
+    result = build_ass_events(transcription_result, style_type, settings, replace_dict, video_resolution)
+    if isinstance(result, dict):
+        return result
+    ass_header, events = result
+    dialogue_lines = "\n".join(format_dialogue(event) for event in events)
     logger.info("Converted transcription result to ASS format.")
     return ass_header + dialogue_lines + "\n"
 
@@ -703,6 +719,10 @@ def parse_time_string(time_str):
     total_seconds = int(h) * 3600 + int(m) * 60 + float(s)
     return total_seconds
 
+def exclude_intervals(exclude_time_ranges):
+    """Parse exclude_time_ranges into a merged IntervalSet for overlap queries."""
+    return IntervalSet((parse_time_string(rng['start']), parse_time_string(rng['end'])) for rng in exclude_time_ranges)
+
 def filter_subtitle_lines(sub_content, exclude_time_ranges, subtitle_type):
     """
     Remove subtitle lines/blocks that overlap with exclude_time_ranges.
@@ -716,44 +736,22 @@ def filter_subtitle_lines(sub_content, exclude_time_ranges, subtitle_type):
             return int(h) * 3600 + int(m) * 60 + int(s) + int(cs) / 100
         except Exception:
             return 0
-    def parse_time_range(rng):
-        start = parse_time_string(rng['start'])
-        end = parse_time_string(rng['end'])
-        return {'start': start, 'end': end}
-    parsed_ranges = [parse_time_range(rng) for rng in exclude_time_ranges]
     if not exclude_time_ranges:
         return sub_content
+    excluded = exclude_intervals(exclude_time_ranges)
     if subtitle_type == 'ass':
         lines = sub_content.splitlines()
         filtered_lines = []
         for line in lines:
             if line.startswith("Dialogue:"):
-                parts = line.split(",", 10)
-                if len(parts) > 3:
-                    start = parse_ass_time(parts[1])
-                    end = parse_ass_time(parts[2])
-                    overlap = False
-                    for rng in parsed_ranges:
-                        if start < rng['end'] and end > rng['start']:
-                            overlap = True
-                            break
-                    if overlap:
-                        continue
+                parts = line.split(",", 3)
+                if len(parts) > 3 and excluded.overlaps(parse_ass_time(parts[1]), parse_ass_time(parts[2])):
+                    continue
             filtered_lines.append(line)
         return "\n".join(filtered_lines)
     elif subtitle_type == 'srt':
         subtitles = list(srt.parse(sub_content))
-        filtered = []
-        for sub in subtitles:
-            start = sub.start.total_seconds()
-            end = sub.end.total_seconds()
-            overlap = False
-            for rng in parsed_ranges:
-                if start < rng['end'] and end > rng['start']:
-                    overlap = True
-                    break
-            if not overlap:
-                filtered.append(sub)
+        filtered = [sub for sub in subtitles if not excluded.overlaps(sub.start.total_seconds(), sub.end.total_seconds())]
         return srt.compose(filtered)
     else:
         return sub_content
@@ -774,11 +772,30 @@ def normalize_exclude_time_ranges(exclude_time_ranges):
         norm.append({"start": start, "end": end})
     return norm
 
-def generate_ass_captions_v1(video_url, captions, settings, replace, exclude_time_ranges, job_id, language='auto', PlayResX=None, PlayResY=None):
+def validate_caption_settings(settings, replace):
+    """
+    Checks that need neither the video nor the captions, so callers can run
+    them before downloading anything.
+    Returns None when settings and replace are usable, otherwise an error dict
+    shaped like generate_ass_captions_v1's ('available_fonts' for an unknown font).
+    """
+    if not isinstance(settings, dict):
+        return {"error": "'settings' should be a dictionary."}
+    if not isinstance(replace, list):
+        return {"error": "'replace' should be a list of objects with 'find' and 'replace' keys."}
+    font_family = {k.replace('-', '_'): v for k, v in settings.items()}.get('font_family', 'Arial')
+    if not font_registry.is_available(font_family):
+        return {"error": f"Font '{font_family}' not available.", "available_fonts": get_available_fonts()}
+    return None
+
+def generate_ass_captions_v1(video_url, captions, settings, replace, exclude_time_ranges, job_id, language='auto', PlayResX=None, PlayResY=None,
+                             video_path=None, stage_timings=None):
     """
     Captioning process with transcription fallback and multiple styles.
     Integrates with the updated logic for positioning and alignment.
     If PlayResX and PlayResY are provided, use them for ASS generation; otherwise, get from video.
+    If video_path is provided it is used as the already-downloaded source and video_url is not fetched;
+    the caller keeps ownership of the file. Stage wall times are recorded in stage_timings when given.
     """
     try:
         logger.info(f"Job {job_id}: 步驟3 - 開始核心字幕生成服務處理")
@@ -787,17 +804,14 @@ def generate_ass_captions_v1(video_url, captions, settings, replace, exclude_tim
         if exclude_time_ranges:
             exclude_time_ranges = normalize_exclude_time_ranges(exclude_time_ranges)
 
-        if not isinstance(settings, dict):
-            logger.error(f"Job {job_id}: 'settings' should be a dictionary.")
-            return {"error": "'settings' should be a dictionary."}
+        settings_error = validate_caption_settings(settings, replace)
+        if settings_error:
+            logger.error(f"Job {job_id}: {settings_error['error']}")
+            return settings_error
 
         # Normalize keys by replacing hyphens with underscores
         style_options = {k.replace('-', '_'): v for k, v in settings.items()}
 
-        if not isinstance(replace, list):
-            logger.error(f"Job {job_id}: 'replace' should be a list of objects with 'find' and 'replace' keys.")
-            return {"error": "'replace' should be a list of objects with 'find' and 'replace' keys."}
-
         # Convert 'replace' list to dictionary
         replace_dict = {}
         for item in replace:
@@ -811,15 +825,7 @@ def generate_ass_captions_v1(video_url, captions, settings, replace, exclude_tim
             logger.warning(f"Job {job_id}: 'highlight_color' is deprecated; merging into 'word_color'.")
             style_options['word_color'] = style_options.pop('highlight_color')
 
-        # Check font availability
-        font_family = style_options.get('font_family', 'Arial')
-        available_fonts = get_available_fonts()
-        if font_family not in available_fonts:
-            logger.warning(f"Job {job_id}: Font '{font_family}' not found.")
-            # Return font error with available_fonts
-            return {"error": f"Font '{font_family}' not available.", "available_fonts": available_fonts}
-
-        logger.info(f"Job {job_id}: Font '{font_family}' is available.")
+        logger.info(f"Job {job_id}: Font '{style_options.get('font_family', 'Arial')}' is available.")
 
         # Determine if captions is a URL or raw content
         if captions and is_url(captions):
@@ -835,15 +841,19 @@ def generate_ass_captions_v1(video_url, captions, settings, replace, exclude_tim
         else:
             captions_content = None
 
-        # Download the video
-        logger.info(f"Job {job_id}: 步驟3 - 開始視頻文件下載")
-        try:
-            video_path = download_file(video_url, LOCAL_STORAGE_PATH)
-            logger.info(f"Job {job_id}: 步驟3 - 視頻文件下載完成: {video_path}")
-        except Exception as e:
-            logger.error(f"Job {job_id}: 步驟3 - 視頻文件下載失敗: {str(e)}")
-            # For non-font errors, do NOT include available_fonts
-            return {"error": str(e)}
+        # Download the video, unless the caller already holds a local copy
+        if video_path is None:
+            logger.info(f"Job {job_id}: 步驟3 - 開始視頻文件下載")
+            try:
+                with timed_stage(stage_timings, 'download'):
+                    video_path = download_file(video_url, LOCAL_STORAGE_PATH)
+                logger.info(f"Job {job_id}: 步驟3 - 視頻文件下載完成: {video_path}")
+            except Exception as e:
+                logger.error(f"Job {job_id}: 步驟3 - 視頻文件下載失敗: {str(e)}")
+                # For non-font errors, do NOT include available_fonts
+                return {"error": str(e)}
+        else:
+            logger.info(f"Job {job_id}: 步驟3 - 使用已下載的視頻文件: {video_path}")
 
         # Get video resolution, unless provided
         logger.info(f"Job {job_id}: 步驟4 - 開始視頻分辨率檢測")
@@ -851,21 +861,25 @@ def generate_ass_captions_v1(video_url, captions, settings, replace, exclude_tim
             video_resolution = (PlayResX, PlayResY)
             logger.info(f"Job {job_id}: 步驟4 - 使用提供的分辨率: {PlayResX}x{PlayResY}")
         else:
-            video_resolution = get_video_resolution(video_path)
+            with timed_stage(stage_timings, 'probe'):
+                video_resolution = get_video_resolution(video_path)
             logger.info(f"Job {job_id}: 步驟4 - 視頻分辨率檢測完成: {video_resolution[0]}x{video_resolution[1]}")
 
         # Determine style type
         style_type = style_options.get('style', 'classic').lower()
         logger.info(f"Job {job_id}: Using style '{style_type}' for captioning.")
 
-        # Determine subtitle content
+        # Determine subtitle content: raw ASS is kept as text, everything else
+        # becomes a lazy event stream that is only materialized on disk
+        subtitle_content = None
+        ass_events = None
+        subtitle_type = 'ass'
         if captions_content:
             logger.info(f"Job {job_id}: 步驟6 - 開始處理手動字幕內容")
             # Check if it's ASS by looking for '[Script Info]'
             if '[Script Info]' in captions_content:
                 # It's ASS directly
                 subtitle_content = captions_content
-                subtitle_type = 'ass'
                 logger.info(f"Job {job_id}: 步驟6 - 檢測到ASS格式字幕")
             else:
                 # Treat as SRT
@@ -875,39 +889,41 @@ def generate_ass_captions_v1(video_url, captions, settings, replace, exclude_tim
                     error_message = "Only 'classic' style is supported for SRT captions."
                     logger.error(f"Job {job_id}: 步驟6 - SRT字幕樣式驗證失敗: {error_message}")
                     return {"error": error_message}
-                transcription_result = srt_to_transcription_result(captions_content)
                 # Generate ASS based on chosen style
-                subtitle_content = process_subtitle_events(transcription_result, style_type, settings, replace_dict, video_resolution)
-                subtitle_type = 'ass'
+                with timed_stage(stage_timings, 'ass_build'):
+                    transcription_result = srt_to_transcription_result(captions_content)
+                    ass_events = build_ass_events(transcription_result, style_type, settings, replace_dict, video_resolution)
                 logger.info(f"Job {job_id}: 步驟6 - 手動字幕格式轉換完成")
         else:
             # No captions provided, generate transcription
             logger.info(f"Job {job_id}: 步驟5 - 開始自動語音轉錄")
-            transcription_result = generate_transcription(video_path, language=language)
+            with timed_stage(stage_timings, 'transcribe'):
+                transcription_result = generate_transcription(video_path, language=language)
             logger.info(f"Job {job_id}: 步驟5 - 自動語音轉錄完成")
             # Generate ASS based on chosen style
             logger.info(f"Job {job_id}: 步驟6 - 開始字幕格式處理")
-            subtitle_content = process_subtitle_events(transcription_result, style_type, settings, replace_dict, video_resolution)
-            subtitle_type = 'ass'
+            with timed_stage(stage_timings, 'ass_build'):
+                ass_events = build_ass_events(transcription_result, style_type, settings, replace_dict, video_resolution)
             logger.info(f"Job {job_id}: 步驟6 - 字幕格式處理完成")
 
         # Check for subtitle processing errors
-        if isinstance(subtitle_content, dict) and 'error' in subtitle_content:
-            logger.error(f"Job {job_id}: {subtitle_content['error']}")
+        if isinstance(ass_events, dict) and 'error' in ass_events:
+            logger.error(f"Job {job_id}: {ass_events['error']}")
             # Only include 'available_fonts' if it's a font-related error
-            if 'available_fonts' in subtitle_content:
-                return {"error": subtitle_content['error'], "available_fonts": subtitle_content.get('available_fonts', [])}
+            if 'available_fonts' in ass_events:
+                return {"error": ass_events['error'], "available_fonts": ass_events.get('available_fonts', [])}
             else:
-                return {"error": subtitle_content['error']}
+                return {"error": ass_events['error']}
 
-        # After subtitle_content is generated and before saving to file:
+        # Exclude time ranges before anything is serialized
         logger.info(f"Job {job_id}: 步驟7 - 開始字幕樣式處理")
         if exclude_time_ranges:
-            subtitle_content = filter_subtitle_lines(subtitle_content, exclude_time_ranges, subtitle_type)
-            if subtitle_type == 'ass':
-                logger.info(f"Job {job_id}: 步驟7 - ASS字幕時間範圍過濾完成")
-            elif subtitle_type == 'srt':
-                logger.info(f"Job {job_id}: 步驟7 - SRT字幕時間範圍過濾完成")
+            if ass_events is not None:
+                ass_header, events = ass_events
+                ass_events = (ass_header, exclude_events(events, exclude_time_ranges))
+            else:
+                subtitle_content = filter_subtitle_lines(subtitle_content, exclude_time_ranges, subtitle_type)
+            logger.info(f"Job {job_id}: 步驟7 - ASS字幕時間範圍過濾完成")
 
         # Save the subtitle content
         logger.info(f"Job {job_id}: 步驟8 - 開始字幕文件生成")
@@ -918,11 +934,20 @@ def generate_ass_captions_v1(video_url, captions, settings, replace, exclude_tim
         try:
             # Ensure the directory exists
             os.makedirs(absolute_storage_path, exist_ok=True)
-            with open(subtitle_path, 'w', encoding='utf-8') as f:
-                f.write(subtitle_content)
-            logger.info(f"Job {job_id}: 步驟8 - 字幕文件生成完成: {subtitle_path}")
+            if ass_events is not None:
+                # Events are generated, filtered and written in one pass
+                with timed_stage(stage_timings, 'ass_build'):
+                    event_count = write_ass_file(subtitle_path, *ass_events)
+                logger.info(f"Job {job_id}: 步驟8 - 字幕文件生成完成: {subtitle_path} ({event_count} 條字幕事件)")
+            else:
+                with open(subtitle_path, 'w', encoding='utf-8') as f:
+                    f.write(subtitle_content)
+                logger.info(f"Job {job_id}: 步驟8 - 字幕文件生成完成: {subtitle_path}")
         except Exception as e:
             logger.error(f"Job {job_id}: 步驟8 - 字幕文件生成失敗: {str(e)}")
+            # Do not leave a truncated file behind when the event stream fails midway
+            if os.path.exists(subtitle_path):
+                os.remove(subtitle_path)
             return {"error": f"Failed to save subtitle file: {str(e)}"}
 
         return subtitle_path
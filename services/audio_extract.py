@@ -0,0 +1,101 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import uuid
+import logging
+import threading
+import subprocess
+from services.media_probe import content_hash
+from services.download_cache import download_cache, _clone_file, DOWNLOAD_CACHE_ENABLED
+
+logger = logging.getLogger(__name__)
+
+# Whisper models consume 16 kHz mono; anything richer is resampled on decode
+TRANSCRIPTION_SAMPLE_RATE = 16000
+
+# A fixed set of striped locks: one extraction per source at a time without
+# keeping a lock per file ever seen
+_LOCK_STRIPES = 64
+_locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+
+def _lock_for(key):
+    return _locks[int(key[:8], 16) % _LOCK_STRIPES]
+
+def _run_extract(input_filename, output_filename):
+    cmd = [
+        'ffmpeg', '-y', '-v', 'error',
+        '-i', input_filename,
+        '-map', '0:a:0', '-vn', '-sn', '-dn',
+        '-ac', '1', '-ar', str(TRANSCRIPTION_SAMPLE_RATE),
+        '-c:a', 'flac', '-f', 'flac',
+        output_filename
+    ]
+    logger.info(f"Extracting transcription audio: {' '.join(cmd)}")
+    process = subprocess.run(cmd, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise Exception(f"FFmpeg error: {process.stderr}")
+
+def extract_transcription_audio(input_filename, output_filename=None):
+    """Extract the first audio track as 16 kHz mono FLAC for transcription.
+
+    The result is cached in the download cache directory under the SHA-256
+    of the source's content, so retries and re-captioning of the same media skip
+    the extraction, and it is evicted together with the downloads.
+
+    Args:
+        input_filename (str): Local media file (video or audio)
+        output_filename (str, optional): Caller-owned destination, defaults to
+            the input name with a .16k.flac extension
+
+    Returns:
+        str: output_filename, which the caller may delete
+    """
+    if output_filename is None:
+        output_filename = f"{os.path.splitext(input_filename)[0]}.16k.flac"
+
+    if not DOWNLOAD_CACHE_ENABLED:
+        _run_extract(input_filename, output_filename)
+        return output_filename
+
+    key = content_hash(input_filename)
+    cached_path = os.path.join(download_cache.cache_dir, f"{key}.16k.flac")
+
+    with _lock_for(key):
+        if os.path.exists(cached_path):
+            try:
+                os.utime(cached_path, None)
+                _clone_file(cached_path, output_filename)
+                logger.info(f"Reusing extracted audio for {input_filename}")
+                return output_filename
+            except FileNotFoundError:
+                # Evicted between the check and the clone
+                pass
+
+        os.makedirs(download_cache.cache_dir, exist_ok=True)
+        tmp_path = os.path.join(download_cache.cache_dir, f"{key}.{uuid.uuid4().hex}.tmp")
+        try:
+            _run_extract(input_filename, tmp_path)
+            os.replace(tmp_path, cached_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        _clone_file(cached_path, output_filename)
+
+    download_cache.evict()
+    return output_filename
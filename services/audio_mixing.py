@@ -19,13 +19,12 @@
 import os
 import subprocess
 from services.file_management import download_file
+from services.media_probe import probe
 
 STORAGE_PATH = "/tmp/"
 
 def get_duration(file_path):
-    cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', file_path]
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    return float(result.stdout)
+    return probe(file_path).duration
 
 def process_audio_mixing(video_url, audio_url, video_vol, audio_vol, output_length, job_id, webhook_url=None):
     video_path = download_file(video_url, STORAGE_PATH)
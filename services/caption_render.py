@@ -0,0 +1,206 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import bisect
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from services.media_probe import probe
+from services.cpu_budget import cpu_budget
+from services.font_registry import REPO_FONTS_DIR
+from services.v1.video.segment_extract import keyframe_at_or_after, concat_copy, KEYFRAME_EPSILON
+
+logger = logging.getLogger(__name__)
+
+# 'single' burns captions in one ffmpeg pass, 'segmented' renders keyframe-aligned
+# chunks in parallel and stream-concatenates them
+CAPTION_RENDER_MODES = ('single', 'segmented')
+CAPTION_RENDER_MODE = os.environ.get('CAPTION_RENDER_MODE', 'single').lower()
+
+# Shorter chunks spend more on process start-up and libass setup than they save
+CAPTION_MIN_CHUNK_SECONDS = float(os.environ.get('CAPTION_MIN_CHUNK_SECONDS', '20'))
+
+CAPTION_VIDEO_CODEC = 'libx264'
+
+_SLICE_BUFFER_SIZE = 256 * 1024
+
+def _parse_ass_time(ass_time):
+    h, m, rest = ass_time.strip().split(':')
+    return int(h) * 3600 + int(m) * 60 + float(rest)
+
+def _run(cmd, description, cwd=None):
+    logger.info(f"{description}: {' '.join(cmd)}")
+    process = subprocess.run(cmd, capture_output=True, text=True, cwd=cwd)
+    if process.returncode != 0:
+        logger.error(f"Error during {description}: {process.stderr}")
+        raise Exception(f"FFmpeg error: {process.stderr}")
+
+def plan_chunks(duration, keyframes, chunk_count, min_chunk_seconds=CAPTION_MIN_CHUNK_SECONDS):
+    """Split a video into at most chunk_count ranges that each start on a keyframe.
+
+    Args:
+        duration (float): Video duration in seconds
+        keyframes (list): Sorted keyframe timestamps
+        chunk_count (int): Desired number of chunks
+        min_chunk_seconds (float): Lower bound on the nominal chunk length
+
+    Returns:
+        list: (start, end) tuples in seconds; the last end is None (end of file)
+    """
+    chunk_count = max(1, min(chunk_count, int(duration // min_chunk_seconds)))
+    boundaries = [0.0]
+    for i in range(1, chunk_count):
+        boundary = keyframe_at_or_after(keyframes, duration * i / chunk_count)
+        # Sparse keyframes can snap several targets onto the same one
+        if boundary is not None and boundary > boundaries[-1] + KEYFRAME_EPSILON and boundary < duration - KEYFRAME_EPSILON:
+            boundaries.append(boundary)
+    return list(zip(boundaries, boundaries[1:] + [None]))
+
+def slice_ass(ass_path, chunks, output_prefix):
+    """Split an ASS file into one file per chunk in a single pass.
+
+    Each slice keeps every non-Dialogue line (script info, styles, event
+    format) and the Dialogue lines overlapping its chunk, with their
+    original timestamps, so libass in each worker only parses its share.
+
+    Returns:
+        list: Slice paths, one per chunk
+    """
+    starts = [start for start, _ in chunks]
+    paths = [f"{output_prefix}_{index}.ass" for index in range(len(chunks))]
+    outputs = [open(path, 'w', encoding='utf-8', buffering=_SLICE_BUFFER_SIZE) for path in paths]
+    try:
+        with open(ass_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.startswith('Dialogue:'):
+                    for output in outputs:
+                        output.write(line)
+                    continue
+                parts = line.split(',', 3)
+                try:
+                    start, end = _parse_ass_time(parts[1]), _parse_ass_time(parts[2])
+                except (IndexError, ValueError):
+                    continue
+                # The chunk the event starts in, then every later chunk it runs into
+                first = max(bisect.bisect_right(starts, start) - 1, 0)
+                for index in range(first, len(chunks)):
+                    if index > first and chunks[index][0] >= end:
+                        break
+                    outputs[index].write(line)
+    finally:
+        for output in outputs:
+            output.close()
+    return paths
+
+def _subtitles_filter(ass_filename, start, fonts_dir):
+    # Frames are moved back to source time for libass so karaoke and animation
+    # tags in events that straddle a boundary render exactly as in one pass
+    subtitles = f"subtitles={ass_filename}"
+    if fonts_dir:
+        subtitles += f":fontsdir='{fonts_dir}'"
+    return f"setpts=PTS+{start}/TB,{subtitles},setpts=PTS-STARTPTS"
+
+def render_chunk(video_path, start, end, ass_path, output_path, threads, fonts_dir=REPO_FONTS_DIR):
+    """Burn ass_path into the video-only range [start, end) of video_path."""
+    cmd = ['ffmpeg', '-y', '-ss', str(start), '-i', os.path.abspath(video_path)]
+    if end is not None:
+        cmd += ['-t', str(end - start)]
+    # Run next to the slice so the subtitles filter gets a path without anything to escape
+    cmd += [
+        '-map', '0:v:0',
+        '-vf', _subtitles_filter(os.path.basename(ass_path), start, fonts_dir),
+        '-c:v', CAPTION_VIDEO_CODEC,
+        '-threads', str(threads),
+        '-an',
+        os.path.abspath(output_path)
+    ]
+    _run(cmd, f"rendering caption chunk {start}-{end if end is not None else 'end'}", cwd=os.path.dirname(os.path.abspath(ass_path)))
+
+def render_captions_segmented(video_path, ass_path, output_path, chunk_count=None, fonts_dir=REPO_FONTS_DIR):
+    """Burn captions into a video as parallel keyframe-aligned chunks.
+
+    The source is split at keyframes, every chunk gets a slice of the ASS
+    file with only its events, and the chunks render concurrently within
+    the shared CPU budget. The rendered chunks are stream-concatenated and
+    the source audio is copied in untouched, so chunk boundaries never
+    touch the audio.
+
+    Args:
+        video_path (str): Local source video
+        ass_path (str): Subtitle file from generate_ass_captions_v1
+        output_path (str): Destination .mp4
+        chunk_count (int, optional): Number of chunks, sized to the CPU budget by default
+        fonts_dir (str, optional): Extra font directory for libass
+
+    Returns:
+        int: Number of chunks rendered
+    """
+    probe_result = probe(video_path, keyframes=True)
+    duration = probe_result.duration
+    if not chunk_count:
+        chunk_count, _ = cpu_budget.plan(int(duration // CAPTION_MIN_CHUNK_SECONDS) if duration else 1)
+    if duration and probe_result.keyframes:
+        chunks = plan_chunks(duration, probe_result.keyframes, chunk_count)
+    else:
+        chunks = [(0.0, None)]
+
+    workers, threads_per_job = cpu_budget.plan(len(chunks))
+    logger.info(f"Rendering captions in {len(chunks)} chunks with {workers} workers, {threads_per_job} threads each")
+
+    prefix = os.path.splitext(os.path.abspath(output_path))[0]
+    temp_files = []
+    try:
+        slice_paths = slice_ass(ass_path, chunks, f"{prefix}_slice")
+        temp_files += slice_paths
+        chunk_paths = [f"{prefix}_chunk_{index}.mp4" for index in range(len(chunks))]
+        temp_files += chunk_paths
+
+        def render(index):
+            start, end = chunks[index]
+            with cpu_budget.reserve(threads_per_job) as threads:
+                render_chunk(video_path, start, end, slice_paths[index], chunk_paths[index], threads, fonts_dir)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(render, index) for index in range(len(chunks))]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+            except Exception:
+                # The render has failed, don't start the chunks still queued
+                executor.shutdown(cancel_futures=True)
+                raise
+
+        list_file = f"{prefix}_chunks.txt"
+        temp_files.append(list_file)
+        if probe_result.has_audio:
+            video_only = f"{prefix}_video.mp4"
+            temp_files.append(video_only)
+            concat_copy(chunk_paths, video_only, list_file)
+            _run([
+                'ffmpeg', '-y', '-i', video_only, '-i', os.path.abspath(video_path),
+                '-map', '0:v:0', '-map', '1:a:0', '-c', 'copy', '-movflags', '+faststart',
+                output_path
+            ], "muxing source audio into captioned video")
+        else:
+            concat_copy(chunk_paths, output_path, list_file)
+        return len(chunks)
+    finally:
+        for temp_file in temp_files:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
@@ -0,0 +1,188 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import bisect
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from services.media_probe import get_duration
+from services.whisper_models import get_whisper_model, DEFAULT_NUM_WORKERS
+from services.v1.media.silence import find_silences
+from config import LOCAL_STORAGE_PATH
+
+logger = logging.getLogger(__name__)
+
+# Media at least this long is transcribed in chunks by default
+CHUNKED_TRANSCRIPTION_MIN_SECONDS = float(os.environ.get('CHUNKED_TRANSCRIPTION_MIN_SECONDS', '900'))
+
+# Target chunk length; the actual split lands on the nearest pause
+TRANSCRIBE_CHUNK_SECONDS = float(os.environ.get('TRANSCRIBE_CHUNK_SECONDS', '300'))
+
+# Pauses used as split points; shorter than this and words may be cut
+SPLIT_SILENCE_THRESHOLD = "-35dB"
+SPLIT_SILENCE_MIN_DURATION = 0.4
+
+def segments_to_dicts(segments, word_timestamps=True, offset=0.0):
+    """Convert faster-whisper segments to openai-whisper style dicts, shifted by offset seconds."""
+    result = []
+    for segment in segments:
+        segment_data = {
+            "id": len(result),
+            "start": segment.start + offset,
+            "end": segment.end + offset,
+            "text": segment.text.strip()
+        }
+
+        # 添加詞級時間戳
+        if word_timestamps and getattr(segment, 'words', None):
+            segment_data["words"] = [{
+                "start": word.start + offset,
+                "end": word.end + offset,
+                "word": word.word,
+                "probability": word.probability
+            } for word in segment.words]
+
+        result.append(segment_data)
+    return result
+
+def plan_chunks(duration, silences, target_seconds=TRANSCRIBE_CHUNK_SECONDS):
+    """Split [0, duration) into chunks of about target_seconds, cutting in the middle of pauses.
+
+    A cut is placed at the pause midpoint closest to the target boundary, searched
+    between half and one and a half chunk lengths from the previous cut. Without a
+    pause in that window the chunk is cut at exactly target_seconds.
+
+    Args:
+        duration (float): Media duration in seconds
+        silences (list): (start, end, duration) tuples as returned by find_silences
+        target_seconds (float): Desired chunk length
+
+    Returns:
+        list: (start, end) tuples covering the whole media
+    """
+    midpoints = sorted((start + end) / 2 for start, end, _ in silences)
+    cuts = []
+    last = 0.0
+    while duration - last > target_seconds * 1.5:
+        target = last + target_seconds
+        lo = bisect.bisect_left(midpoints, last + target_seconds * 0.5)
+        hi = bisect.bisect_right(midpoints, last + target_seconds * 1.5)
+        candidates = midpoints[lo:hi]
+        cut = min(candidates, key=lambda m: abs(m - target)) if candidates else target
+        cuts.append(cut)
+        last = cut
+
+    bounds = [0.0] + cuts + [duration]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def _extract_chunk(input_filename, start, end, output_filename):
+    # 16 kHz mono PCM is what the model resamples to anyway
+    cmd = [
+        'ffmpeg', '-y', '-v', 'error',
+        '-ss', str(start), '-t', str(end - start),
+        '-i', input_filename,
+        '-vn', '-ac', '1', '-ar', '16000', '-c:a', 'pcm_s16le',
+        output_filename
+    ]
+    process = subprocess.run(cmd, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise Exception(f"FFmpeg error: {process.stderr}")
+
+def transcribe_chunked(input_filename, language=None, task='transcribe', word_timestamps=True,
+                       model_size=None, chunk_seconds=TRANSCRIBE_CHUNK_SECONDS, max_workers=None,
+                       temp_prefix=None):
+    """Transcribe long media as pause-aligned chunks running concurrently on the shared model.
+
+    With language=None the first chunk is transcribed alone to detect the
+    language, which is then pinned for the remaining chunks so every chunk
+    is decoded the same way.
+
+    Args:
+        input_filename (str): Local media file
+        language (str, optional): Language code, None to detect
+        task (str): 'transcribe' or 'translate'
+        word_timestamps (bool): Collect word-level timestamps
+        model_size (str, optional): Whisper model size, defaults to the registry default
+        chunk_seconds (float): Target chunk length in seconds
+        max_workers (int, optional): Concurrent chunks, defaults to WHISPER_NUM_WORKERS
+        temp_prefix (str, optional): Prefix for chunk audio files
+
+    Returns:
+        dict: openai-whisper style result with text, segments and language
+    """
+    duration = get_duration(input_filename)
+    if not duration:
+        raise Exception(f"Could not determine duration of {input_filename}")
+
+    silences = find_silences(input_filename, SPLIT_SILENCE_THRESHOLD, SPLIT_SILENCE_MIN_DURATION)
+    chunks = plan_chunks(duration, silences, chunk_seconds)
+    logger.info(f"Transcribing {duration:.1f}s in {len(chunks)} chunks split at pauses")
+
+    model = get_whisper_model(model_size)
+    temp_prefix = temp_prefix or os.path.join(LOCAL_STORAGE_PATH, f"chunk_{os.getpid()}_{id(chunks)}")
+    chunk_files = [f"{temp_prefix}_{index}.wav" for index in range(len(chunks))]
+
+    def transcribe_chunk(index, chunk_language):
+        start, end = chunks[index]
+        _extract_chunk(input_filename, start, end, chunk_files[index])
+        segments, info = model.transcribe(
+            chunk_files[index],
+            task=task,
+            language=chunk_language,
+            word_timestamps=word_timestamps
+        )
+        # Segments are generated lazily, so consume them before the file goes away
+        segment_dicts = segments_to_dicts(segments, word_timestamps, offset=start)
+        os.remove(chunk_files[index])
+        return segment_dicts, info.language
+
+    try:
+        results = [None] * len(chunks)
+        remaining = range(len(chunks))
+        if language is None:
+            results[0] = transcribe_chunk(0, None)
+            language = results[0][1]
+            remaining = range(1, len(chunks))
+
+        workers = max(1, min(max_workers or DEFAULT_NUM_WORKERS, len(remaining) or 1))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(transcribe_chunk, index, language): index for index in remaining}
+            try:
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+            except Exception:
+                # The transcription has failed, don't start the chunks still queued
+                executor.shutdown(cancel_futures=True)
+                raise
+    finally:
+        for chunk_file in chunk_files:
+            if os.path.exists(chunk_file):
+                os.remove(chunk_file)
+
+    all_segments = []
+    for segment_dicts, _ in results:
+        for segment_data in segment_dicts:
+            segment_data["id"] = len(all_segments)
+            all_segments.append(segment_data)
+
+    return {
+        "text": " ".join(segment["text"] for segment in all_segments),
+        "segments": all_segments,
+        "language": language
+    }
@@ -0,0 +1,80 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Total encoder threads this process may run at once across all jobs
+FFMPEG_CPU_BUDGET = int(os.environ.get('FFMPEG_CPU_BUDGET', str(os.cpu_count() or 1)))
+
+# Fewer threads than this per ffmpeg process wastes more on per-process
+# overhead than it gains from running more processes
+MIN_THREADS_PER_JOB = 2
+
+class CpuBudget:
+    """Counting budget of CPU threads shared by all parallel ffmpeg work in the process."""
+
+    def __init__(self, total=FFMPEG_CPU_BUDGET):
+        self.total = max(1, total)
+        self.available = self.total
+        self._condition = threading.Condition()
+
+    def plan(self, task_count, max_workers=None):
+        """Split the budget across task_count parallel ffmpeg processes.
+
+        Args:
+            task_count (int): Number of independent ffmpeg runs
+            max_workers (int, optional): Upper bound on concurrent runs
+
+        Returns:
+            tuple: (workers, threads_per_job)
+        """
+        workers = max(1, min(task_count, self.total // MIN_THREADS_PER_JOB or 1))
+        if max_workers:
+            workers = min(workers, max_workers)
+        threads_per_job = max(1, self.total // workers)
+        return workers, threads_per_job
+
+    def job_share(self):
+        """Most threads a single ffmpeg process should reserve: half the budget, so another job can always start."""
+        return min(self.total, max(MIN_THREADS_PER_JOB, self.total // 2))
+
+    @contextmanager
+    def reserve(self, threads):
+        """Block until threads are free, hold them for the duration of the block."""
+        threads = max(1, min(threads, self.total))
+        with self._condition:
+            while self.available < threads:
+                self._condition.wait()
+            self.available -= threads
+        try:
+            yield threads
+        finally:
+            with self._condition:
+                self.available += threads
+                self._condition.notify_all()
+
+    def get_stats(self):
+        with self._condition:
+            return {'total': self.total, 'available': self.available}
+
+cpu_budget = CpuBudget()
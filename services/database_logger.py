@@ -3,12 +3,21 @@
 """
 數據庫日誌記錄服務
 將API調用記錄保存到Zeabur MySQL數據庫
+
+寫入經由後台線程批量提交（executemany），請求線程只負責入隊，不等待MySQL；
+讀取和寫入共用 database_manager.DatabaseManager 的連接池。
 """
 
 import logging
 import json
 import os
+import time
+import queue
+import atexit
+import base64
+import threading
 from datetime import datetime
+from contextlib import contextmanager
 
 # 條件導入
 try:
@@ -19,133 +28,349 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# 批量寫入配置：滿 DB_LOG_BATCH_SIZE 條或等待 DB_LOG_FLUSH_SECONDS 秒即提交
+DB_LOG_BATCH_SIZE = int(os.getenv('DB_LOG_BATCH_SIZE', '100'))
+DB_LOG_FLUSH_SECONDS = float(os.getenv('DB_LOG_FLUSH_SECONDS', '1.0'))
+# 隊列上限，數據庫長時間不可用時丟棄新記錄而不是佔用內存或阻塞請求
+DB_LOG_QUEUE_SIZE = int(os.getenv('DB_LOG_QUEUE_SIZE', '10000'))
+
+# 建表失敗後的重試間隔（秒）
+_TABLE_RETRY_SECONDS = 60
+
+_CREATE_TABLE_SQLS = [
+    ('nca_api_logs', """
+    CREATE TABLE IF NOT EXISTS `nca_api_logs` (
+        `id` bigint(20) UNSIGNED NOT NULL AUTO_INCREMENT,
+        `timestamp` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        `endpoint` varchar(255) NOT NULL,
+        `method` varchar(10) NOT NULL,
+        `request_data` text,
+        `response_status` int,
+        `response_time_ms` int,
+        `file_url` varchar(500),
+        `file_size` bigint,
+        `error_message` text,
+        `user_ip` varchar(45),
+        `api_key_used` varchar(50),
+        `created_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        `updated_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (`id`),
+        KEY `idx_timestamp` (`timestamp`),
+        KEY `idx_endpoint` (`endpoint`),
+        KEY `idx_status` (`response_status`)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """),
+    ('nca_uploaded_files', """
+    CREATE TABLE IF NOT EXISTS `nca_uploaded_files` (
+        `id` bigint(20) UNSIGNED NOT NULL AUTO_INCREMENT,
+        `file_id` varchar(36) NOT NULL UNIQUE COMMENT 'UUID文件ID',
+        `original_filename` varchar(255) NOT NULL COMMENT '原始文件名',
+        `safe_filename` varchar(255) NOT NULL COMMENT '安全文件名',
+        `file_type` enum('audio','video') NOT NULL COMMENT '文件類型',
+        `file_size` bigint NOT NULL COMMENT '文件大小(字節)',
+        `file_path` varchar(500) NOT NULL COMMENT '本地文件路徑',
+        `file_url` varchar(500) NOT NULL COMMENT '外部訪問URL',
+        `upload_time` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        `created_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        `updated_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (`id`),
+        UNIQUE KEY `idx_file_id` (`file_id`),
+        KEY `idx_file_type` (`file_type`),
+        KEY `idx_upload_time` (`upload_time`),
+        KEY `idx_created_at` (`created_at`),
+        KEY `idx_type_created_at` (`file_type`, `created_at`)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='上傳文件記錄表'
+    """),
+    ('nca_output_files', """
+    CREATE TABLE IF NOT EXISTS `nca_output_files` (
+        `id` bigint(20) UNSIGNED NOT NULL AUTO_INCREMENT,
+        `file_id` varchar(36) NOT NULL UNIQUE COMMENT 'UUID文件ID',
+        `original_filename` varchar(255) NOT NULL COMMENT '原始文件名',
+        `safe_filename` varchar(255) NOT NULL COMMENT '安全文件名',
+        `file_type` enum('audio','video','image') NOT NULL COMMENT '文件類型',
+        `file_size` bigint NOT NULL COMMENT '文件大小(字節)',
+        `file_path` varchar(500) NOT NULL COMMENT '本地文件路徑',
+        `file_url` varchar(500) NOT NULL COMMENT '外部訪問URL',
+        `operation_type` varchar(50) NOT NULL COMMENT '操作類型(cut/trim/thumbnail/concatenate等)',
+        `metadata` json COMMENT '額外元數據',
+        `created_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        `updated_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (`id`),
+        UNIQUE KEY `idx_file_id` (`file_id`),
+        KEY `idx_file_type` (`file_type`),
+        KEY `idx_operation_type` (`operation_type`),
+        KEY `idx_created_at` (`created_at`),
+        KEY `idx_type_created_at` (`file_type`, `created_at`),
+        KEY `idx_operation_created_at` (`operation_type`, `created_at`)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='輸出文件記錄表'
+    """),
+]
+
+# 分頁查詢用的索引；InnoDB二級索引隱含主鍵id，即 (created_at, id)。
+# 舊版本創建的表沒有這些索引，建表時補上
+_PAGINATION_INDEXES = [
+    ('nca_uploaded_files', 'idx_created_at', '(`created_at`)'),
+    ('nca_uploaded_files', 'idx_type_created_at', '(`file_type`, `created_at`)'),
+    ('nca_output_files', 'idx_type_created_at', '(`file_type`, `created_at`)'),
+    ('nca_output_files', 'idx_operation_created_at', '(`operation_type`, `created_at`)'),
+]
+
+_INSERT_SQLS = {
+    'nca_api_logs': """
+    INSERT INTO `nca_api_logs` (
+        `endpoint`, `method`, `request_data`, `response_status`,
+        `response_time_ms`, `file_url`, `file_size`, `error_message`,
+        `user_ip`, `api_key_used`
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """,
+    'nca_uploaded_files': """
+    INSERT INTO `nca_uploaded_files` (
+        `file_id`, `original_filename`, `safe_filename`, `file_type`,
+        `file_size`, `file_path`, `file_url`, `upload_time`
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """,
+    'nca_output_files': """
+    INSERT INTO `nca_output_files` (
+        `file_id`, `original_filename`, `safe_filename`, `file_type`,
+        `file_size`, `file_path`, `file_url`, `operation_type`, `metadata`
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """,
+}
+
+def _format_times(record, fields):
+    """將datetime字段轉換為字符串"""
+    for field in fields:
+        if record.get(field) is not None and hasattr(record[field], 'strftime'):
+            record[field] = record[field].strftime('%Y-%m-%d %H:%M:%S')
+
+def _load_metadata(record):
+    if record.get('metadata'):
+        try:
+            record['metadata'] = json.loads(record['metadata'])
+        except (TypeError, ValueError):
+            record['metadata'] = {}
+
+UPLOADED_FILE_COLUMNS = (
+    'id', 'file_id', 'original_filename', 'safe_filename', 'file_type', 'file_size',
+    'file_path', 'file_url', 'upload_time', 'created_at', 'updated_at'
+)
+OUTPUT_FILE_COLUMNS = (
+    'id', 'file_id', 'original_filename', 'safe_filename', 'file_type', 'file_size',
+    'file_path', 'file_url', 'operation_type', 'metadata', 'created_at', 'updated_at'
+)
+
+def _check_columns(columns, allowed):
+    if not columns:
+        return list(allowed)
+    unknown = [column for column in columns if column not in allowed]
+    if unknown:
+        raise ValueError(f"未知字段: {', '.join(unknown)}")
+    return list(dict.fromkeys(columns))
+
+def encode_cursor(created_at, record_id):
+    """分頁游標：最後一條記錄的 (created_at, id)"""
+    if hasattr(created_at, 'strftime'):
+        created_at = created_at.strftime('%Y-%m-%d %H:%M:%S')
+    raw = json.dumps([created_at, record_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, record_id = json.loads(raw)
+        datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S')
+        return created_at, int(record_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"無效的分頁游標: {cursor}") from e
+
 class DatabaseLogger:
     def __init__(self):
-        # 使用环境变量配置数据库连接
-        self.db_config = {
-            'host': os.getenv('DB_HOST', 'mysql.zeabur.internal'),
-            'port': int(os.getenv('DB_PORT', '3306')),
-            'user': os.getenv('DB_USERNAME', 'root'),
-            'password': os.getenv('DB_PASSWORD', ''),
-            'database': os.getenv('DB_DATABASE', 'zeabur'),
-            'charset': os.getenv('DB_CHARSET', 'utf8mb4')
-        }
         self.table_created = False
-    
+        self._table_lock = threading.Lock()
+        self._table_failed_at = None
+
+        # 後台批量寫入
+        self._queue = queue.Queue(maxsize=DB_LOG_QUEUE_SIZE)
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {'queued': 0, 'written': 0, 'dropped': 0, 'failed': 0, 'batches': 0}
+
+    def _db(self):
+        from database_manager import get_database_manager
+        return get_database_manager()
+
+    @contextmanager
     def get_connection(self):
-        """獲取數據庫連接"""
-        if not PYMYSQL_AVAILABLE:
-            return None
-        try:
-            return pymysql.connect(**self.db_config)
-        except Exception as e:
-            logger.warning(f"數據庫連接失敗: {e}")
-            return None
-    
-    def create_table_if_not_exists(self):
-        """創建API調用記錄表（如果不存在）"""
+        """從共享連接池借用數據庫連接（上下文管理器）"""
+        with self._db().get_connection() as connection:
+            yield connection
+
+    def create_table_if_not_exists(self, force=False):
+        """創建記錄表（如果不存在）；每個進程成功一次後不再執行，失敗後按間隔重試（force跳過間隔）"""
         if self.table_created or not PYMYSQL_AVAILABLE:
             return True
-            
-        try:
-            connection = self.get_connection()
-            if not connection:
+
+        with self._table_lock:
+            if self.table_created:
+                return True
+            if not force and self._table_failed_at and time.time() - self._table_failed_at < _TABLE_RETRY_SECONDS:
                 return False
-                
-            with connection.cursor() as cursor:
-                # 創建API調用記錄表
-                create_table_sql = """
-                CREATE TABLE IF NOT EXISTS `nca_api_logs` (
-                    `id` bigint(20) UNSIGNED NOT NULL AUTO_INCREMENT,
-                    `timestamp` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                    `endpoint` varchar(255) NOT NULL,
-                    `method` varchar(10) NOT NULL,
-                    `request_data` text,
-                    `response_status` int,
-                    `response_time_ms` int,
-                    `file_url` varchar(500),
-                    `file_size` bigint,
-                    `error_message` text,
-                    `user_ip` varchar(45),
-                    `api_key_used` varchar(50),
-                    `created_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                    `updated_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    PRIMARY KEY (`id`),
-                    KEY `idx_timestamp` (`timestamp`),
-                    KEY `idx_endpoint` (`endpoint`),
-                    KEY `idx_status` (`response_status`)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-                """
-                cursor.execute(create_table_sql)
-                connection.commit()
+            try:
+                with self.get_connection() as connection:
+                    with connection.cursor() as cursor:
+                        for table_name, create_table_sql in _CREATE_TABLE_SQLS:
+                            cursor.execute(create_table_sql)
+                            logger.info(f"✅ 數據庫表創建成功: {table_name}")
+                        for table_name, index_name, index_columns in _PAGINATION_INDEXES:
+                            cursor.execute(
+                                "SELECT 1 FROM information_schema.statistics "
+                                "WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s LIMIT 1",
+                                (table_name, index_name)
+                            )
+                            if not cursor.fetchone():
+                                cursor.execute(f"ALTER TABLE `{table_name}` ADD INDEX `{index_name}` {index_columns}")
+                                logger.info(f"✅ 添加索引 {table_name}.{index_name}")
+                    connection.commit()
                 self.table_created = True
-                logger.info("✅ 數據庫表創建成功: nca_api_logs")
-                
-                # 🚨 新增：創建文件上傳記錄表
-                files_table_sql = """
-                CREATE TABLE IF NOT EXISTS `nca_uploaded_files` (
-                    `id` bigint(20) UNSIGNED NOT NULL AUTO_INCREMENT,
-                    `file_id` varchar(36) NOT NULL UNIQUE COMMENT 'UUID文件ID',
-                    `original_filename` varchar(255) NOT NULL COMMENT '原始文件名',
-                    `safe_filename` varchar(255) NOT NULL COMMENT '安全文件名',
-                    `file_type` enum('audio','video') NOT NULL COMMENT '文件類型',
-                    `file_size` bigint NOT NULL COMMENT '文件大小(字節)',
-                    `file_path` varchar(500) NOT NULL COMMENT '本地文件路徑',
-                    `file_url` varchar(500) NOT NULL COMMENT '外部訪問URL',
-                    `upload_time` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                    `created_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                    `updated_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    PRIMARY KEY (`id`),
-                    UNIQUE KEY `idx_file_id` (`file_id`),
-                    KEY `idx_file_type` (`file_type`),
-                    KEY `idx_upload_time` (`upload_time`)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='上傳文件記錄表'
-                """
-                cursor.execute(files_table_sql)
-                connection.commit()
-                logger.info("✅ 數據庫表創建成功: nca_uploaded_files")
-                
-                # 🚨 新增：創建輸出文件記錄表
-                output_files_table_sql = """
-                CREATE TABLE IF NOT EXISTS `nca_output_files` (
-                    `id` bigint(20) UNSIGNED NOT NULL AUTO_INCREMENT,
-                    `file_id` varchar(36) NOT NULL UNIQUE COMMENT 'UUID文件ID',
-                    `original_filename` varchar(255) NOT NULL COMMENT '原始文件名',
-                    `safe_filename` varchar(255) NOT NULL COMMENT '安全文件名',
-                    `file_type` enum('audio','video','image') NOT NULL COMMENT '文件類型',
-                    `file_size` bigint NOT NULL COMMENT '文件大小(字節)',
-                    `file_path` varchar(500) NOT NULL COMMENT '本地文件路徑',
-                    `file_url` varchar(500) NOT NULL COMMENT '外部訪問URL',
-                    `operation_type` varchar(50) NOT NULL COMMENT '操作類型(cut/trim/thumbnail/concatenate等)',
-                    `metadata` json COMMENT '額外元數據',
-                    `created_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                    `updated_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    PRIMARY KEY (`id`),
-                    UNIQUE KEY `idx_file_id` (`file_id`),
-                    KEY `idx_file_type` (`file_type`),
-                    KEY `idx_operation_type` (`operation_type`),
-                    KEY `idx_created_at` (`created_at`)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='輸出文件記錄表'
-                """
-                cursor.execute(output_files_table_sql)
-                connection.commit()
-                logger.info("✅ 數據庫表創建成功: nca_output_files")
-                
+                self._table_failed_at = None
                 return True
-                
+            except Exception as e:
+                logger.error(f"創建數據庫表失敗: {e}")
+                self._table_failed_at = time.time()
+                return False
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def _ensure_writer(self):
+        if self._writer is not None and self._writer.is_alive():
+            return
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._run_writer, name='database-logger', daemon=True)
+                self._writer.start()
+
+    def _enqueue(self, table_name, row):
+        """放入寫入隊列，隊列已滿時丟棄，絕不阻塞請求線程"""
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((table_name, row))
+        except queue.Full:
+            self._count('dropped')
+            logger.warning(f"數據庫日誌隊列已滿，丟棄 {table_name} 記錄")
+            return False
+        self._count('queued')
+        return True
+
+    def _run_writer(self):
+        pending = {}
+        pending_count = 0
+        deadline = None
+        waiters = []
+
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is not None:
+                table_name, row = item
+                if table_name is None:
+                    # flush() 請求
+                    waiters.append(row)
+                else:
+                    pending.setdefault(table_name, []).append(row)
+                    pending_count += 1
+                    if deadline is None:
+                        deadline = time.monotonic() + DB_LOG_FLUSH_SECONDS
+
+            due = deadline is not None and time.monotonic() >= deadline
+            if pending and (waiters or due or pending_count >= DB_LOG_BATCH_SIZE):
+                self._write_batches(pending)
+                pending = {}
+                pending_count = 0
+                deadline = None
+
+            for event in waiters:
+                event.set()
+            waiters = []
+
+    def _write_batches(self, pending):
+        total = sum(len(rows) for rows in pending.values())
+        if not self.create_table_if_not_exists():
+            self._count('failed', total)
+            logger.error(f"數據庫表不可用，丟棄 {total} 條日誌記錄")
+            return
+
+        remaining = total
+        try:
+            with self.get_connection() as connection:
+                for table_name, rows in pending.items():
+                    self._write_rows(connection, table_name, rows)
+                    remaining -= len(rows)
         except Exception as e:
-            logger.error(f"創建數據庫表失敗: {e}")
+            self._count('failed', remaining)
+            logger.error(f"批量寫入數據庫日誌失敗，丟棄 {remaining} 條記錄: {e}")
+
+    def _write_rows(self, connection, table_name, rows):
+        insert_sql = _INSERT_SQLS[table_name]
+        try:
+            # 連接池是autocommit模式，而executemany會把大批次拆成多條INSERT；
+            # 顯式開啟事務，失敗時整批回滾，逐條重試才不會重複寫入已提交的記錄
+            connection.begin()
+            with connection.cursor() as cursor:
+                cursor.executemany(insert_sql, rows)
+            connection.commit()
+            self._count('written', len(rows))
+            self._count('batches')
+            logger.info(f"✅ 批量寫入 {len(rows)} 條記錄到 {table_name}")
+        except pymysql.err.OperationalError:
+            raise
+        except Exception as e:
+            # 單條記錄有問題（如file_id重複）時逐條重試，避免整批丟失
+            logger.warning(f"批量寫入 {table_name} 失敗，改為逐條寫入: {e}")
+            connection.rollback()
+            for row in rows:
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute(insert_sql, row)
+                    connection.commit()
+                    self._count('written')
+                except pymysql.err.OperationalError:
+                    raise
+                except Exception as row_e:
+                    connection.rollback()
+                    self._count('failed')
+                    logger.error(f"寫入 {table_name} 記錄失敗: {row_e}")
+
+    def flush(self, timeout=5.0):
+        """等待已入隊的記錄寫入數據庫（用於測試和進程退出）"""
+        if self._writer is None or not self._writer.is_alive():
+            return self._queue.empty()
+        event = threading.Event()
+        try:
+            self._queue.put((None, event), timeout=timeout)
+        except queue.Full:
             return False
-        finally:
-            if 'connection' in locals():
-                connection.close()
-    
-    def log_api_call(self, endpoint, method, request_data=None, response_status=None, 
-                     response_time_ms=None, file_url=None, file_size=None, 
+        return event.wait(timeout)
+
+    def get_stats(self):
+        """批量寫入統計"""
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['pending'] = self._queue.qsize()
+        return stats
+
+    def log_api_call(self, endpoint, method, request_data=None, response_status=None,
+                     response_time_ms=None, file_url=None, file_size=None,
                      error_message=None, user_ip=None, api_key_used=None):
         """
-        記錄API調用到數據庫
-        
+        記錄API調用到數據庫（異步批量寫入）
+
         Args:
             endpoint: API端點路徑
             method: HTTP方法
@@ -157,148 +382,32 @@ class DatabaseLogger:
             error_message: 錯誤信息
             user_ip: 用戶IP地址
             api_key_used: 使用的API Key
+
+        Returns:
+            bool: 記錄是否已入隊
         """
         if not PYMYSQL_AVAILABLE:
             logger.info(f"📝 API調用記錄 (本地): {method} {endpoint} -> {response_status}")
             return True
-        
-        # 確保表存在
-        if not self.create_table_if_not_exists():
-            return False
-        
-        try:
-            connection = self.get_connection()
-            if not connection:
-                return False
-            
-            with connection.cursor() as cursor:
-                # 準備數據
-                request_data_str = None
-                if request_data:
-                    if isinstance(request_data, dict):
-                        request_data_str = json.dumps(request_data, ensure_ascii=False)
-                    else:
-                        request_data_str = str(request_data)
-                
-                # 插入記錄
-                insert_sql = """
-                INSERT INTO `nca_api_logs` (
-                    `endpoint`, `method`, `request_data`, `response_status`, 
-                    `response_time_ms`, `file_url`, `file_size`, `error_message`,
-                    `user_ip`, `api_key_used`
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """
-                
-                cursor.execute(insert_sql, (
-                    endpoint, method, request_data_str, response_status,
-                    response_time_ms, file_url, file_size, error_message,
-                    user_ip, api_key_used
-                ))
-                connection.commit()
-                
-                log_id = cursor.lastrowid
-                logger.info(f"✅ API調用已記錄到數據庫 (ID: {log_id}): {method} {endpoint}")
-                return True
-                
-        except Exception as e:
-            logger.error(f"記錄API調用失敗: {e}")
-            return False
-        finally:
-            if 'connection' in locals():
-                connection.close()
-    
-    def get_recent_logs(self, limit=50):
-        """獲取最近的API調用記錄"""
-        if not PYMYSQL_AVAILABLE:
-            return []
-        
-        try:
-            connection = self.get_connection()
-            if not connection:
-                return []
-            
-            with connection.cursor(pymysql.cursors.DictCursor) as cursor:
-                select_sql = """
-                SELECT * FROM `nca_api_logs` 
-                ORDER BY `timestamp` DESC 
-                LIMIT %s
-                """
-                cursor.execute(select_sql, (limit,))
-                results = cursor.fetchall()
-                
-                # 轉換datetime為字符串
-                for result in results:
-                    if 'timestamp' in result:
-                        result['timestamp'] = result['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
-                    if 'created_at' in result:
-                        result['created_at'] = result['created_at'].strftime('%Y-%m-%d %H:%M:%S')
-                    if 'updated_at' in result:
-                        result['updated_at'] = result['updated_at'].strftime('%Y-%m-%d %H:%M:%S')
-                
-                return results
-                
-        except Exception as e:
-            logger.error(f"獲取API調用記錄失敗: {e}")
-            return []
-        finally:
-            if 'connection' in locals():
-                connection.close()
-    
-    def test_database_connection(self):
-        """測試數據庫連接"""
-        if not PYMYSQL_AVAILABLE:
-            return {
-                "status": "warning",
-                "message": "PyMySQL not available",
-                "available": False
-            }
-        
-        try:
-            connection = self.get_connection()
-            if not connection:
-                return {
-                    "status": "error",
-                    "message": "無法連接到數據庫",
-                    "available": False
-                }
-            
-            with connection.cursor() as cursor:
-                cursor.execute("SELECT 1")
-                cursor.fetchone()
-            
-            return {
-                "status": "success",
-                "message": "數據庫連接成功",
-                "available": True,
-                "config": {
-                    "host": self.db_config['host'],
-                    "port": self.db_config['port'],
-                    "database": self.db_config['database'],
-                    "charset": self.db_config['charset']
-                }
-            }
-            
-        except Exception as e:
-            return {
-                "status": "error",
-                "message": f"數據庫連接測試失敗: {str(e)}",
-                "available": False
-            }
-        finally:
-            if 'connection' in locals():
-                connection.close()
 
-# 創建全局實例
-database_logger = DatabaseLogger()
+        # 準備數據
+        request_data_str = None
+        if request_data:
+            if isinstance(request_data, dict):
+                request_data_str = json.dumps(request_data, ensure_ascii=False)
+            else:
+                request_data_str = str(request_data)
+
+        return self._enqueue('nca_api_logs', (
+            endpoint, method, request_data_str, response_status,
+            response_time_ms, file_url, file_size, error_message,
+            user_ip, api_key_used
+        ))
 
-# 🚨 新增：文件上傳相關功能
-class FileUploadLogger:
-    """文件上傳記錄器"""
-    
     def log_file_upload(self, file_record):
         """
-        記錄文件上傳到數據庫
-        
+        記錄文件上傳到數據庫（異步批量寫入）
+
         Args:
             file_record (dict): 文件記錄包含:
                 - file_id: UUID文件ID
@@ -313,115 +422,22 @@ class FileUploadLogger:
         if not PYMYSQL_AVAILABLE:
             logger.info(f"📋 文件上傳記錄 (本地): {file_record['original_filename']}")
             return True
-        
-        # 確保表存在
-        if not database_logger.create_table_if_not_exists():
-            return False
-        
-        try:
-            connection = database_logger.get_connection()
-            if not connection:
-                return False
-            
-            with connection.cursor() as cursor:
-                insert_sql = """
-                INSERT INTO `nca_uploaded_files` (
-                    `file_id`, `original_filename`, `safe_filename`, `file_type`,
-                    `file_size`, `file_path`, `file_url`, `upload_time`
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                """
-                
-                cursor.execute(insert_sql, (
-                    file_record['file_id'],
-                    file_record['original_filename'],
-                    file_record['safe_filename'],
-                    file_record['file_type'],
-                    file_record['file_size'],
-                    file_record['file_path'],
-                    file_record['file_url'],
-                    file_record['upload_time']
-                ))
-                connection.commit()
-                
-                record_id = cursor.lastrowid
-                logger.info(f"✅ 文件上傳已記錄到數據庫 (ID: {record_id}): {file_record['original_filename']}")
-                return True
-                
-        except Exception as e:
-            logger.error(f"記錄文件上傳失敗: {e}")
-            return False
-        finally:
-            if 'connection' in locals():
-                connection.close()
-    
-    def get_uploaded_files(self, limit=20, file_type=None):
-        """
-        獲取上傳文件列表
-        
-        Args:
-            limit (int): 返回數量限制
-            file_type (str): 文件類型過濾 (audio/video)
-            
-        Returns:
-            list: 文件記錄列表
-        """
-        if not PYMYSQL_AVAILABLE:
-            return []
-        
-        try:
-            connection = database_logger.get_connection()
-            if not connection:
-                return []
-            
-            with connection.cursor(pymysql.cursors.DictCursor) as cursor:
-                if file_type:
-                    select_sql = """
-                    SELECT * FROM `nca_uploaded_files` 
-                    WHERE `file_type` = %s
-                    ORDER BY `upload_time` DESC 
-                    LIMIT %s
-                    """
-                    cursor.execute(select_sql, (file_type, limit))
-                else:
-                    select_sql = """
-                    SELECT * FROM `nca_uploaded_files` 
-                    ORDER BY `upload_time` DESC 
-                    LIMIT %s
-                    """
-                    cursor.execute(select_sql, (limit,))
-                
-                results = cursor.fetchall()
-                
-                # 轉換時間為字符串
-                for result in results:
-                    if 'upload_time' in result:
-                        result['upload_time'] = result['upload_time'].strftime('%Y-%m-%d %H:%M:%S')
-                    if 'created_at' in result:
-                        result['created_at'] = result['created_at'].strftime('%Y-%m-%d %H:%M:%S')
-                    if 'updated_at' in result:
-                        result['updated_at'] = result['updated_at'].strftime('%Y-%m-%d %H:%M:%S')
-                
-                return results
-                
-        except Exception as e:
-            logger.error(f"獲取上傳文件列表失敗: {e}")
-            return []
-        finally:
-            if 'connection' in locals():
-                connection.close()
-
-# 將方法添加到主記錄器中
-database_logger.log_file_upload = FileUploadLogger().log_file_upload
-database_logger.get_uploaded_files = FileUploadLogger().get_uploaded_files
-
-# 🚨 新增：輸出文件相關功能
-class OutputFileLogger:
-    """輸出文件記錄器"""
-    
+
+        return self._enqueue('nca_uploaded_files', (
+            file_record['file_id'],
+            file_record['original_filename'],
+            file_record['safe_filename'],
+            file_record['file_type'],
+            file_record['file_size'],
+            file_record['file_path'],
+            file_record['file_url'],
+            file_record['upload_time']
+        ))
+
     def log_output_file(self, file_record):
         """
-        記錄輸出文件到數據庫
-        
+        記錄輸出文件到數據庫（異步批量寫入）
+
         Args:
             file_record (dict): 文件記錄包含:
                 - file_id: UUID文件ID
@@ -437,163 +453,263 @@ class OutputFileLogger:
         if not PYMYSQL_AVAILABLE:
             logger.info(f"📋 輸出文件記錄 (本地): {file_record['original_filename']}")
             return True
-        
-        # 確保表存在
-        if not database_logger.create_table_if_not_exists():
-            return False
-        
+
+        # 處理metadata
+        metadata_json = None
+        if file_record.get('metadata'):
+            metadata_json = json.dumps(file_record['metadata'], ensure_ascii=False)
+
+        return self._enqueue('nca_output_files', (
+            file_record['file_id'],
+            file_record['original_filename'],
+            file_record['safe_filename'],
+            file_record['file_type'],
+            file_record['file_size'],
+            file_record['file_path'],
+            file_record['file_url'],
+            file_record.get('operation_type', 'unknown'),
+            metadata_json
+        ))
+
+    def _query(self, select_sql, params, error_message):
+        if not PYMYSQL_AVAILABLE:
+            return []
         try:
-            connection = database_logger.get_connection()
-            if not connection:
-                return False
-            
-            with connection.cursor() as cursor:
-                insert_sql = """
-                INSERT INTO `nca_output_files` (
-                    `file_id`, `original_filename`, `safe_filename`, `file_type`,
-                    `file_size`, `file_path`, `file_url`, `operation_type`, `metadata`
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """
-                
-                # 處理metadata
-                metadata_json = None
-                if file_record.get('metadata'):
-                    metadata_json = json.dumps(file_record['metadata'], ensure_ascii=False)
-                
-                cursor.execute(insert_sql, (
-                    file_record['file_id'],
-                    file_record['original_filename'],
-                    file_record['safe_filename'],
-                    file_record['file_type'],
-                    file_record['file_size'],
-                    file_record['file_path'],
-                    file_record['file_url'],
-                    file_record.get('operation_type', 'unknown'),
-                    metadata_json
-                ))
-                connection.commit()
-                
-                record_id = cursor.lastrowid
-                logger.info(f"✅ 輸出文件已記錄到數據庫 (ID: {record_id}): {file_record['original_filename']}")
-                return True
-                
+            with self.get_connection() as connection:
+                with connection.cursor(pymysql.cursors.DictCursor) as cursor:
+                    cursor.execute(select_sql, params)
+                    return list(cursor.fetchall())
         except Exception as e:
-            logger.error(f"記錄輸出文件失敗: {e}")
-            return False
-        finally:
-            if 'connection' in locals():
-                connection.close()
-    
-    def get_output_files(self, file_type=None, operation_type=None, limit=50):
+            logger.error(f"{error_message}: {e}")
+            return []
+
+    def get_recent_logs(self, limit=50):
+        """獲取最近的API調用記錄"""
+        select_sql = """
+        SELECT * FROM `nca_api_logs`
+        ORDER BY `timestamp` DESC
+        LIMIT %s
+        """
+        results = self._query(select_sql, (limit,), "獲取API調用記錄失敗")
+        for result in results:
+            _format_times(result, ('timestamp', 'created_at', 'updated_at'))
+        return results
+
+    def _page(self, table_name, columns, conditions, params, limit, cursor):
+        """按 (created_at, id) 倒序的鍵集分頁查詢，返回 (記錄列表, 下一頁游標)"""
+        if not PYMYSQL_AVAILABLE:
+            return [], None
+
+        self.create_table_if_not_exists()
+        conditions = list(conditions)
+        params = list(params)
+        if cursor:
+            cursor_created_at, cursor_id = decode_cursor(cursor)
+            conditions.append("(`created_at` < %s OR (`created_at` = %s AND `id` < %s))")
+            params.extend([cursor_created_at, cursor_created_at, cursor_id])
+
+        # 游標需要 created_at 和 id，未請求時查詢後再移除
+        selected = list(columns)
+        extra = [column for column in ('created_at', 'id') if column not in selected]
+        select_sql = f"""
+        SELECT {', '.join(f'`{column}`' for column in selected + extra)} FROM `{table_name}`
+        {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+        ORDER BY `created_at` DESC, `id` DESC
+        LIMIT %s
+        """
+        params.append(limit + 1)
+
+        with self.get_connection() as connection:
+            with connection.cursor(pymysql.cursors.DictCursor) as db_cursor:
+                db_cursor.execute(select_sql, params)
+                results = list(db_cursor.fetchall())
+
+        next_cursor = None
+        if len(results) > limit:
+            results = results[:limit]
+            last = results[-1]
+            next_cursor = encode_cursor(last['created_at'], last['id'])
+        for result in results:
+            for column in extra:
+                result.pop(column, None)
+        return results, next_cursor
+
+    @staticmethod
+    def _filters(file_type=None, operation_type=None, created_from=None, created_to=None):
+        conditions = []
+        params = []
+        if file_type:
+            conditions.append("`file_type` = %s")
+            params.append(file_type)
+        if operation_type:
+            conditions.append("`operation_type` = %s")
+            params.append(operation_type)
+        if created_from:
+            conditions.append("`created_at` >= %s")
+            params.append(created_from)
+        if created_to:
+            conditions.append("`created_at` < %s")
+            params.append(created_to)
+        return conditions, params
+
+    def list_uploaded_files(self, limit=20, cursor=None, file_type=None,
+                            created_from=None, created_to=None, columns=None):
+        """
+        分頁獲取上傳文件記錄（按 created_at, id 倒序）
+
+        Args:
+            limit (int): 每頁數量
+            cursor (str): 上一頁返回的 next_cursor
+            file_type (str): 文件類型過濾 (audio/video)
+            created_from (str): 創建時間下限（含）
+            created_to (str): 創建時間上限（不含）
+            columns (list): 返回的字段，默認全部，必須屬於 UPLOADED_FILE_COLUMNS
+
+        Returns:
+            tuple: (文件記錄列表, 下一頁游標或None)
+
+        Raises:
+            ValueError: 游標或字段無效
+        """
+        columns = _check_columns(columns, UPLOADED_FILE_COLUMNS)
+        conditions, params = self._filters(file_type=file_type, created_from=created_from, created_to=created_to)
+        results, next_cursor = self._page('nca_uploaded_files', columns, conditions, params, limit, cursor)
+        for result in results:
+            _format_times(result, ('upload_time', 'created_at', 'updated_at'))
+        return results, next_cursor
+
+    def list_output_files(self, limit=50, cursor=None, file_type=None, operation_type=None,
+                          created_from=None, created_to=None, columns=None):
         """
-        獲取輸出文件列表
-        
+        分頁獲取輸出文件記錄（按 created_at, id 倒序）
+
         Args:
+            limit (int): 每頁數量
+            cursor (str): 上一頁返回的 next_cursor
             file_type (str): 文件類型過濾 (audio/video/image)
             operation_type (str): 操作類型過濾
+            created_from (str): 創建時間下限（含）
+            created_to (str): 創建時間上限（不含）
+            columns (list): 返回的字段，默認全部，必須屬於 OUTPUT_FILE_COLUMNS
+
+        Returns:
+            tuple: (文件記錄列表, 下一頁游標或None)
+
+        Raises:
+            ValueError: 游標或字段無效
+        """
+        columns = _check_columns(columns, OUTPUT_FILE_COLUMNS)
+        conditions, params = self._filters(file_type, operation_type, created_from, created_to)
+        results, next_cursor = self._page('nca_output_files', columns, conditions, params, limit, cursor)
+        for result in results:
+            _format_times(result, ('created_at', 'updated_at'))
+            _load_metadata(result)
+        return results, next_cursor
+
+    def iter_uploaded_files(self, batch_size=500, **filters):
+        """逐批遍歷全部上傳文件記錄，每批為一個列表"""
+        cursor = None
+        while True:
+            batch, cursor = self.list_uploaded_files(limit=batch_size, cursor=cursor, **filters)
+            if batch:
+                yield batch
+            if not cursor:
+                return
+
+    def iter_output_files(self, batch_size=500, **filters):
+        """逐批遍歷全部輸出文件記錄，每批為一個列表"""
+        cursor = None
+        while True:
+            batch, cursor = self.list_output_files(limit=batch_size, cursor=cursor, **filters)
+            if batch:
+                yield batch
+            if not cursor:
+                return
+
+    def get_uploaded_files(self, limit=20, file_type=None):
+        """
+        獲取上傳文件列表（最新的第一頁）
+
+        Args:
             limit (int): 返回數量限制
-            
+            file_type (str): 文件類型過濾 (audio/video)
+
         Returns:
             list: 文件記錄列表
         """
-        if not PYMYSQL_AVAILABLE:
+        try:
+            return self.list_uploaded_files(limit=limit, file_type=file_type)[0]
+        except Exception as e:
+            logger.error(f"獲取上傳文件列表失敗: {e}")
             return []
-        
+
+    def get_output_files(self, file_type=None, operation_type=None, limit=50):
+        """
+        獲取輸出文件列表（最新的第一頁）
+
+        Args:
+            file_type (str): 文件類型過濾 (audio/video/image)
+            operation_type (str): 操作類型過濾
+            limit (int): 返回數量限制
+
+        Returns:
+            list: 文件記錄列表
+        """
         try:
-            connection = database_logger.get_connection()
-            if not connection:
-                return []
-            
-            with connection.cursor(pymysql.cursors.DictCursor) as cursor:
-                where_conditions = []
-                params = []
-                
-                if file_type:
-                    where_conditions.append("`file_type` = %s")
-                    params.append(file_type)
-                
-                if operation_type:
-                    where_conditions.append("`operation_type` = %s")
-                    params.append(operation_type)
-                
-                where_clause = " AND ".join(where_conditions)
-                if where_clause:
-                    where_clause = f"WHERE {where_clause}"
-                
-                select_sql = f"""
-                SELECT * FROM `nca_output_files` 
-                {where_clause}
-                ORDER BY `created_at` DESC 
-                LIMIT %s
-                """
-                params.append(limit)
-                
-                cursor.execute(select_sql, params)
-                results = cursor.fetchall()
-                
-                # 轉換時間為字符串
-                for result in results:
-                    if 'created_at' in result:
-                        result['created_at'] = result['created_at'].strftime('%Y-%m-%d %H:%M:%S')
-                    if 'updated_at' in result:
-                        result['updated_at'] = result['updated_at'].strftime('%Y-%m-%d %H:%M:%S')
-                    # 處理metadata
-                    if result.get('metadata'):
-                        try:
-                            result['metadata'] = json.loads(result['metadata'])
-                        except:
-                            result['metadata'] = {}
-                
-                return results
-                
+            return self.list_output_files(limit=limit, file_type=file_type, operation_type=operation_type)[0]
         except Exception as e:
             logger.error(f"獲取輸出文件列表失敗: {e}")
             return []
-        finally:
-            if 'connection' in locals():
-                connection.close()
-    
+
     def get_output_file_by_id(self, file_id):
         """根據ID獲取輸出文件信息"""
-        if not PYMYSQL_AVAILABLE:
+        select_sql = "SELECT * FROM `nca_output_files` WHERE `file_id` = %s"
+        results = self._query(select_sql, (file_id,), "獲取輸出文件信息失敗")
+        if not results:
             return None
-        
+        result = results[0]
+        _format_times(result, ('created_at', 'updated_at'))
+        _load_metadata(result)
+        return result
+
+    def test_database_connection(self):
+        """測試數據庫連接"""
+        if not PYMYSQL_AVAILABLE:
+            return {
+                "status": "warning",
+                "message": "PyMySQL not available",
+                "available": False
+            }
+
         try:
-            connection = database_logger.get_connection()
-            if not connection:
-                return None
-            
-            with connection.cursor(pymysql.cursors.DictCursor) as cursor:
-                select_sql = "SELECT * FROM `nca_output_files` WHERE `file_id` = %s"
-                cursor.execute(select_sql, (file_id,))
-                result = cursor.fetchone()
-                
-                if result:
-                    # 轉換時間為字符串
-                    if 'created_at' in result:
-                        result['created_at'] = result['created_at'].strftime('%Y-%m-%d %H:%M:%S')
-                    if 'updated_at' in result:
-                        result['updated_at'] = result['updated_at'].strftime('%Y-%m-%d %H:%M:%S')
-                    # 處理metadata
-                    if result.get('metadata'):
-                        try:
-                            result['metadata'] = json.loads(result['metadata'])
-                        except:
-                            result['metadata'] = {}
-                
-                return result
-                
-        except Exception as e:
-            logger.error(f"獲取輸出文件信息失敗: {e}")
-            return None
-        finally:
-            if 'connection' in locals():
-                connection.close()
+            db = self._db()
+            with self.get_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                    cursor.fetchone()
 
-# 將輸出文件方法添加到主記錄器中
-database_logger.log_output_file = OutputFileLogger().log_output_file
-database_logger.get_output_files = OutputFileLogger().get_output_files
-database_logger.get_output_file_by_id = OutputFileLogger().get_output_file_by_id
+            return {
+                "status": "success",
+                "message": "數據庫連接成功",
+                "available": True,
+                "config": {
+                    "host": db.config['host'],
+                    "port": db.config['port'],
+                    "database": db.config['database'],
+                    "charset": db.config['charset']
+                },
+                "writer": self.get_stats()
+            }
 
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": f"數據庫連接測試失敗: {str(e)}",
+                "available": False
+            }
 
+# 創建全局實例
+database_logger = DatabaseLogger()
 
+# 進程退出前盡量寫完隊列中的記錄
+atexit.register(database_logger.flush)
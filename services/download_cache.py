@@ -0,0 +1,250 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import json
+import time
+import uuid
+import errno
+import shutil
+import hashlib
+import logging
+import threading
+from config import LOCAL_STORAGE_PATH
+from services.http_download import open_stream, write_response
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_CACHE_ENABLED = os.environ.get('DOWNLOAD_CACHE_ENABLED', 'true').lower() == 'true'
+DOWNLOAD_CACHE_DIR = os.environ.get('DOWNLOAD_CACHE_DIR', os.path.join(LOCAL_STORAGE_PATH, '.download_cache'))
+DOWNLOAD_CACHE_MAX_MB = int(os.environ.get('DOWNLOAD_CACHE_MAX_MB', '2048'))
+
+# Files counted against the cache size and evicted by LRU. Derived entries
+# (e.g. extracted audio) live alongside the downloads and share the budget.
+_ENTRY_SUFFIXES = ('.data', '.flac')
+
+# A fixed set of striped locks: one fetch per URL at a time without keeping
+# a lock per URL ever fetched
+_LOCK_STRIPES = 64
+
+# Linux FICLONE ioctl, used for copy-on-write clones when a hardlink is not possible
+_FICLONE = 0x40049409
+
+def _clone_file(src, dst):
+    """Hand out a cached file as dst: hardlink, then reflink, then a plain copy.
+
+    Returns:
+        str: 'hardlink', 'reflink' or 'copy'
+    """
+    try:
+        os.link(src, dst)
+        return 'hardlink'
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+            raise
+
+    try:
+        import fcntl
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+        return 'reflink'
+    except (ImportError, OSError):
+        if os.path.exists(dst):
+            os.remove(dst)
+
+    shutil.copyfile(src, dst)
+    return 'copy'
+
+class DownloadCache:
+    """On-disk cache of downloaded URLs, revalidated with conditional GETs.
+
+    Each entry is stored as <key>.data plus a <key>.json sidecar holding the URL,
+    ETag/Last-Modified validators and size. The data file's mtime is the LRU
+    clock, so several worker processes can share one cache directory.
+    Responses without validators are never cached, since they can't be revalidated.
+    """
+
+    def __init__(self, cache_dir=DOWNLOAD_CACHE_DIR, max_bytes=DOWNLOAD_CACHE_MAX_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._key_locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'uncacheable': 0,
+            'evictions': 0,
+            'bytes_served_from_cache': 0,
+            'bytes_downloaded': 0
+        }
+
+    def _key_lock(self, key):
+        return self._key_locks[int(key[:8], 16) % _LOCK_STRIPES]
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return key, os.path.join(self.cache_dir, f"{key}.data"), os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load_meta(self, data_path, meta_path):
+        if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+            return None
+        try:
+            with open(meta_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def contains(self, url):
+        """Whether url has a cached entry (which may still need revalidation)."""
+        _, data_path, meta_path = self._paths(url)
+        return os.path.exists(data_path) and os.path.exists(meta_path)
+
+    def fetch(self, url, local_filename, chunk_size=None):
+        """Place the content of url at local_filename, using the cache when it is still valid.
+
+        Args:
+            url (str): Source URL
+            local_filename (str or callable): Caller-owned destination path; callers may delete it freely.
+                A callable is given the response Content-Type and returns the path, so callers can
+                name the file after the content without a separate HEAD request.
+            chunk_size (int, optional): Streaming chunk size for network reads
+
+        Returns:
+            str: local_filename
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        key, data_path, meta_path = self._paths(url)
+
+        with self._key_lock(key):
+            meta = self._load_meta(data_path, meta_path)
+            headers = {}
+            if meta:
+                if meta.get('etag'):
+                    headers['If-None-Match'] = meta['etag']
+                if meta.get('last_modified'):
+                    headers['If-Modified-Since'] = meta['last_modified']
+
+            response = open_stream(url, headers)
+            try:
+                if meta and response.status_code == 304:
+                    try:
+                        os.utime(data_path, None)
+                        local_filename = self._resolve_filename(local_filename, meta.get('content_type'))
+                        method = _clone_file(data_path, local_filename)
+                        self._count('hits')
+                        self._count('bytes_served_from_cache', meta.get('size', 0))
+                        logger.info(f"Download cache hit ({method}) for {url}")
+                        return local_filename
+                    except FileNotFoundError:
+                        # Evicted by another worker after the validators were read
+                        response.close()
+                        response = open_stream(url)
+
+                response.raise_for_status()
+                self._count('misses')
+                content_type = response.headers.get('Content-Type')
+                local_filename = self._resolve_filename(local_filename, content_type)
+
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
+                if not etag and not last_modified:
+                    self._count('uncacheable')
+                    try:
+                        size = write_response(response, local_filename, chunk_size, url)
+                    except Exception:
+                        if os.path.exists(local_filename):
+                            os.remove(local_filename)
+                        raise
+                    self._count('bytes_downloaded', size)
+                    return local_filename
+
+                tmp_path = os.path.join(self.cache_dir, f"{key}.{uuid.uuid4().hex}.tmp")
+                try:
+                    size = write_response(response, tmp_path, chunk_size, url)
+                    os.replace(tmp_path, data_path)
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                self._count('bytes_downloaded', size)
+
+                with open(meta_path, 'w') as f:
+                    json.dump({
+                        'url': url,
+                        'etag': etag,
+                        'last_modified': last_modified,
+                        'content_type': content_type,
+                        'size': size,
+                        'stored_at': time.time()
+                    }, f)
+            finally:
+                response.close()
+
+            _clone_file(data_path, local_filename)
+
+        self.evict()
+        return local_filename
+
+    @staticmethod
+    def _resolve_filename(local_filename, content_type):
+        return local_filename(content_type) if callable(local_filename) else local_filename
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if entry.name.endswith(_ENTRY_SUFFIXES):
+                        st = entry.stat()
+                        entries.append((st.st_mtime, st.st_size, entry.path))
+                        total += st.st_size
+        except FileNotFoundError:
+            return
+
+        if total <= self.max_bytes:
+            return
+
+        entries.sort()
+        for _, size, data_path in entries:
+            if total <= self.max_bytes:
+                break
+            meta_path = os.path.splitext(data_path)[0] + '.json'
+            for path in (data_path, meta_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            self._count('evictions')
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        stats['enabled'] = DOWNLOAD_CACHE_ENABLED
+        stats['cache_dir'] = self.cache_dir
+        stats['max_bytes'] = self.max_bytes
+        return stats
+
+download_cache = DownloadCache()
@@ -0,0 +1,197 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_ROOT = os.path.join(os.getcwd(), 'output')
+
+# A miss may trigger a background rescan at most this often, for files written by other processes
+FILE_INDEX_REFRESH_SECONDS = float(os.environ.get('FILE_INDEX_REFRESH_SECONDS', '30'))
+
+# Markers OutputFileManager and the legacy routes put between the original name
+# and the generated suffix, e.g. clip_trim_<uuid>.mp4 is a variant of clip.mp4
+VARIANT_MARKERS = ('_trim_', '_cut_', '_process_', '_convert_', '_captioned')
+
+def _variant_key(filename):
+    stem, ext = os.path.splitext(filename)
+    positions = [stem.find(marker) for marker in VARIANT_MARKERS if marker in stem]
+    if not positions:
+        return None
+    return stem[:min(positions)], ext
+
+class FileIndex:
+    """In-memory index of generated file variants under output/.
+
+    Maps (original stem, extension) to the paths of files named after it with
+    a generated suffix, replacing the directory walk /nca/files used to find
+    them. Writers in this process register files with add(); files written
+    elsewhere are picked up by a rate-limited background rescan that a lookup
+    miss starts. The miss itself is answered from the current index.
+    """
+
+    def __init__(self, root=OUTPUT_ROOT, refresh_seconds=FILE_INDEX_REFRESH_SECONDS):
+        self.root = root
+        self.refresh_seconds = refresh_seconds
+        self._variants = {}
+        self._lock = threading.Lock()
+        self._built_at = None
+        self._build_lock = threading.Lock()
+        self._refreshing = False
+        # Paths add()ed while a scan runs, kept when the scan result replaces the index
+        self._added_during_build = None
+
+    def _add_locked(self, path):
+        key = _variant_key(os.path.basename(path))
+        if key:
+            variants = self._variants.setdefault(key, [])
+            if path not in variants:
+                variants.append(path)
+
+    def _remove_locked(self, path):
+        key = _variant_key(os.path.basename(path))
+        variants = self._variants.get(key) if key else None
+        if variants and path in variants:
+            variants.remove(path)
+            if not variants:
+                del self._variants[key]
+
+    def _scan(self):
+        paths = []
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file():
+                            paths.append(entry.path)
+            except OSError:
+                continue
+        return paths
+
+    def build(self, max_age=None):
+        """Rescan output/ and replace the index, unless it was built less than max_age seconds ago."""
+        with self._build_lock:
+            # Concurrent misses queue here; only the first one rescans
+            if max_age is not None and self._built_at is not None and time.time() - self._built_at < max_age:
+                return
+            start = time.time()
+            with self._lock:
+                self._added_during_build = []
+            try:
+                paths = self._scan()
+            finally:
+                with self._lock:
+                    added, self._added_during_build = self._added_during_build, None
+            with self._lock:
+                self._variants = {}
+                for path in paths + added:
+                    self._add_locked(path)
+                self._built_at = time.time()
+            logger.info(f"File index built: {len(paths)} files in {time.time() - start:.2f}s")
+
+    def build_async(self):
+        thread = threading.Thread(target=self.build, name='file-index-build', daemon=True)
+        thread.start()
+        return thread
+
+    def refresh_async(self):
+        """Start a background rescan unless one is running or the index is younger than refresh_seconds."""
+        with self._lock:
+            if self._refreshing or (self._built_at is not None
+                                    and time.time() - self._built_at < self.refresh_seconds):
+                return None
+            self._refreshing = True
+
+        def run():
+            try:
+                self.build(max_age=self.refresh_seconds)
+            except Exception as e:
+                logger.error(f"File index refresh failed: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        thread = threading.Thread(target=run, name='file-index-refresh', daemon=True)
+        thread.start()
+        return thread
+
+    def add(self, path):
+        path = os.path.abspath(path)
+        if not path.startswith(self.root + os.sep):
+            return
+        with self._lock:
+            self._add_locked(path)
+            if self._added_during_build is not None:
+                self._added_during_build.append(path)
+
+    def remove(self, path):
+        with self._lock:
+            self._remove_locked(os.path.abspath(path))
+
+    def _pick(self, candidates, preferred_dirs):
+        # Prefer the newest layout, then legacy folders, then anything else
+        existing = [path for path in candidates if os.path.isfile(path)]
+        for stale in set(candidates) - set(existing):
+            self.remove(stale)
+        for directory in preferred_dirs:
+            for path in existing:
+                if path.startswith(directory + os.sep):
+                    return path
+        return existing[0] if existing else None
+
+    def _lookup_once(self, file_type, filename):
+        preferred_dirs = [os.path.join(self.root, 'nca', file_type), os.path.join(self.root, file_type)]
+        with self._lock:
+            variants = list(self._variants.get(os.path.splitext(filename), ()))
+        return self._pick(variants, preferred_dirs)
+
+    def find_variant(self, file_type, filename):
+        """Find a generated variant of filename, e.g. clip_trim_<uuid>.mp4 for clip.mp4.
+
+        Variants in output/nca/<type> win over output/<type> and the rest of output/.
+        Only the first lookup waits for the initial build; a later miss starts a
+        background rescan and returns None, so a file another process just wrote
+        is found once that rescan finishes.
+
+        Returns:
+            str: Path of the variant, or None
+        """
+        if self._built_at is None:
+            self.build(max_age=float('inf'))
+        path = self._lookup_once(file_type, filename)
+        if path is None:
+            self.refresh_async()
+        return path
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'variant_keys': len(self._variants),
+                'built_at': self._built_at,
+                'refreshing': self._refreshing
+            }
+
+file_index = FileIndex()
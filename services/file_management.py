@@ -18,15 +18,18 @@
 
 import os
 import uuid
-import requests
 from urllib.parse import urlparse, parse_qs
 import mimetypes
+from services.download_cache import download_cache, DOWNLOAD_CACHE_ENABLED
+from services.http_download import get_session, open_stream, write_response, DOWNLOAD_CHUNK_SIZE, DOWNLOAD_TIMEOUT
 
-def get_extension_from_url(url):
+def get_extension_from_url(url, content_type=None):
     """Extract file extension from URL or content type.
     
     Args:
         url (str): The URL to extract the extension from
+        content_type (str, optional): Content-Type already known from a response;
+            when omitted a HEAD request is made to find it
         
     Returns:
         str: The file extension including the dot (e.g., '.jpg')
@@ -44,9 +47,10 @@ def get_extension_from_url(url):
 
     # If no extension in URL, try to determine from content type
     try:
-        response = requests.head(url, allow_redirects=True)
-        content_type = response.headers.get('content-type', '').split(';')[0]
-        ext = mimetypes.guess_extension(content_type)
+        if content_type is None:
+            response = get_session().head(url, allow_redirects=True, timeout=DOWNLOAD_TIMEOUT)
+            content_type = response.headers.get('content-type', '')
+        ext = mimetypes.guess_extension(content_type.split(';')[0].strip())
         if ext:
             return ext.lower()
     except:
@@ -55,27 +59,34 @@ def get_extension_from_url(url):
     # If we can't determine the extension, raise an error
     raise ValueError(f"Could not determine file extension from URL: {url}")
 
-def download_file(url, storage_path="/tmp/"):
-    """Download a file from URL to local storage."""
+def download_file(url, storage_path="/tmp/", use_cache=True, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """Download a file from URL to local storage.
+
+    Repeated downloads of the same URL are served from the download cache after a
+    conditional GET. The returned file is always the caller's own copy and may be deleted.
+    The extension comes from the URL or, failing that, the GET's Content-Type, so no
+    separate HEAD request is made.
+    """
     # Create storage directory if it doesn't exist
     os.makedirs(storage_path, exist_ok=True)
     
     file_id = str(uuid.uuid4())
-    extension = get_extension_from_url(url)
-    local_filename = os.path.join(storage_path, f"{file_id}{extension}")
 
-    try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
+    def filename_for(content_type):
+        return os.path.join(storage_path, f"{file_id}{get_extension_from_url(url, content_type or '')}")
 
-        with open(local_filename, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
+    if use_cache and DOWNLOAD_CACHE_ENABLED:
+        return download_cache.fetch(url, filename_for, chunk_size)
+
+    local_filename = None
+    try:
+        with open_stream(url) as response:
+            response.raise_for_status()
+            local_filename = filename_for(response.headers.get('Content-Type'))
+            write_response(response, local_filename, chunk_size, url)
 
         return local_filename
     except Exception as e:
-        if os.path.exists(local_filename):
+        if local_filename and os.path.exists(local_filename):
             os.remove(local_filename)
         raise e
-
@@ -14,6 +14,7 @@ import shutil
 import logging
 from typing import List, Dict, Any
 from datetime import datetime
+from services.storage_manager import storage_manager
 
 logger = logging.getLogger(__name__)
 
@@ -175,6 +176,7 @@ class FileMigrationService:
             
             # 執行文件遷移
             shutil.copy2(source_path, target_path)
+            storage_manager.record_file_added(target_path)
             
             # 生成新的URL
             new_url = f"https://vidsparkback.zeabur.app/nca/files/{file_type}/{year}/{month}/{filename}"
@@ -210,7 +212,9 @@ class FileMigrationService:
                 try:
                     source_path = result['source_path']
                     if os.path.exists(source_path):
+                        file_size = os.path.getsize(source_path)
                         os.remove(source_path)
+                        storage_manager.record_file_removed(source_path, file_size)
                         cleaned_count += 1
                         logger.info(f"🗑️ 清理舊文件: {source_path}")
                 except Exception as e:
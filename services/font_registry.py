@@ -0,0 +1,281 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import json
+import time
+import struct
+import logging
+import threading
+from config import LOCAL_STORAGE_PATH
+
+logger = logging.getLogger(__name__)
+
+# Fonts shipped with the repo; passed to libass as fontsdir when burning captions
+REPO_FONTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fonts')
+
+SYSTEM_FONT_DIRS = [
+    '/usr/share/fonts',
+    '/usr/local/share/fonts',
+    os.path.expanduser('~/.fonts'),
+    os.path.expanduser('~/.local/share/fonts'),
+    '/Library/Fonts',
+    '/System/Library/Fonts',
+    os.path.join(os.environ.get('WINDIR', 'C:\\Windows'), 'Fonts'),
+]
+
+FONT_INDEX_PATH = os.environ.get('FONT_INDEX_PATH', os.path.join(LOCAL_STORAGE_PATH, '.font_index.json'))
+# A lookup that misses re-checks directory mtimes at most this often
+FONT_REGISTRY_REFRESH_SECONDS = float(os.environ.get('FONT_REGISTRY_REFRESH_SECONDS', '60'))
+
+FONT_EXTENSIONS = ('.ttf', '.otf', '.ttc')
+
+_INDEX_VERSION = 1
+
+# name table IDs for the family (1) and the typographic family (16), which
+# is what FreeType reports for fonts that set it
+_FAMILY_NAME_IDS = (1, 16)
+
+def _decode_name(platform_id, data):
+    if platform_id == 1:
+        return data.decode('mac_roman', errors='replace')
+    return data.decode('utf-16-be', errors='replace')
+
+def _name_priority(platform_id, language_id):
+    # Windows US English, then any Windows/Unicode entry, then Macintosh English
+    if platform_id == 3 and language_id == 0x409:
+        return 0
+    if platform_id in (0, 3):
+        return 1
+    if platform_id == 1 and language_id == 0:
+        return 2
+    return None
+
+def _face_families(f, offset):
+    f.seek(offset)
+    header = f.read(12)
+    if len(header) < 12:
+        return []
+    num_tables = struct.unpack('>H', header[4:6])[0]
+    records = f.read(16 * num_tables)
+    for i in range(num_tables):
+        tag, _, table_offset, _ = struct.unpack('>4sIII', records[16 * i:16 * (i + 1)])
+        if tag == b'name':
+            break
+    else:
+        return []
+
+    f.seek(table_offset)
+    _, count, string_offset = struct.unpack('>HHH', f.read(6))
+    entries = f.read(12 * count)
+    best = {}
+    for i in range(count):
+        platform_id, _, language_id, name_id, length, name_offset = struct.unpack('>HHHHHH', entries[12 * i:12 * (i + 1)])
+        if name_id not in _FAMILY_NAME_IDS:
+            continue
+        priority = _name_priority(platform_id, language_id)
+        if priority is None or (name_id in best and best[name_id][0] <= priority):
+            continue
+        best[name_id] = (priority, platform_id, table_offset + string_offset + name_offset, length)
+
+    families = []
+    for _, platform_id, name_offset, length in best.values():
+        f.seek(name_offset)
+        name = _decode_name(platform_id, f.read(length)).strip('\x00 ')
+        if name and name not in families:
+            families.append(name)
+    return families
+
+def read_font_families(path):
+    """Family names declared in the name table of a TrueType/OpenType font or collection."""
+    with open(path, 'rb') as f:
+        tag = f.read(4)
+        if tag == b'ttcf':
+            f.seek(8)
+            num_fonts = struct.unpack('>I', f.read(4))[0]
+            offsets = struct.unpack(f'>{num_fonts}I', f.read(4 * num_fonts))
+        else:
+            offsets = (0,)
+        families = []
+        for offset in offsets:
+            for name in _face_families(f, offset):
+                if name not in families:
+                    families.append(name)
+        return families
+
+class FontRegistry:
+    """Family name -> font file index over the system font directories and fonts/.
+
+    Built once per process, lazily or with load_async() at startup, and
+    persisted to FONT_INDEX_PATH together with the mtime of every scanned
+    directory. A later process reuses the persisted index unless one of
+    those mtimes changed; a rescan only re-reads files whose size or mtime
+    changed. Availability checks are dictionary lookups.
+    """
+
+    def __init__(self, font_dirs=None, index_path=FONT_INDEX_PATH, refresh_seconds=FONT_REGISTRY_REFRESH_SECONDS):
+        self.font_dirs = font_dirs if font_dirs is not None else SYSTEM_FONT_DIRS + [REPO_FONTS_DIR]
+        self.index_path = index_path
+        self.refresh_seconds = refresh_seconds
+        self._dirs = {}
+        self._files = {}
+        self._families = {}
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._loaded_at = None
+
+    def _dir_mtimes(self):
+        """mtime_ns of every existing font directory and subdirectory."""
+        mtimes = {}
+        stack = [d for d in self.font_dirs if os.path.isdir(d)]
+        while stack:
+            directory = stack.pop()
+            try:
+                mtimes[directory] = os.stat(directory).st_mtime_ns
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.is_dir():
+                            stack.append(entry.path)
+            except OSError:
+                continue
+        return mtimes
+
+    def _stale(self):
+        for directory, mtime in self._dirs.items():
+            try:
+                if os.stat(directory).st_mtime_ns != mtime:
+                    return True
+            except OSError:
+                return True
+        # A configured directory that did not exist before
+        return any(d not in self._dirs and os.path.isdir(d) for d in self.font_dirs)
+
+    def _scan(self):
+        dirs = self._dir_mtimes()
+        files = {}
+        parsed = 0
+        for directory in dirs:
+            try:
+                with os.scandir(directory) as it:
+                    entries = [e for e in it if e.name.lower().endswith(FONT_EXTENSIONS) and e.is_file()]
+            except OSError:
+                continue
+            for entry in entries:
+                st = entry.stat()
+                previous = self._files.get(entry.path)
+                if previous and previous[0] == st.st_mtime_ns and previous[1] == st.st_size:
+                    files[entry.path] = previous
+                    continue
+                try:
+                    families = read_font_families(entry.path)
+                except (OSError, struct.error) as e:
+                    logger.debug(f"Skipping unreadable font {entry.path}: {e}")
+                    families = []
+                files[entry.path] = [st.st_mtime_ns, st.st_size, families]
+                parsed += 1
+        return dirs, files, parsed
+
+    def _index(self, dirs, files):
+        families = {}
+        # Sorted so the same family always resolves to the same file
+        for path in sorted(files):
+            for name in files[path][2]:
+                families.setdefault(name.casefold(), (name, path))
+        with self._lock:
+            self._dirs = dirs
+            self._files = files
+            self._families = families
+            self._loaded_at = time.time()
+
+    def _read_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get('version') != _INDEX_VERSION or data.get('font_dirs') != self.font_dirs:
+            return False
+        self._index(data['dirs'], data['files'])
+        return True
+
+    def _write_index(self):
+        try:
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            tmp_path = f"{self.index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': _INDEX_VERSION, 'font_dirs': self.font_dirs, 'dirs': self._dirs, 'files': self._files}, f)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            logger.warning(f"Could not persist font index to {self.index_path}: {e}")
+
+    def load(self, force=False):
+        """Load the persisted index, rescanning when a font directory changed since it was written."""
+        with self._build_lock:
+            if self._loaded_at is None and not force:
+                self._read_index()
+            if self._loaded_at is not None and not force and not self._stale():
+                self._loaded_at = time.time()
+                return
+            start = time.time()
+            dirs, files, parsed = self._scan()
+            self._index(dirs, files)
+            self._write_index()
+            logger.info(f"Font registry built: {len(self._families)} families from {len(files)} files "
+                        f"({parsed} parsed) in {time.time() - start:.2f}s")
+
+    def load_async(self):
+        thread = threading.Thread(target=self.load, name='font-registry-load', daemon=True)
+        thread.start()
+        return thread
+
+    def _ensure_loaded(self):
+        if self._loaded_at is None:
+            self.load()
+
+    def _refresh_on_miss(self):
+        if time.time() - self._loaded_at >= self.refresh_seconds:
+            self.load()
+            return True
+        return False
+
+    def get_font_path(self, family):
+        """Font file providing family (case-insensitive), or None."""
+        self._ensure_loaded()
+        key = family.casefold()
+        match = self._families.get(key)
+        if match is None and self._refresh_on_miss():
+            match = self._families.get(key)
+        return match[1] if match else None
+
+    def is_available(self, family):
+        return self.get_font_path(family) is not None
+
+    def get_families(self):
+        """Sorted list of available family names."""
+        self._ensure_loaded()
+        return sorted(name for name, _ in self._families.values())
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'families': len(self._families),
+                'files': len(self._files),
+                'loaded_at': self._loaded_at
+            }
+
+font_registry = FontRegistry()
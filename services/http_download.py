@@ -0,0 +1,184 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import time
+import logging
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_CHUNK_SIZE = int(os.environ.get('DOWNLOAD_CHUNK_SIZE', str(1024 * 1024)))
+# Files at least this large are fetched as parallel range requests when the server allows it
+DOWNLOAD_PARALLEL_MIN_MB = int(os.environ.get('DOWNLOAD_PARALLEL_MIN_MB', '64'))
+DOWNLOAD_PARALLEL_PARTS = int(os.environ.get('DOWNLOAD_PARALLEL_PARTS', '4'))
+DOWNLOAD_RETRIES = int(os.environ.get('DOWNLOAD_RETRIES', '3'))
+# (connect, read) timeouts in seconds; the read timeout applies between received bytes
+DOWNLOAD_TIMEOUT = (10, float(os.environ.get('DOWNLOAD_READ_TIMEOUT', '60')))
+
+_POOL_SIZE = 32
+
+# Errors after which a partial body can be resumed with a range request
+_RESUMABLE_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.ChunkedEncodingError,
+    requests.exceptions.Timeout,
+)
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Process-wide requests.Session with pooled keep-alive connections per host.
+
+    Connection failures and 429/5xx responses are retried with backoff before
+    any body is read; failures mid-body are resumed by write_response.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = Retry(
+                    total=DOWNLOAD_RETRIES,
+                    backoff_factor=0.5,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=frozenset(['GET', 'HEAD']),
+                    raise_on_status=False
+                )
+                adapter = HTTPAdapter(pool_connections=_POOL_SIZE, pool_maxsize=_POOL_SIZE, max_retries=retry)
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+def open_stream(url, headers=None):
+    """Start a streamed GET on the shared session."""
+    return get_session().get(url, stream=True, headers=headers, timeout=DOWNLOAD_TIMEOUT)
+
+def _content_length(response):
+    length = response.headers.get('Content-Length')
+    return int(length) if length and length.isdigit() else None
+
+def _supports_ranges(response):
+    return response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+
+def _range_validator(response):
+    # If-Range only accepts strong ETags
+    etag = response.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return response.headers.get('Last-Modified')
+
+def _range_headers(start, end, validator):
+    headers = {'Range': f"bytes={start}-{end if end is not None else ''}"}
+    if validator:
+        # Fail instead of splicing bytes from a different version of the file
+        headers['If-Range'] = validator
+    return headers
+
+def _write_range(url, path, start, end, validator, chunk_size):
+    """Write bytes [start, end] of url into path at offset start, resuming after dropped connections."""
+    position = start
+    attempts = 0
+    while position <= end:
+        try:
+            with open_stream(url, _range_headers(position, end, validator)) as response:
+                if response.status_code != 206:
+                    raise IOError(f"Range request for {url} returned {response.status_code}")
+                with open(path, 'r+b') as f:
+                    f.seek(position)
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        if chunk:
+                            f.write(chunk)
+                            position += len(chunk)
+            if position <= end:
+                raise requests.exceptions.ChunkedEncodingError(f"Range {start}-{end} ended early at {position}")
+        except _RESUMABLE_ERRORS as e:
+            attempts += 1
+            if attempts > DOWNLOAD_RETRIES:
+                raise
+            logger.warning(f"Resuming {url} at byte {position} after: {e}")
+            time.sleep(0.5 * attempts)
+    return position - start
+
+def _download_parallel(url, path, total, validator, chunk_size, parts):
+    part_size = -(-total // parts)
+    ranges = [(start, min(start + part_size, total) - 1) for start in range(0, total, part_size)]
+    with open(path, 'wb') as f:
+        f.truncate(total)
+    logger.info(f"Downloading {url} ({total} bytes) as {len(ranges)} parallel ranges")
+    with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+        futures = [executor.submit(_write_range, url, path, start, end, validator, chunk_size) for start, end in ranges]
+        return sum(future.result() for future in futures)
+
+def write_response(response, path, chunk_size=None, url=None):
+    """Write the body of a streamed 200 response to path.
+
+    When url is given and the server accepts ranges, large bodies are
+    re-fetched as DOWNLOAD_PARALLEL_PARTS parallel range requests, and a
+    connection dropped mid-body is resumed from the last written byte
+    instead of starting over.
+
+    Args:
+        response (requests.Response): Streamed response; consumed or closed on return
+        path (str): Destination file
+        chunk_size (int, optional): Read size, defaults to DOWNLOAD_CHUNK_SIZE
+        url (str, optional): Source URL, needed for range requests
+
+    Returns:
+        int: Bytes written
+    """
+    chunk_size = chunk_size or DOWNLOAD_CHUNK_SIZE
+    total = _content_length(response)
+    ranges_ok = url is not None and _supports_ranges(response) and not response.headers.get('Content-Encoding')
+    validator = _range_validator(response)
+
+    if ranges_ok and total and DOWNLOAD_PARALLEL_PARTS > 1 and total >= DOWNLOAD_PARALLEL_MIN_MB * 1024 * 1024:
+        response.close()
+        return _download_parallel(url, path, total, validator, chunk_size, DOWNLOAD_PARALLEL_PARTS)
+
+    size = 0
+    attempts = 0
+    with open(path, 'wb') as f:
+        while True:
+            try:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    if chunk:
+                        f.write(chunk)
+                        size += len(chunk)
+                if ranges_ok and total is not None and size < total:
+                    raise requests.exceptions.ChunkedEncodingError(f"Body ended early at {size} of {total} bytes")
+                break
+            except _RESUMABLE_ERRORS as e:
+                response.close()
+                attempts += 1
+                if not ranges_ok or attempts > DOWNLOAD_RETRIES:
+                    raise
+                logger.warning(f"Resuming {url} at byte {size} after: {e}")
+                time.sleep(0.5 * attempts)
+                response = open_stream(url, _range_headers(size, None, validator))
+                if response.status_code != 206:
+                    response.close()
+                    raise IOError(f"Could not resume {url}: server returned {response.status_code}")
+    response.close()
+    return size
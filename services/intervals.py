@@ -0,0 +1,58 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+from bisect import bisect_left, bisect_right
+
+class IntervalSet:
+    """Sorted, merged time intervals in seconds with O(log n) overlap queries.
+
+    Overlapping input intervals are merged; intervals that only touch are
+    kept apart so a zero-length span at the shared boundary does not count
+    as overlapping, as with a pairwise start < end check.
+    """
+
+    def __init__(self, intervals=()):
+        merged = []
+        for start, end in sorted(intervals):
+            if merged and start < merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        self._starts = [start for start, _ in merged]
+        self._ends = [end for _, end in merged]
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __iter__(self):
+        return iter(zip(self._starts, self._ends))
+
+    def overlaps(self, start, end, inclusive=False):
+        """Whether [start, end] overlaps any interval.
+
+        By default spans that only touch an interval do not overlap it
+        (start < interval_end and end > interval_start); with inclusive
+        they do.
+        """
+        # Merged intervals are disjoint, so ends are sorted as well: find the
+        # first interval ending after start and check that it begins before end
+        if inclusive:
+            i = bisect_left(self._ends, start)
+            return i < len(self._ends) and self._starts[i] <= end
+        i = bisect_right(self._ends, start)
+        return i < len(self._ends) and self._starts[i] < end
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+進程內任務隊列
+為 queue_task_wrapper 提供有界隊列、工作線程池和任務狀態記錄
+"""
+
+import os
+import time
+import uuid
+import logging
+from queue import Queue, Full
+from threading import Thread, Lock
+from functools import wraps
+from typing import Dict, Any
+
+from flask import request, jsonify
+
+from app_utils import log_job_status
+from services.webhook import send_webhook
+from version import BUILD_NUMBER
+
+logger = logging.getLogger(__name__)
+
+class JobQueue:
+    """
+    有界任務隊列
+    帶 webhook_url 的請求會被放入隊列並立即返回 202，由後台工作線程執行；
+    沒有 webhook_url 的請求在請求線程中同步執行並直接返回結果
+    """
+
+    def __init__(self, app, max_queue_length: int = 0, workers: int = 2):
+        """
+        初始化任務隊列
+
+        Args:
+            app: Flask 應用實例（工作線程在其 app_context 中執行任務）
+            max_queue_length: 隊列最大長度，0 表示不限制
+            workers: 工作線程數量
+        """
+        self.app = app
+        self.max_queue_length = max(0, max_queue_length)
+        self.workers = max(1, workers)
+        self.task_queue = Queue(maxsize=self.max_queue_length)
+        self.queue_id = id(self.task_queue)
+        self.active_jobs = 0
+        self.stats_lock = Lock()
+        self.threads = []
+
+    def start(self):
+        """啟動工作線程"""
+        if self.threads:
+            return
+
+        for index in range(self.workers):
+            thread = Thread(
+                target=self._process_queue,
+                name=f"job-queue-worker-{index}",
+                daemon=True
+            )
+            thread.start()
+            self.threads.append(thread)
+
+        logger.info(f"任務隊列已啟動 - 工作線程: {self.workers}, 最大長度: {self.max_queue_length or '不限制'}")
+
+    def _build_response(self, job_id: str, data: Dict[str, Any], response, run_time: float,
+                        queue_time: float, total_time: float) -> Dict[str, Any]:
+        """將任務返回的 (結果, 端點, 狀態碼) 轉換為統一的響應結構"""
+        result, endpoint, status_code = response
+        return {
+            "code": status_code,
+            "id": data.get("id"),
+            "job_id": job_id,
+            "response": result if status_code == 200 else None,
+            "message": "success" if status_code == 200 else result,
+            "endpoint": endpoint,
+            "pid": os.getpid(),
+            "queue_id": self.queue_id,
+            "run_time": round(run_time, 3),
+            "queue_time": round(queue_time, 3),
+            "total_time": round(total_time, 3),
+            "queue_length": self.task_queue.qsize(),
+            "build_number": BUILD_NUMBER
+        }
+
+    def _log_status(self, job_id: str, job_status: str, response=None):
+        """記錄任務狀態，失敗時只寫日誌，不影響任務本身"""
+        try:
+            log_job_status(job_id, {
+                "job_status": job_status,
+                "job_id": job_id,
+                "queue_id": self.queue_id,
+                "process_id": os.getpid(),
+                "response": response
+            })
+        except Exception as e:
+            logger.error(f"Job {job_id}: 記錄任務狀態 {job_status} 失敗 - {e}")
+
+    def _notify_webhook(self, job_id: str, data: Dict[str, Any], response_obj: Dict[str, Any]):
+        """發送 webhook，失敗時只寫日誌，不讓工作線程退出"""
+        if not data.get("webhook_url"):
+            return
+        try:
+            send_webhook(data["webhook_url"], response_obj)
+        except Exception as e:
+            logger.error(f"Job {job_id}: 發送 webhook 失敗 - {e}")
+
+    def _process_queue(self):
+        """工作線程主循環"""
+        while True:
+            job_id, data, task_func, queue_start_time = self.task_queue.get()
+            run_start_time = time.time()
+            queue_time = run_start_time - queue_start_time
+
+            with self.stats_lock:
+                self.active_jobs += 1
+
+            try:
+                self._log_status(job_id, "running")
+
+                with self.app.app_context():
+                    response = task_func()
+
+                run_time = time.time() - run_start_time
+                total_time = time.time() - queue_start_time
+                response_obj = self._build_response(job_id, data, response, run_time, queue_time, total_time)
+                self._log_status(job_id, "done", response_obj)
+                self._notify_webhook(job_id, data, response_obj)
+
+            except Exception as e:
+                logger.error(f"Job {job_id}: 任務執行失敗 - {e}")
+                response_obj = self._build_response(
+                    job_id, data, (str(e), None, 500),
+                    time.time() - run_start_time, queue_time, time.time() - queue_start_time
+                )
+                self._log_status(job_id, "failed", response_obj)
+                self._notify_webhook(job_id, data, response_obj)
+            finally:
+                with self.stats_lock:
+                    self.active_jobs -= 1
+                self.task_queue.task_done()
+
+    def queue_task(self, bypass_queue: bool = False):
+        """
+        任務裝飾器工廠
+
+        Args:
+            bypass_queue: 為 True 時在請求線程中同步執行（用於狀態查詢等輕量端點）
+
+        沒有 webhook_url 的請求同樣同步執行並返回結果，只有帶 webhook_url 的請求才入隊
+        """
+        def decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                job_id = str(uuid.uuid4())
+                data = request.get_json(silent=True) or {}
+                start_time = time.time()
+
+                if bypass_queue:
+                    response = f(job_id=job_id, data=data, *args, **kwargs)
+                    run_time = time.time() - start_time
+                    response_obj = self._build_response(job_id, data, response, run_time, 0, run_time)
+                    return jsonify(response_obj), response[2]
+
+                if not data.get("webhook_url"):
+                    # 沒有 webhook 就無法送達異步結果，在請求線程中執行並直接返回
+                    self._log_status(job_id, "running")
+                    try:
+                        response = f(job_id=job_id, data=data, *args, **kwargs)
+                    except Exception as e:
+                        run_time = time.time() - start_time
+                        self._log_status(job_id, "failed", self._build_response(
+                            job_id, data, (str(e), None, 500), run_time, 0, run_time
+                        ))
+                        raise
+                    run_time = time.time() - start_time
+                    response_obj = self._build_response(job_id, data, response, run_time, 0, run_time)
+                    self._log_status(job_id, "done", response_obj)
+                    return jsonify(response_obj), response[2]
+
+                # 先記錄 queued 狀態，避免覆蓋工作線程已寫入的 running 狀態
+                self._log_status(job_id, "queued")
+
+                task = (job_id, data, lambda: f(job_id=job_id, data=data, *args, **kwargs), start_time)
+                try:
+                    self.task_queue.put_nowait(task)
+                except Full:
+                    logger.warning(f"Job {job_id}: 隊列已滿，拒絕任務 (MAX_QUEUE_LENGTH={self.max_queue_length})")
+                    self._log_status(job_id, "rejected")
+                    return jsonify({
+                        "code": 429,
+                        "id": data.get("id"),
+                        "job_id": job_id,
+                        "message": f"MAX_QUEUE_LENGTH ({self.max_queue_length}) reached",
+                        "pid": os.getpid(),
+                        "queue_id": self.queue_id,
+                        "queue_length": self.task_queue.qsize(),
+                        "build_number": BUILD_NUMBER
+                    }), 429
+
+                return jsonify({
+                    "code": 202,
+                    "id": data.get("id"),
+                    "job_id": job_id,
+                    "message": "processing",
+                    "pid": os.getpid(),
+                    "queue_id": self.queue_id,
+                    "max_queue_length": self.max_queue_length or "unlimited",
+                    "queue_length": self.task_queue.qsize(),
+                    "build_number": BUILD_NUMBER
+                }), 202
+            return wrapper
+        return decorator
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取隊列統計信息"""
+        with self.stats_lock:
+            active_jobs = self.active_jobs
+        return {
+            'queue_id': self.queue_id,
+            'queue_length': self.task_queue.qsize(),
+            'max_queue_length': self.max_queue_length,
+            'workers': self.workers,
+            'active_jobs': active_jobs
+        }
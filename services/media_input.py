@@ -0,0 +1,131 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import logging
+import requests
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlparse
+from services.file_management import download_file, get_extension_from_url
+from services.download_cache import download_cache, DOWNLOAD_CACHE_ENABLED
+from services.http_download import get_session
+
+logger = logging.getLogger(__name__)
+
+MEDIA_STREAMING_ENABLED = os.environ.get('MEDIA_STREAMING_ENABLED', 'true').lower() == 'true'
+
+# How an operation reads its input:
+#   'seek'       - jumps to a timestamp or the container index (thumbnail, metadata, trim);
+#                  only worth streaming when the server honours range requests
+#   'sequential' - reads the file front to back once (silence detection)
+ACCESS_SEEK = 'seek'
+ACCESS_SEQUENTIAL = 'sequential'
+
+# ffmpeg input options that keep a network read alive across dropped connections
+_RECONNECT_ARGS = ['-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '5']
+
+_HEAD_TIMEOUT = 10
+
+@dataclass
+class MediaInput:
+    """Where ffmpeg should read a job's source from.
+
+    path is either a local file owned by the job or an http(s) URL that
+    ffmpeg reads directly, with the Content-Type its HEAD response reported.
+    """
+    path: str
+    streamed: bool
+    size: Optional[int] = None
+    content_type: Optional[str] = None
+
+    def input_args(self):
+        """Options to place before '-i path' on an ffmpeg command line."""
+        return list(_RECONNECT_ARGS) if self.streamed else []
+
+    def input_kwargs(self):
+        """input_args() as ffmpeg-python keyword arguments."""
+        args = self.input_args()
+        return {args[i].lstrip('-'): args[i + 1] for i in range(0, len(args), 2)}
+
+    @property
+    def extension(self):
+        """Source file extension including the dot, or '' when neither the URL nor the Content-Type tells."""
+        if not self.streamed:
+            return os.path.splitext(self.path)[1]
+        try:
+            # Content-Type from the HEAD already made, so no second request
+            return get_extension_from_url(self.path, self.content_type or '')
+        except ValueError:
+            return ''
+
+    @property
+    def local_path(self):
+        """Local file to delete after the job, or None when streamed."""
+        return None if self.streamed else self.path
+
+    def cleanup(self):
+        if not self.streamed and os.path.exists(self.path):
+            os.remove(self.path)
+
+def _stream_target(media_url, access):
+    """Final URL, size and Content-Type when media_url can be read by ffmpeg directly, else None."""
+    if urlparse(media_url).scheme not in ('http', 'https'):
+        return None
+    if DOWNLOAD_CACHE_ENABLED and download_cache.contains(media_url):
+        # A local copy is one revalidation away, which beats any network read
+        return None
+    try:
+        response = get_session().head(media_url, allow_redirects=True, timeout=_HEAD_TIMEOUT)
+    except requests.RequestException as e:
+        logger.info(f"HEAD failed for {media_url} ({e}), downloading instead")
+        return None
+    if response.status_code >= 400:
+        return None
+    if access == ACCESS_SEEK and response.headers.get('Accept-Ranges', '').lower() != 'bytes':
+        return None
+    size = response.headers.get('Content-Length')
+    return response.url, int(size) if size and size.isdigit() else None, response.headers.get('Content-Type')
+
+def resolve_media_input(media_url, storage_path, access=ACCESS_SEEK, require_size=False):
+    """Decide whether ffmpeg reads media_url over the network or from a downloaded copy.
+
+    Streaming is chosen for http(s) sources that are not already in the
+    download cache when the operation's access pattern is supported by the
+    server (range requests for seeking reads), so e.g. a thumbnail near the
+    start of a large file fetches only the bytes it decodes. Everything else
+    is downloaded first as before.
+
+    Args:
+        media_url (str): Source URL
+        storage_path (str): Download directory when the source is fetched
+        access (str): ACCESS_SEEK or ACCESS_SEQUENTIAL
+        require_size (bool): Only stream when the server reports Content-Length
+
+    Returns:
+        MediaInput: The resolved input; call cleanup() when done
+    """
+    if MEDIA_STREAMING_ENABLED:
+        target = _stream_target(media_url, access)
+        if target and (target[1] is not None or not require_size):
+            logger.info(f"Streaming {media_url} into ffmpeg ({access} access)")
+            return MediaInput(target[0], True, target[1], target[2])
+
+    local_filename = download_file(media_url, storage_path)
+    logger.info(f"Downloaded media to local file: {local_filename}")
+    return MediaInput(local_filename, False, os.path.getsize(local_filename))
@@ -0,0 +1,373 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+import subprocess
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Any
+from config import LOCAL_STORAGE_PATH
+
+logger = logging.getLogger(__name__)
+
+PROBE_CACHE_DIR = os.environ.get('PROBE_CACHE_DIR', os.path.join(LOCAL_STORAGE_PATH, '.probe_cache'))
+PROBE_MEMORY_CACHE_SIZE = 1024
+PROBE_CACHE_MAX_ENTRIES = int(os.environ.get('PROBE_CACHE_MAX_ENTRIES', '10000'))
+
+# The on-disk cache is swept at most this often, so a burst of probes doesn't rescan it each time
+_SWEEP_INTERVAL_SECONDS = 600
+
+# Bytes hashed from the head and the tail of a file for its fingerprint
+_FINGERPRINT_SAMPLE = 64 * 1024
+_HASH_READ_SIZE = 1024 * 1024
+
+@dataclass
+class ProbeResult:
+    """Result of a single ffprobe run over a media file."""
+    format: Dict[str, Any]
+    streams: List[Dict[str, Any]]
+    keyframes: Optional[List[float]] = None
+    fingerprint: Optional[str] = field(default=None, repr=False)
+
+    @property
+    def duration(self) -> Optional[float]:
+        try:
+            return float(self.format['duration'])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    @property
+    def bit_rate(self) -> Optional[int]:
+        try:
+            return int(self.format['bit_rate'])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    @property
+    def video_stream(self) -> Optional[Dict[str, Any]]:
+        return next((s for s in self.streams if s.get('codec_type') == 'video'), None)
+
+    @property
+    def audio_stream(self) -> Optional[Dict[str, Any]]:
+        return next((s for s in self.streams if s.get('codec_type') == 'audio'), None)
+
+    @property
+    def has_video(self) -> bool:
+        return self.video_stream is not None
+
+    @property
+    def has_audio(self) -> bool:
+        return self.audio_stream is not None
+
+    @property
+    def width(self) -> Optional[int]:
+        stream = self.video_stream
+        return int(stream['width']) if stream and 'width' in stream else None
+
+    @property
+    def height(self) -> Optional[int]:
+        stream = self.video_stream
+        return int(stream['height']) if stream and 'height' in stream else None
+
+    @property
+    def resolution(self) -> Optional[tuple]:
+        if self.width is None or self.height is None:
+            return None
+        return self.width, self.height
+
+    @property
+    def video_codec(self) -> Optional[str]:
+        stream = self.video_stream
+        return stream.get('codec_name') if stream else None
+
+    @property
+    def audio_codec(self) -> Optional[str]:
+        stream = self.audio_stream
+        return stream.get('codec_name') if stream else None
+
+    @property
+    def fps(self) -> Optional[float]:
+        stream = self.video_stream
+        if not stream or 'r_frame_rate' not in stream:
+            return None
+        try:
+            num, den = map(int, stream['r_frame_rate'].split('/'))
+            return num / den if den else None
+        except ValueError:
+            return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Raw ffprobe JSON shape ({'format': ..., 'streams': ...})."""
+        return {'format': self.format, 'streams': self.streams}
+
+class MediaProber:
+    """Runs ffprobe at most once per file state and caches the result in memory and on disk.
+
+    A disk entry's mtime is its LRU clock; entries beyond max_entries are
+    swept after a store, at most once every _SWEEP_INTERVAL_SECONDS.
+    """
+
+    def __init__(self, cache_dir=PROBE_CACHE_DIR, memory_size=PROBE_MEMORY_CACHE_SIZE,
+                 max_entries=PROBE_CACHE_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+        self._swept_at = 0.0
+        self._memory = OrderedDict()
+        self._fingerprints = {}
+        self._content_hashes = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _fingerprint(self, path):
+        """File fingerprint: device, inode, size and mtime plus a hash of the first and last 64 KB.
+
+        The sampled bytes alone miss edits in the middle of a file of the same
+        size, so the stat identity is part of the digest: a rewritten or replaced
+        file gets a new fingerprint. Memoized per (path, size, mtime) so repeated
+        probes of an unchanged file don't re-read it.
+        """
+        st = os.stat(path)
+        stat_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+        with self._lock:
+            cached = self._fingerprints.get(stat_key)
+        if cached:
+            return cached
+
+        digest = hashlib.sha256(f"{st.st_dev}:{st.st_ino}:{st.st_size}:{st.st_mtime_ns}".encode())
+        with open(path, 'rb') as f:
+            digest.update(f.read(_FINGERPRINT_SAMPLE))
+            if st.st_size > _FINGERPRINT_SAMPLE:
+                f.seek(max(_FINGERPRINT_SAMPLE, st.st_size - _FINGERPRINT_SAMPLE))
+                digest.update(f.read(_FINGERPRINT_SAMPLE))
+        fingerprint = digest.hexdigest()
+
+        with self._lock:
+            if len(self._fingerprints) >= self.memory_size:
+                self._fingerprints.clear()
+            self._fingerprints[stat_key] = fingerprint
+        return fingerprint
+
+    def _content_hash(self, path):
+        """SHA-256 of the whole file, memoized per (path, size, mtime) like _fingerprint."""
+        st = os.stat(path)
+        stat_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+        with self._lock:
+            cached = self._content_hashes.get(stat_key)
+        if cached:
+            return cached
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(_HASH_READ_SIZE), b''):
+                digest.update(block)
+        content_hash = digest.hexdigest()
+
+        with self._lock:
+            if len(self._content_hashes) >= self.memory_size:
+                self._content_hashes.clear()
+            self._content_hashes[stat_key] = content_hash
+        return content_hash
+
+    def _remember(self, result):
+        with self._lock:
+            self._memory[result.fingerprint] = result
+            self._memory.move_to_end(result.fingerprint)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def _disk_path(self, fingerprint):
+        return os.path.join(self.cache_dir, f"{fingerprint}.json")
+
+    def _load_disk(self, fingerprint):
+        try:
+            with open(self._disk_path(fingerprint), 'r') as f:
+                data = json.load(f)
+            os.utime(self._disk_path(fingerprint), None)
+            return ProbeResult(data['format'], data['streams'], data.get('keyframes'), fingerprint)
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _store_disk(self, result):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{self._disk_path(result.fingerprint)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'format': result.format, 'streams': result.streams, 'keyframes': result.keyframes}, f)
+            os.replace(tmp_path, self._disk_path(result.fingerprint))
+        except OSError as e:
+            logger.warning(f"Could not persist probe result: {e}")
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            if now - self._swept_at < _SWEEP_INTERVAL_SECONDS:
+                return
+            self._swept_at = now
+        self.evict()
+
+    def evict(self):
+        """Drop the least recently used disk entries beyond max_entries."""
+        entries = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if entry.name.endswith('.json'):
+                        try:
+                            entries.append((entry.stat().st_mtime, entry.path))
+                        except FileNotFoundError:
+                            continue
+        except FileNotFoundError:
+            return
+
+        excess = len(entries) - self.max_entries
+        if excess <= 0:
+            return
+        entries.sort()
+        for _, path in entries[:excess]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self.evictions += excess
+
+    def _run_ffprobe(self, path, input_args=None):
+        cmd = [
+            'ffprobe',
+            '-v', 'quiet',
+            '-print_format', 'json',
+            '-show_format',
+            '-show_streams'
+        ] + (input_args or []) + [path]
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise Exception(f"ffprobe error: {result.stderr}")
+        data = json.loads(result.stdout)
+        return data.get('format', {}), data.get('streams', [])
+
+    def _run_keyframes(self, path):
+        # Packet flags are read from the demuxer, so no frame has to be decoded
+        cmd = [
+            'ffprobe',
+            '-v', 'error',
+            '-select_streams', 'v:0',
+            '-show_entries', 'packet=pts_time,flags',
+            '-of', 'csv=p=0',
+            path
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise Exception(f"ffprobe error: {result.stderr}")
+        keyframes = []
+        for line in result.stdout.splitlines():
+            parts = line.strip().split(',')
+            if len(parts) >= 2 and 'K' in parts[1]:
+                try:
+                    keyframes.append(float(parts[0]))
+                except ValueError:
+                    continue
+        keyframes.sort()
+        return keyframes
+
+    def probe(self, path, keyframes=False) -> ProbeResult:
+        """Probe a local media file, reusing any earlier probe of the same content.
+
+        Args:
+            path (str): Local media file path
+            keyframes (bool): Also collect the video keyframe timestamps
+
+        Returns:
+            ProbeResult: Format, streams and (optionally) keyframe times
+        """
+        fingerprint = self._fingerprint(path)
+
+        with self._lock:
+            result = self._memory.get(fingerprint)
+            if result is not None:
+                self._memory.move_to_end(fingerprint)
+
+        if result is None:
+            result = self._load_disk(fingerprint)
+
+        if result is not None and (not keyframes or result.keyframes is not None):
+            with self._lock:
+                self.hits += 1
+            self._remember(result)
+            return result
+
+        with self._lock:
+            self.misses += 1
+
+        if result is None:
+            fmt, streams = self._run_ffprobe(path)
+            result = ProbeResult(fmt, streams, None, fingerprint)
+        if keyframes:
+            result = ProbeResult(result.format, result.streams, self._run_keyframes(path), fingerprint)
+
+        self._remember(result)
+        self._store_disk(result)
+        return result
+
+    def probe_url(self, url, input_args=None) -> ProbeResult:
+        """Probe a remote file in place. Not cached, since the content can't be fingerprinted."""
+        fmt, streams = self._run_ffprobe(url, input_args)
+        return ProbeResult(fmt, streams)
+
+    def get_stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'memory_entries': len(self._memory)}
+
+media_prober = MediaProber()
+
+def probe(path, keyframes=False) -> ProbeResult:
+    """Probe a local media file once per content; see MediaProber.probe."""
+    return media_prober.probe(path, keyframes=keyframes)
+
+def probe_url(url, input_args=None) -> ProbeResult:
+    """Probe a remote media URL without downloading it; see MediaProber.probe_url."""
+    return media_prober.probe_url(url, input_args)
+
+def get_duration(path, default=None):
+    """Duration of a local media file in seconds, or default when it can't be determined."""
+    try:
+        duration = probe(path).duration
+    except Exception as e:
+        logger.warning(f"Could not probe duration of {path}: {e}")
+        return default
+    return duration if duration is not None else default
+
+def fingerprint(path):
+    """Fingerprint of a local file (stat identity plus head/tail hash), memoized per file state."""
+    return media_prober._fingerprint(path)
+
+def content_hash(path):
+    """SHA-256 of a local file's full content, memoized per file state.
+
+    Unlike fingerprint() this reads the whole file, so use it where two
+    different files must never share a key (e.g. cached transcriptions).
+    """
+    return media_prober._content_hash(path)
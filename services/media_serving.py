@@ -0,0 +1,180 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import logging
+import mimetypes
+from datetime import datetime, timezone
+from urllib.parse import quote
+from flask import request, Response
+from werkzeug.http import http_date, parse_date, parse_range_header, is_resource_modified
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_ROOT = os.path.join(os.getcwd(), 'output')
+
+# How file bodies leave the process:
+#   ''         - streamed by the app; gunicorn turns it into zero-copy sendfile()
+#   'nginx'    - X-Accel-Redirect to MEDIA_ACCEL_PREFIX + path relative to output/
+#   'sendfile' - X-Sendfile with the absolute path (Apache mod_xsendfile, lighttpd)
+MEDIA_ACCEL_MODE = os.environ.get('MEDIA_ACCEL_MODE', '').lower()
+MEDIA_ACCEL_PREFIX = os.environ.get('MEDIA_ACCEL_PREFIX', '/internal-output/')
+MEDIA_CACHE_MAX_AGE = int(os.environ.get('MEDIA_CACHE_MAX_AGE', '86400'))
+
+_BLOCK_SIZE = 1024 * 1024
+
+# Headers browsers need to read when scrubbing through cross-origin media
+EXPOSE_HEADERS = 'Content-Length, Content-Range, Accept-Ranges, ETag, Last-Modified'
+
+def file_etag(stat_result):
+    """Strong validator from size and mtime; changes whenever the file is rewritten."""
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+def _content_disposition(download_name, as_attachment):
+    kind = 'attachment' if as_attachment else 'inline'
+    if not download_name:
+        return kind
+    try:
+        download_name.encode('ascii')
+        return f'{kind}; filename="{download_name.replace(chr(34), "")}"'
+    except UnicodeEncodeError:
+        return f"{kind}; filename*=UTF-8''{quote(download_name)}"
+
+def _if_range_matches(etag, last_modified):
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    if if_range.startswith('W/'):
+        return False
+    date = parse_date(if_range)
+    return date is not None and last_modified.replace(microsecond=0) <= date
+
+def _requested_range(size, etag, last_modified):
+    """(start, end) half-open, None for the whole file, or False when unsatisfiable."""
+    header = request.headers.get('Range')
+    if not header or not _if_range_matches(etag, last_modified):
+        return None
+    ranges = parse_range_header(header)
+    # Malformed or multipart ranges are answered with the whole file, which RFC 9110 allows
+    if ranges is None or ranges.units != 'bytes' or len(ranges.ranges) != 1:
+        return None
+    start, end = ranges.ranges[0]
+    if start < 0:
+        start = max(size + start, 0)
+    end = size if end is None else min(end, size)
+    if start >= size or start >= end:
+        return False
+    return start, end
+
+def _iter_file(f, length):
+    try:
+        while length > 0:
+            chunk = f.read(min(_BLOCK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+def _body(path, start, length, whole_file):
+    f = open(path, 'rb')
+    f.seek(start)
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    # gunicorn sends a file_wrapper with os.sendfile() from the current offset
+    # for Content-Length bytes; other servers read wrappers to EOF, so ranges
+    # only go through them under gunicorn
+    bounded = whole_file or request.environ.get('SERVER_SOFTWARE', '').startswith('gunicorn')
+    if file_wrapper is not None and bounded:
+        return file_wrapper(f, _BLOCK_SIZE)
+    return _iter_file(f, length)
+
+def _accel_headers(path):
+    if MEDIA_ACCEL_MODE == 'sendfile':
+        return {'X-Sendfile': path}
+    if MEDIA_ACCEL_MODE == 'nginx':
+        relative = os.path.relpath(path, OUTPUT_ROOT)
+        if not relative.startswith('..'):
+            return {'X-Accel-Redirect': MEDIA_ACCEL_PREFIX.rstrip('/') + '/' + quote(relative.replace(os.sep, '/'))}
+    return None
+
+def serve_media_file(path, mimetype=None, download_name=None, as_attachment=False, max_age=MEDIA_CACHE_MAX_AGE):
+    """Serve a local file with validators, conditional GET and byte ranges.
+
+    Answers If-None-Match / If-Modified-Since with 304 and a single Range
+    (honouring If-Range) with 206, so players can seek in large videos and
+    clients revalidate without re-downloading. The body is handed to the
+    front server (MEDIA_ACCEL_MODE) or to the WSGI server's file wrapper.
+
+    Args:
+        path (str): Existing local file
+        mimetype (str, optional): Content-Type, guessed from the name by default
+        download_name (str, optional): Filename for Content-Disposition
+        as_attachment (bool): attachment instead of inline disposition
+        max_age (int): Cache-Control max-age in seconds
+
+    Returns:
+        flask.Response
+    """
+    path = os.path.abspath(path)
+    stat_result = os.stat(path)
+    size = stat_result.st_size
+    etag = file_etag(stat_result)
+    last_modified = datetime.fromtimestamp(stat_result.st_mtime, timezone.utc)
+
+    if mimetype is None:
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(last_modified),
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': f'public, max-age={max_age}',
+        'Content-Disposition': _content_disposition(download_name, as_attachment),
+    }
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return Response(status=304, headers=headers)
+
+    accel = _accel_headers(path)
+    if accel:
+        # The front server does ranges and the transfer itself
+        headers.update(accel)
+        return Response(status=200, headers=headers, mimetype=mimetype)
+
+    byte_range = _requested_range(size, etag, last_modified)
+    if byte_range is False:
+        headers['Content-Range'] = f'bytes */{size}'
+        return Response(status=416, headers=headers)
+
+    if byte_range is None:
+        start, end, status = 0, size, 200
+    else:
+        start, end = byte_range
+        status = 206
+        headers['Content-Range'] = f'bytes {start}-{end - 1}/{size}'
+    length = end - start
+    headers['Content-Length'] = str(length)
+
+    body = [] if request.method == 'HEAD' else _body(path, start, length, length == size)
+    response = Response(body, status=status, headers=headers, mimetype=mimetype, direct_passthrough=True)
+    # Response() would otherwise replace the explicit Content-Length on HEAD
+    response.headers['Content-Length'] = str(length)
+    return response
@@ -10,14 +10,84 @@
 
 import os
 import uuid
+import errno
 import shutil
 import logging
+import tempfile
 from datetime import datetime
 from typing import Dict, Optional, Any, Union
 from services.database_logger import database_logger
+from services.file_index import file_index
+from services.storage_manager import storage_manager
+from config import LOCAL_STORAGE_PATH
 
 logger = logging.getLogger(__name__)
 
+# 跨設備複製時的讀寫塊大小
+_COPY_BUFFER_SIZE = 1024 * 1024
+
+def _temp_dirs():
+    """任務中間文件所在的目錄：本地工作目錄、存儲管理器的臨時目錄和系統臨時目錄"""
+    return [os.path.realpath(directory)
+            for directory in (LOCAL_STORAGE_PATH, storage_manager.temp_dir, tempfile.gettempdir())]
+
+def _is_under(path: str, directory: str) -> bool:
+    try:
+        return os.path.commonpath([path, directory]) == directory
+    except ValueError:
+        # 不同驅動器上的路徑（Windows）
+        return False
+
+def _is_temp_path(path: str) -> bool:
+    """源文件是否為可直接移走的臨時文件（位於臨時目錄下，且不在 output/nca 內）"""
+    real_path = os.path.realpath(path)
+    if _is_under(real_path, os.path.realpath(os.path.join(os.getcwd(), 'output', 'nca'))):
+        return False
+    return any(_is_under(real_path, directory) for directory in _temp_dirs())
+
+def _copy_with_fsync(source_path: str, target_path: str):
+    """流式複製並fsync，先寫入臨時文件再原子替換，避免留下半個文件"""
+    part_path = f"{target_path}.part"
+    try:
+        with open(source_path, 'rb') as fsrc, open(part_path, 'wb') as fdst:
+            shutil.copyfileobj(fsrc, fdst, _COPY_BUFFER_SIZE)
+            fdst.flush()
+            os.fsync(fdst.fileno())
+        shutil.copystat(source_path, part_path)
+        os.replace(part_path, target_path)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+def place_file(source_path: str, target_path: str, keep_source: bool) -> str:
+    """
+    以零複製方式把文件放到目標位置
+    
+    - 不保留源文件：同一文件系統上 os.replace（僅改目錄項）
+    - 保留臨時目錄中的源文件：硬鏈接（共享同一份數據）
+    - 保留其他源文件：流式複製 + fsync，避免輸出與調用方的文件共享數據、被原地修改
+    - 跨設備或不支持鏈接時：流式複製 + fsync
+    
+    Returns:
+        實際採用的方式：'rename' / 'hardlink' / 'copy'
+    """
+    try:
+        if not keep_source:
+            os.replace(source_path, target_path)
+            return 'rename'
+        if _is_temp_path(source_path):
+            os.link(source_path, target_path)
+            return 'hardlink'
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP, errno.EACCES):
+            raise
+        logger.info(f"無法{'鏈接' if keep_source else '重命名'}到目標位置 ({e.strerror})，改用流式複製")
+
+    _copy_with_fsync(source_path, target_path)
+    if not keep_source:
+        os.remove(source_path)
+    return 'copy'
+
 class OutputFileManager:
     """統一輸出文件管理器"""
     
@@ -39,7 +109,8 @@ class OutputFileManager:
                         file_type: str, 
                         operation: str,
                         original_filename: Optional[str] = None,
-                        metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+                        metadata: Optional[Dict[str, Any]] = None,
+                        keep_source: Optional[bool] = None) -> Dict[str, Any]:
         """
         保存輸出文件到統一管理系統
         
@@ -49,9 +120,10 @@ class OutputFileManager:
             operation: 操作類型 (cut/trim/thumbnail/concatenate/transcribe等)
             original_filename: 原始文件名（可選）
             metadata: 額外的元數據（可選）
+            keep_source: 是否保留源文件；默認臨時文件會被移走，其他文件保留
             
         Returns:
-            包含文件信息的字典
+            包含文件信息的字典，placement 字段說明文件是如何放置的（rename/hardlink/copy）
         """
         try:
             # 檢查源文件是否存在
@@ -75,9 +147,21 @@ class OutputFileManager:
             target_dir = os.path.join(self.base_storage_path, file_type, year, month)
             os.makedirs(target_dir, exist_ok=True)
             
-            # 複製文件到目標位置
+            # 放置文件到目標位置（優先重命名/硬鏈接，跨設備才複製）
+            if keep_source is None:
+                keep_source = not _is_temp_path(source_file_path)
             target_file_path = os.path.join(target_dir, safe_filename)
-            shutil.copy2(source_file_path, target_file_path)
+            source_stat = os.stat(source_file_path)
+            source_size = source_stat.st_size
+            placement = place_file(source_file_path, target_file_path, keep_source)
+            logger.info(f"文件放置方式: {placement} ({source_file_path} -> {target_file_path})")
+            file_index.add(target_file_path)
+            
+            # 更新存儲用量賬本（源文件被移走時由賬本判斷是否扣減）
+            if os.path.exists(source_file_path):
+                storage_manager.record_file_added(target_file_path, source_size)
+            else:
+                storage_manager.record_file_moved(source_file_path, target_file_path, source_size, source_stat.st_mtime)
             
             # 獲取文件信息
             file_size = os.path.getsize(target_file_path)
@@ -101,14 +185,6 @@ class OutputFileManager:
             # 保存到數據庫
             self._save_to_database(file_record)
             
-            # 清理源文件（如果是臨時文件）
-            if source_file_path.startswith('/tmp') or 'temp' in source_file_path.lower():
-                try:
-                    os.remove(source_file_path)
-                    logger.info(f"清理臨時文件: {source_file_path}")
-                except Exception as e:
-                    logger.warning(f"清理臨時文件失敗: {e}")
-            
             logger.info(f"輸出文件保存成功: {operation} -> {file_url}")
             
             return {
@@ -119,6 +195,7 @@ class OutputFileManager:
                 'file_size': file_size,
                 'file_type': file_type,
                 'operation': operation,
+                'placement': placement,
                 'created_at': current_date.isoformat()
             }
             
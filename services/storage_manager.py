@@ -10,20 +10,35 @@
 """
 
 import os
+import json
+import time
 import logging
 import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from typing import Dict, List, Optional
 
+try:
+    import fcntl
+except ImportError:  # Windows 開發環境：只在進程內加鎖
+    fcntl = None
+
 logger = logging.getLogger(__name__)
 
+# 後台全量對賬間隔（秒）；兩次對賬之間用文件保存/上傳/刪除的增量維護用量
+STORAGE_RECONCILE_SECONDS = int(os.environ.get('STORAGE_RECONCILE_SECONDS', '3600'))
+# 用量賬本文件，同一主機上的所有 worker 進程共用
+STORAGE_LEDGER_PATH = os.environ.get('STORAGE_LEDGER_PATH', os.path.join(tempfile.gettempdir(), 'storage_usage_ledger.json'))
+
 class StorageManager:
     """
     存儲管理器
     負責存儲目錄的創建、監控和維護
     """
     
-    def __init__(self):
+    def __init__(self, ledger_path: str = STORAGE_LEDGER_PATH):
         """初始化存儲管理器"""
         # 從環境變量獲取存儲路徑
         self.output_dir = os.environ.get('LOCAL_STORAGE_PATH', '/app/output')
@@ -66,6 +81,19 @@ class StorageManager:
             self.digital_human_dir,
             self.whisper_cache_dir
         ]
+        
+        # 用量賬本保存在 ledger_path（JSON），多個 worker 進程共用，讀寫時持有文件鎖：
+        #   usage: 每個關鍵路徑的字節數和文件數
+        #   reconciled_at / scanned_since: 上次對賬完成時間和掃描開始時間，此前已存在的文件都已計入
+        #   scan_started: 正在進行的對賬掃描的開始時間，同一時間只有一個進程掃描
+        #   journal: 掃描期間記錄的增量，掃描結束後重放到掃描結果上
+        self.ledger_path = ledger_path
+        # (真實路徑, 關鍵路徑)，長路徑在前以便嵌套目錄取最內層
+        self._ledger_roots = sorted(((os.path.realpath(path), path) for path in self.critical_paths),
+                                    key=lambda item: len(item[0]), reverse=True)
+        self._ledger_lock = threading.Lock()
+        self._reconciler = None
+        self._started_at = time.time()
     
     def initialize_storage(self) -> Dict:
         """
@@ -107,45 +135,267 @@ class StorageManager:
         logger.info(f"📊 存儲初始化完成: 創建 {len(results['created_directories'])} 個目錄")
         return results
     
-    def get_storage_usage(self) -> Dict:
+    def _empty_ledger(self) -> Dict:
+        return {
+            "usage": {path: {"size_bytes": 0, "file_count": 0} for path in self.critical_paths},
+            "reconciled_at": None,
+            "scanned_since": None,
+            "scan_started": None,
+            "journal": []
+        }
+    
+    @contextmanager
+    def _ledger(self, write: bool = True):
+        """持有進程內鎖和文件鎖讀取賬本，write 為 True 時在退出時寫回"""
+        with self._ledger_lock:
+            with open(self.ledger_path + '.lock', 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    try:
+                        with open(self.ledger_path, 'r', encoding='utf-8') as f:
+                            ledger = json.load(f)
+                    except (OSError, ValueError):
+                        ledger = self._empty_ledger()
+                    # 關鍵路徑配置變化時補上缺少的條目
+                    for path in self.critical_paths:
+                        ledger["usage"].setdefault(path, {"size_bytes": 0, "file_count": 0})
+                    yield ledger
+                    if write:
+                        tmp_path = f"{self.ledger_path}.{os.getpid()}.tmp"
+                        with open(tmp_path, 'w', encoding='utf-8') as f:
+                            json.dump(ledger, f)
+                        os.replace(tmp_path, self.ledger_path)
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+    
+    def _ledger_root(self, file_path: str) -> Optional[str]:
+        """文件所屬的關鍵路徑（最長前綴匹配），不在任何關鍵路徑下時返回None"""
+        real_path = os.path.realpath(file_path)
+        for root, path in self._ledger_roots:
+            if real_path.startswith(root + os.sep):
+                return path
+        return None
+    
+    @staticmethod
+    def _apply_delta(entry: Dict, size_delta: int, count_delta: int):
+        entry["size_bytes"] = max(entry["size_bytes"] + size_delta, 0)
+        entry["file_count"] = max(entry["file_count"] + count_delta, 0)
+    
+    def record_usage_delta(self, file_path: str, size_delta: int, count_delta: int):
+        """
+        按文件路徑記錄用量增量
+        
+        Args:
+            file_path: 新增或刪除的文件路徑
+            size_delta: 字節數變化
+            count_delta: 文件數變化
+        """
+        root = self._ledger_root(file_path)
+        if root is None:
+            return
+        with self._ledger() as ledger:
+            self._apply_delta(ledger["usage"][root], size_delta, count_delta)
+            if ledger["scan_started"] is not None:
+                ledger["journal"].append([time.time(), os.path.realpath(file_path), size_delta, count_delta])
+    
+    def record_file_added(self, file_path: str, size: Optional[int] = None):
+        """記錄新保存的文件（保存、上傳後調用）"""
+        try:
+            if size is None:
+                size = os.path.getsize(file_path)
+        except OSError:
+            return
+        self.record_usage_delta(file_path, size, 1)
+    
+    def record_file_removed(self, file_path: str, size: int):
+        """記錄已刪除或移走的文件，size 為刪除前的大小"""
+        self.record_usage_delta(file_path, -size, -1)
+    
+    def record_file_moved(self, source_path: str, target_path: str, size: int, source_mtime: float):
         """
-        獲取存儲使用情況
+        記錄移動到新位置的文件
+        
+        目標文件計入賬本；源文件（如 LOCAL_STORAGE_PATH 下的任務輸出）寫入時不經過賬本，
+        只有在上次對賬掃描開始前已存在、即已被掃描計入時才扣減，否則會抵消目標的新增
+        """
+        self.record_file_added(target_path, size)
+        with self._ledger(write=False) as ledger:
+            scanned_since = ledger["scanned_since"]
+        if scanned_since is not None and source_mtime < scanned_since:
+            self.record_file_removed(source_path, size)
+    
+    def _scan_directory(self, directory: str, listed_at: Optional[Dict[str, float]] = None):
+        """
+        用 os.scandir 迭代統計目錄的 (總字節數, 文件數)
+        
+        listed_at 不為 None 時記錄每個目錄（真實路徑）開始列出的時間
+        """
+        total_size = 0
+        file_count = 0
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            if listed_at is not None:
+                listed_at[os.path.realpath(current)] = time.time()
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif entry.is_file(follow_symlinks=False):
+                                total_size += entry.stat(follow_symlinks=False).st_size
+                                file_count += 1
+                        except OSError:
+                            # 忽略無法訪問的文件
+                            pass
+            except OSError as e:
+                logger.error(f"掃描目錄時出錯 {current}: {str(e)}")
+        return total_size, file_count
+    
+    def reconcile_usage(self, wait: bool = True) -> Optional[Dict]:
+        """
+        全量掃描關鍵路徑，校正用量賬本
+        
+        同一時間只有一個進程掃描：已有掃描在進行時，wait 為 True 則等它完成並返回其結果，
+        否則直接返回 None。掃描期間記錄的增量按文件所在目錄被列出的時間重放：
+        新增的文件在目錄列出之後寫入才補計，刪除的文件在目錄列出之後刪除才扣減
+        
+        Args:
+            wait: 已有掃描進行時是否等待
+        
+        Returns:
+            Dict: 校正後的用量
+        """
+        start = time.time()
+        with self._ledger() as ledger:
+            running = ledger["scan_started"]
+            # 超過兩個對賬間隔仍未完成的掃描視為進程已退出
+            claimed = running is None or start - running > 2 * STORAGE_RECONCILE_SECONDS
+            if claimed:
+                ledger["scan_started"] = start
+                ledger["journal"] = []
+        
+        if not claimed:
+            if not wait:
+                return None
+            while True:
+                time.sleep(0.5)
+                with self._ledger(write=False) as ledger:
+                    if ledger["scan_started"] != running:
+                        return ledger["usage"]
+        
+        scanned = {}
+        listed_at = {}
+        try:
+            for path in self.critical_paths:
+                if os.path.exists(path):
+                    total_size, file_count = self._scan_directory(path, listed_at)
+                else:
+                    total_size, file_count = 0, 0
+                scanned[path] = {"size_bytes": total_size, "file_count": file_count}
+        except Exception:
+            with self._ledger() as ledger:
+                ledger["scan_started"] = None
+                ledger["journal"] = []
+            raise
+        
+        with self._ledger() as ledger:
+            replayed = 0
+            for recorded_at, file_path, size_delta, count_delta in ledger["journal"]:
+                root = self._ledger_root(file_path)
+                if root is None:
+                    continue
+                dir_listed_at = listed_at.get(os.path.dirname(file_path))
+                if count_delta < 0:
+                    missed = dir_listed_at is not None and dir_listed_at < recorded_at
+                else:
+                    missed = dir_listed_at is None or dir_listed_at < recorded_at
+                if missed:
+                    self._apply_delta(scanned[root], size_delta, count_delta)
+                    replayed += 1
+            drift = sum(abs(scanned[path]["size_bytes"] - ledger["usage"][path]["size_bytes"]) for path in scanned)
+            ledger["usage"] = scanned
+            ledger["reconciled_at"] = time.time()
+            ledger["scanned_since"] = start
+            ledger["scan_started"] = None
+            ledger["journal"] = []
+        
+        logger.info(f"📊 存儲用量對賬完成，耗時 {time.time() - start:.1f}s，重放 {replayed} 個增量，校正偏差 {drift} 字節")
+        return scanned
+    
+    def start_usage_reconciler(self, interval: int = STORAGE_RECONCILE_SECONDS):
+        """
+        啟動後台對賬線程
+        
+        每個 worker 都啟動，但賬本在本進程啟動後已對賬過且距今不足 interval 秒，
+        或已有進程在掃描時跳過，所以每個間隔只有一個進程掃描一次
+        """
+        if self._reconciler is not None and self._reconciler.is_alive():
+            return self._reconciler
+        
+        def run():
+            while True:
+                try:
+                    with self._ledger(write=False) as ledger:
+                        reconciled_at = ledger["reconciled_at"]
+                    if (reconciled_at is None or reconciled_at < self._started_at
+                            or time.time() - reconciled_at >= interval):
+                        self.reconcile_usage(wait=False)
+                except Exception as e:
+                    logger.error(f"存儲用量對賬失敗: {str(e)}", exc_info=True)
+                time.sleep(min(interval, 60))
+        
+        self._reconciler = threading.Thread(target=run, name='storage-usage-reconciler', daemon=True)
+        self._reconciler.start()
+        return self._reconciler
+    
+    def get_storage_usage(self, refresh: bool = False) -> Dict:
+        """
+        獲取存儲使用情況（讀取用量賬本，不掃描目錄）
+        
+        Args:
+            refresh: 是否先同步全量對賬
         
         Returns:
             Dict: 存儲使用統計
         """
+        if refresh:
+            self.reconcile_usage()
+        
+        with self._ledger(write=False) as state:
+            ledger = state["usage"]
+            reconciled_at = state["reconciled_at"]
+            reconciling = state["scan_started"] is not None
+        
+        if reconciled_at is None and not reconciling:
+            # 尚未對賬（如後台線程未啟動），在後台補一次，本次返回當前賬本
+            self.start_usage_reconciler()
+        
         usage_stats = {
             "timestamp": datetime.now().isoformat(),
             "paths": {},
             "total_size_bytes": 0,
             "total_size_mb": 0,
-            "total_size_gb": 0
+            "total_size_gb": 0,
+            "reconciled_at": datetime.fromtimestamp(reconciled_at).isoformat() if reconciled_at else None,
+            "reconciling": reconciling
         }
         
         for path in self.critical_paths:
             if os.path.exists(path):
-                try:
-                    total_size = self._calculate_directory_size(path)
-                    file_count = self._count_files_in_directory(path)
-                    
-                    usage_stats["paths"][path] = {
-                        "size_bytes": total_size,
-                        "size_mb": round(total_size / 1024 / 1024, 2),
-                        "size_gb": round(total_size / 1024 / 1024 / 1024, 3),
-                        "file_count": file_count,
-                        "exists": True,
-                        "writable": os.access(path, os.W_OK)
-                    }
-                    
-                    usage_stats["total_size_bytes"] += total_size
-                    
-                except Exception as e:
-                    logger.error(f"計算目錄大小失敗 {path}: {str(e)}")
-                    usage_stats["paths"][path] = {
-                        "error": str(e),
-                        "exists": True,
-                        "writable": False
-                    }
+                total_size = ledger[path]["size_bytes"]
+                usage_stats["paths"][path] = {
+                    "size_bytes": total_size,
+                    "size_mb": round(total_size / 1024 / 1024, 2),
+                    "size_gb": round(total_size / 1024 / 1024 / 1024, 3),
+                    "file_count": ledger[path]["file_count"],
+                    "exists": True,
+                    "writable": os.access(path, os.W_OK)
+                }
+                usage_stats["total_size_bytes"] += total_size
             else:
                 usage_stats["paths"][path] = {
                     "exists": False,
@@ -244,6 +494,7 @@ class StorageManager:
                         if file_age > max_age_seconds:
                             file_size = os.path.getsize(file_path)
                             os.remove(file_path)
+                            self.record_file_removed(file_path, file_size)
                             cleanup_results["cleaned_files"] += 1
                             cleanup_results["freed_bytes"] += file_size
                             logger.debug(f"清理臨時文件: {file_path}")
@@ -272,20 +523,7 @@ class StorageManager:
         Returns:
             int: 目錄大小（字節）
         """
-        total_size = 0
-        try:
-            for dirpath, dirnames, filenames in os.walk(directory):
-                for filename in filenames:
-                    file_path = os.path.join(dirpath, filename)
-                    try:
-                        total_size += os.path.getsize(file_path)
-                    except (OSError, FileNotFoundError):
-                        # 忽略無法訪問的文件
-                        pass
-        except Exception as e:
-            logger.error(f"計算目錄大小時出錯 {directory}: {str(e)}")
-        
-        return total_size
+        return self._scan_directory(directory)[0]
     
     def _count_files_in_directory(self, directory: str) -> int:
         """
@@ -297,14 +535,7 @@ class StorageManager:
         Returns:
             int: 文件數量
         """
-        file_count = 0
-        try:
-            for dirpath, dirnames, filenames in os.walk(directory):
-                file_count += len(filenames)
-        except Exception as e:
-            logger.error(f"計算文件數量時出錯 {directory}: {str(e)}")
-        
-        return file_count
+        return self._scan_directory(directory)[1]
     
     def create_year_month_directories(self, year: int = None, month: int = None) -> Dict:
         """
@@ -0,0 +1,195 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import json
+import uuid
+import hashlib
+import logging
+import threading
+from config import LOCAL_STORAGE_PATH
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPTION_CACHE_ENABLED = os.environ.get('TRANSCRIPTION_CACHE_ENABLED', 'true').lower() == 'true'
+TRANSCRIPTION_CACHE_DIR = os.environ.get('TRANSCRIPTION_CACHE_DIR', os.path.join(LOCAL_STORAGE_PATH, '.transcription_cache'))
+# 'disk' or 'mysql'; MySQL lets several instances share transcriptions
+TRANSCRIPTION_CACHE_BACKEND = os.environ.get('TRANSCRIPTION_CACHE_BACKEND', 'disk').lower()
+TRANSCRIPTION_CACHE_MAX_MB = int(os.environ.get('TRANSCRIPTION_CACHE_MAX_MB', '256'))
+
+_CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS transcription_cache (
+    cache_key CHAR(64) PRIMARY KEY,
+    media_fingerprint CHAR(64) NOT NULL,
+    model_size VARCHAR(50) NOT NULL,
+    language VARCHAR(20) NOT NULL,
+    task VARCHAR(20) NOT NULL,
+    word_timestamps BOOLEAN NOT NULL,
+    result LONGTEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_media_fingerprint (media_fingerprint)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+class TranscriptionCache:
+    """Cache of openai-whisper style transcription results.
+
+    Entries are keyed by the SHA-256 of the full media content plus every
+    parameter that changes the transcript (model size, compute type, language,
+    task, word timestamps, and whether the media was transcribed in chunks), so
+    re-styling captions for the same media never re-runs the model. Compute
+    type and chunking are part of cache_key only, not separate MySQL columns. On disk the file mtime is the LRU clock and entries are evicted
+    beyond max_bytes, as in the download cache.
+    """
+
+    def __init__(self, cache_dir=TRANSCRIPTION_CACHE_DIR, backend=TRANSCRIPTION_CACHE_BACKEND,
+                 max_bytes=TRANSCRIPTION_CACHE_MAX_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.backend = backend
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._table_ready = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(media_hash, model_size, language, task='transcribe', word_timestamps=True,
+                 compute_type=None, chunked=False):
+        parts = [media_hash, model_size, language or 'auto', task, bool(word_timestamps),
+                 compute_type or 'default', bool(chunked)]
+        return hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _get_disk(self, key):
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+            os.utime(path, None)
+            return result
+        except (OSError, ValueError):
+            return None
+
+    def _put_disk(self, key, result):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = os.path.join(self.cache_dir, f"{key}.{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False)
+            os.replace(tmp_path, self._disk_path(key))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict()
+
+    def evict(self):
+        """Drop least recently used disk entries until the cache fits in max_bytes."""
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if entry.name.endswith('.json'):
+                        st = entry.stat()
+                        entries.append((st.st_mtime, st.st_size, entry.path))
+                        total += st.st_size
+        except FileNotFoundError:
+            return
+
+        if total <= self.max_bytes:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def _db(self):
+        from database_manager import get_database_manager
+        db = get_database_manager()
+        if not self._table_ready:
+            db.execute_update(_CREATE_TABLE_SQL)
+            self._table_ready = True
+        return db
+
+    def _get_mysql(self, key):
+        rows = self._db().execute_query("SELECT result FROM transcription_cache WHERE cache_key = %s", (key,))
+        return json.loads(rows[0]['result']) if rows else None
+
+    def _put_mysql(self, key, result, fields):
+        self._db().execute_update(
+            "REPLACE INTO transcription_cache "
+            "(cache_key, media_fingerprint, model_size, language, task, word_timestamps, result) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            (key, *fields, json.dumps(result, ensure_ascii=False))
+        )
+
+    def get(self, media_hash, model_size, language, task='transcribe', word_timestamps=True,
+            compute_type=None, chunked=False):
+        """Cached result for these parameters, or None."""
+        if not TRANSCRIPTION_CACHE_ENABLED:
+            return None
+        key = self.make_key(media_hash, model_size, language, task, word_timestamps, compute_type, chunked)
+        try:
+            result = self._get_mysql(key) if self.backend == 'mysql' else self._get_disk(key)
+        except Exception as e:
+            logger.warning(f"Transcription cache lookup failed: {e}")
+            result = None
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    def put(self, media_hash, model_size, language, result, task='transcribe', word_timestamps=True,
+            compute_type=None, chunked=False):
+        """Store a result; failures are logged, never raised."""
+        if not TRANSCRIPTION_CACHE_ENABLED:
+            return
+        key = self.make_key(media_hash, model_size, language, task, word_timestamps, compute_type, chunked)
+        try:
+            if self.backend == 'mysql':
+                fields = (media_hash, model_size, language or 'auto', task, bool(word_timestamps))
+                self._put_mysql(key, result, fields)
+            else:
+                self._put_disk(key, result)
+        except Exception as e:
+            logger.warning(f"Could not store transcription in cache: {e}")
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'enabled': TRANSCRIPTION_CACHE_ENABLED,
+                'backend': self.backend,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+transcription_cache = TranscriptionCache()
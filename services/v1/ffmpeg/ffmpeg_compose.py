@@ -21,6 +21,7 @@ import subprocess
 import json
 import re
 from services.file_management import download_file
+from services.media_probe import probe
 from config import LOCAL_STORAGE_PATH
 
 def get_extension_from_format(format_name):
@@ -68,16 +69,7 @@ def get_metadata(filename, metadata_requests, job_id):
         metadata['filesize'] = os.path.getsize(filename)
 
     if metadata_requests.get('encoder') or metadata_requests.get('duration') or metadata_requests.get('bitrate'):
-        ffprobe_command = [
-            'ffprobe',
-            '-v', 'quiet',
-            '-print_format', 'json',
-            '-show_format',
-            '-show_streams',
-            filename
-        ]
-        result = subprocess.run(ffprobe_command, capture_output=True, text=True)
-        probe_data = json.loads(result.stdout)
+        probe_data = probe(filename).to_dict()
         
         if metadata_requests.get('duration'):
             metadata['duration'] = float(probe_data['format']['duration'])
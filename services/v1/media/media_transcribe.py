@@ -17,10 +17,11 @@
 
 
 import os
-from faster_whisper import WhisperModel
+from services.whisper_models import get_whisper_model, DEFAULT_MODEL_SIZE
 import srt
 from datetime import timedelta
 from services.file_management import download_file
+from services.audio_extract import extract_transcription_audio
 import logging
 from config import LOCAL_STORAGE_PATH
 
@@ -35,66 +36,72 @@ def process_transcribe_media(media_url, task, include_text, include_srt, include
     logger.info(f"Downloaded media to local file: {input_filename}")
 
     try:
-        # Load faster-whisper small model for better performance
-        model_size = "small"
-        model = WhisperModel(model_size, device="cpu", compute_type="int8")
-        logger.info(f"Loaded faster-whisper {model_size} model")
+        # Reuse the process-wide faster-whisper model (small by default)
+        model_size = DEFAULT_MODEL_SIZE
+        model = get_whisper_model(model_size)
+        logger.info(f"Using faster-whisper {model_size} model")
 
         # Configure transcription/translation options for faster-whisper
         language_param = language if language else None
         
-        # Perform transcription with faster-whisper
-        segments, info = model.transcribe(
-            input_filename,
-            task=task,
-            language=language_param,
-            word_timestamps=word_timestamps
-        )
+        # Feed the model a pre-extracted 16 kHz mono track instead of the container
+        audio_filename = extract_transcription_audio(input_filename)
         
-        # Convert faster-whisper result to openai-whisper format for compatibility
-        result = {
-            "text": "",
-            "segments": [],
-            "language": info.language
-        }
+        try:
+            # Perform transcription with faster-whisper
+            segments, info = model.transcribe(
+                audio_filename,
+                task=task,
+                language=language_param,
+                word_timestamps=word_timestamps
+            )
         
-        segments_list = []
-        full_text = []
-        
-        for i, segment in enumerate(segments):
-            segment_data = {
-                "id": i,
-                "start": segment.start,
-                "end": segment.end,
-                "text": segment.text.strip()
+            # Convert faster-whisper result to openai-whisper format for compatibility
+            result = {
+                "text": "",
+                "segments": [],
+                "language": info.language
             }
+        
+            segments_list = []
+            full_text = []
+        
+            for i, segment in enumerate(segments):
+                segment_data = {
+                    "id": i,
+                    "start": segment.start,
+                    "end": segment.end,
+                    "text": segment.text.strip()
+                }
             
-            # 添加詞級時間戳
-            if word_timestamps and hasattr(segment, 'words') and segment.words:
-                segment_data["words"] = []
-                for word in segment.words:
-                    segment_data["words"].append({
-                        "start": word.start,
-                        "end": word.end,
-                        "word": word.word,
-                        "probability": word.probability
-                    })
+                # 添加詞級時間戳
+                if word_timestamps and hasattr(segment, 'words') and segment.words:
+                    segment_data["words"] = []
+                    for word in segment.words:
+                        segment_data["words"].append({
+                            "start": word.start,
+                            "end": word.end,
+                            "word": word.word,
+                            "probability": word.probability
+                        })
             
-            # Create a simple object for compatibility
-            class SegmentObj:
-                def __init__(self, data):
-                    self.start = data["start"]
-                    self.end = data["end"]
-                    self.text = data["text"]
-                    self.id = data["id"]
-                    if "words" in data:
-                        self.words = data["words"]
+                # Create a simple object for compatibility
+                class SegmentObj:
+                    def __init__(self, data):
+                        self.start = data["start"]
+                        self.end = data["end"]
+                        self.text = data["text"]
+                        self.id = data["id"]
+                        if "words" in data:
+                            self.words = data["words"]
             
-            segments_list.append(SegmentObj(segment_data))
-            result["segments"].append(segment_data)
-            full_text.append(segment.text.strip())
+                segments_list.append(SegmentObj(segment_data))
+                result["segments"].append(segment_data)
+                full_text.append(segment.text.strip())
         
-        result["text"] = " ".join(full_text)
+            result["text"] = " ".join(full_text)
+        finally:
+            os.remove(audio_filename)
         
         # For translation task, the result will be in English
         text = None
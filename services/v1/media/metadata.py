@@ -17,10 +17,9 @@
 
 
 import os
-import subprocess
-import json
 import logging
-from services.file_management import download_file
+from services.media_input import resolve_media_input, ACCESS_SEEK
+from services.media_probe import probe, probe_url
 from config import LOCAL_STORAGE_PATH
 
 # Set up logging
@@ -40,36 +39,24 @@ def get_media_metadata(media_url, job_id=None):
     """
     logger.info(f"Starting metadata extraction for {media_url}")
     
-    # Download the file
-    input_filename = download_file(media_url, os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_metadata_input"))
-    logger.info(f"Downloaded media to local file: {input_filename}")
+    # ffprobe only reads the container headers, so probe the URL in place when the
+    # server supports range requests and reports the size; otherwise download it
+    media_input = resolve_media_input(media_url, os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_metadata_input"),
+                                      ACCESS_SEEK, require_size=True)
     
     try:
         # Initialize metadata dictionary
         metadata = {}
         
         # Get file size
-        metadata['filesize'] = os.path.getsize(input_filename)
+        metadata['filesize'] = media_input.size
         metadata['filesize_mb'] = round(metadata['filesize'] / (1024 * 1024), 2)  # Convert to MB
         
-        # Run ffprobe to get detailed metadata
-        ffprobe_command = [
-            'ffprobe',
-            '-v', 'quiet',
-            '-print_format', 'json',
-            '-show_format',
-            '-show_streams',
-            input_filename
-        ]
-        
-        logger.info(f"Running ffprobe command: {' '.join(ffprobe_command)}")
-        result = subprocess.run(ffprobe_command, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            logger.error(f"Error during ffprobe: {result.stderr}")
-            raise Exception(f"ffprobe error: {result.stderr}")
-            
-        probe_data = json.loads(result.stdout)
+        # Run ffprobe (once per file content for local files) to get detailed metadata
+        if media_input.streamed:
+            probe_data = probe_url(media_input.path, media_input.input_args()).to_dict()
+        else:
+            probe_data = probe(media_input.path).to_dict()
         
         # Get format information
         if 'format' in probe_data:
@@ -157,9 +144,7 @@ def get_media_metadata(media_url, job_id=None):
             metadata['has_audio'] = has_audio
         
         # Clean up the downloaded file
-        if os.path.exists(input_filename):
-            os.remove(input_filename)
-            logger.info(f"Removed temporary file: {input_filename}")
+        media_input.cleanup()
         
         return metadata
         
@@ -167,7 +152,6 @@ def get_media_metadata(media_url, job_id=None):
         logger.error(f"Metadata extraction failed: {str(e)}")
         
         # Clean up temporary file if it exists
-        if 'input_filename' in locals() and os.path.exists(input_filename):
-            os.remove(input_filename)
+        media_input.cleanup()
             
         raise
\ No newline at end of file
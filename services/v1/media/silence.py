@@ -21,7 +21,8 @@ import json
 import subprocess
 import logging
 import re
-from services.file_management import download_file
+from services.media_input import resolve_media_input, ACCESS_SEQUENTIAL
+from services.intervals import IntervalSet
 from config import LOCAL_STORAGE_PATH
 
 # Set up logging
@@ -45,17 +46,13 @@ def detect_silence(media_url, start_time=None, end_time=None, noise_threshold="-
         list: List of dictionaries containing silence intervals with start, end, and duration
     """
     logger.info(f"Starting silence detection for media URL: {media_url}")
-    input_filename = download_file(media_url, os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_input"))
-    logger.info(f"Downloaded media to local file: {input_filename}")
+    # silencedetect reads the audio front to back once, so decode it while it downloads
+    media_input = resolve_media_input(media_url, os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_input"), ACCESS_SEQUENTIAL)
     
     try:
         # For reliable silence detection with time constraints, we need a different approach
         # We'll use FFmpeg without any time constraints and process the results later
-        cmd = ['ffmpeg', '-i', input_filename]
-        
-        # We won't use audio trim filters as they're causing issues with silence detection
-        # Instead, we'll filter the results after the analysis is complete
-        segment_filter = ""
+        # (audio trim filters cause issues with silence detection)
         
         # Save the start and end times for post-processing
         start_seconds = 0
@@ -79,66 +76,21 @@ def detect_silence(media_url, start_time=None, end_time=None, noise_threshold="-
             except ValueError:
                 logger.warning(f"Could not parse end time '{end_time}', using infinity")
             
-        # Add audio processing options
-        cmd.extend(['-af'])
-        
-        # Build the filter string
-        filter_string = ""
-        
-        # First add the segment filter if needed
-        filter_string += segment_filter
-        
-        # Then add mono conversion if needed
-        if mono:
-            filter_string += "pan=mono|c0=0.5*c0+0.5*c1,"
-            
-        # Add the silencedetect filter
-        filter_string += f"silencedetect=noise={noise_threshold}:d={min_duration}"
-        cmd.append(filter_string)
+        # Run silencedetect over the whole file; the time range is applied to the results.
+        # -xerror makes a stream that drops for good fail instead of ending early with exit code 0
+        input_args = media_input.input_args()
+        if media_input.streamed:
+            input_args = ['-xerror'] + input_args
+        intervals = find_silences(media_input.path, noise_threshold, min_duration, mono, input_args)
         
-        # Output to null, we only want the filter output
-        cmd.extend(['-f', 'null', '-'])
-        
-        logger.info(f"Running FFmpeg command: {' '.join(cmd)}")
-        
-        # Run the FFmpeg command and capture stderr for silence detection output
-        result = subprocess.run(cmd, stderr=subprocess.PIPE, text=True)
-        
-        # Parse the silence detection output
         silence_intervals = []
         
-        # Regular expressions to match the silence detection output
-        silence_start_pattern = r'silence_start: (\d+\.?\d*)'
-        silence_end_pattern = r'silence_end: (\d+\.?\d*) \| silence_duration: (\d+\.?\d*)'
-        
-        # Find all silence start times
-        silence_starts = re.findall(silence_start_pattern, result.stderr)
+        # Only include silence periods that overlap with our requested range (end points included)
+        window = IntervalSet([(start_seconds, end_seconds)])
         
-        # Find all silence end times and durations
-        silence_ends_durations = re.findall(silence_end_pattern, result.stderr)
-        
-        # Combine the results into a list of silence intervals
-        for i, (end, duration) in enumerate(silence_ends_durations):
-            # For the first silence period, the start time might not be detected correctly
-            # if the media starts with silence
-            start = silence_starts[i] if i < len(silence_starts) else "0.0"
-            
-            # Convert to float 
-            start_time_float = float(start) 
-            end_time_float = float(end)
-            duration_float = float(duration)
-            
-            # Filter the results based on the specified time range
-            # Only include silence periods that overlap with our requested range
-            
-            # Skip if silence ends before our start time
-            if end_time_float < start_seconds:
-                logger.info(f"Skipping silence at {start_time_float}-{end_time_float} as it ends before requested start time {start_seconds}")
-                continue
-                
-            # Skip if silence starts after our end time
-            if start_time_float > end_seconds:
-                logger.info(f"Skipping silence at {start_time_float}-{end_time_float} as it starts after requested end time {end_seconds}")
+        for start_time_float, end_time_float, duration_float in intervals:
+            if not window.overlaps(start_time_float, end_time_float, inclusive=True):
+                logger.info(f"Skipping silence at {start_time_float}-{end_time_float} as it is outside the requested range {start_seconds}-{end_seconds}")
                 continue
                 
             # Format time as HH:MM:SS.mmm
@@ -152,18 +104,69 @@ def detect_silence(media_url, start_time=None, end_time=None, noise_threshold="-
             })
         
         # Clean up the downloaded file
-        os.remove(input_filename)
-        logger.info(f"Removed local file: {input_filename}")
+        media_input.cleanup()
         
         return silence_intervals
         
     except Exception as e:
         logger.error(f"Silence detection failed: {str(e)}")
         # Make sure to clean up even on error
-        if os.path.exists(input_filename):
-            os.remove(input_filename)
+        media_input.cleanup()
         raise
 
+def find_silences(input_filename, noise_threshold="-30dB", min_duration=0.5, mono=False, input_args=None):
+    """
+    Run FFmpeg's silencedetect filter over a local media file.
+    
+    Args:
+        input_filename (str): Local media file
+        noise_threshold (str, optional): Noise tolerance threshold, default "-30dB"
+        min_duration (float, optional): Minimum silence duration to detect in seconds
+        mono (bool, optional): Whether to convert stereo to mono before analysis
+        input_args (list, optional): Extra ffmpeg options placed before the input
+        
+    Returns:
+        list: (start, end, duration) tuples in seconds, in file order
+        
+    Raises:
+        Exception: If ffmpeg exits with an error
+    """
+    # Video is never decoded, only the audio track is analysed
+    cmd = ['ffmpeg'] + (input_args or []) + ['-i', input_filename, '-vn', '-af']
+    
+    # Build the filter string
+    filter_string = ""
+    if mono:
+        filter_string += "pan=mono|c0=0.5*c0+0.5*c1,"
+    filter_string += f"silencedetect=noise={noise_threshold}:d={min_duration}"
+    cmd.append(filter_string)
+    
+    # Output to null, we only want the filter output
+    cmd.extend(['-f', 'null', '-'])
+    
+    logger.info(f"Running FFmpeg command: {' '.join(cmd)}")
+    
+    # Run the FFmpeg command and capture stderr for silence detection output
+    result = subprocess.run(cmd, stderr=subprocess.PIPE, text=True)
+    
+    # A failed or cut-off read leaves a partial log that would parse as a complete result
+    if result.returncode != 0:
+        logger.error(f"Error during silence detection: {result.stderr}")
+        raise Exception(f"FFmpeg error: {result.stderr}")
+    
+    # Regular expressions to match the silence detection output
+    silence_starts = re.findall(r'silence_start: (-?\d+\.?\d*)', result.stderr)
+    silence_ends_durations = re.findall(r'silence_end: (\d+\.?\d*) \| silence_duration: (\d+\.?\d*)', result.stderr)
+    
+    intervals = []
+    for i, (end, duration) in enumerate(silence_ends_durations):
+        # For the first silence period, the start time might not be detected correctly
+        # if the media starts with silence
+        start = silence_starts[i] if i < len(silence_starts) else "0.0"
+        intervals.append((max(0.0, float(start)), float(end), float(duration)))
+    
+    return intervals
+
 def format_time(seconds):
     """
     Format time in seconds to HH:MM:SS.mmm format
@@ -23,6 +23,10 @@ import logging
 import uuid
 import tempfile
 from services.file_management import download_file
+from services.media_probe import get_duration, probe
+from services.v1.video.segment_extract import (
+    ACCURACY_MODES, probe_for_accuracy, extract_segment_fast, extract_segment_smart, concat_copy
+)
 from services.cloud_storage import upload_file
 from config import LOCAL_STORAGE_PATH
 
@@ -53,8 +57,109 @@ def time_to_seconds(time_str):
     except ValueError:
         raise ValueError(f"Invalid time format: {time_str}. Expected HH:MM:SS[.mmm]")
 
+CUT_ENGINES = ("segments", "filter")
+
+def get_keep_segments(merged_cuts, file_duration):
+    """
+    Convert sorted, merged cuts into the (start, end) ranges that are kept.
+    The last range has end None when it runs to the end of the file.
+    """
+    keep_segments = []
+    last_end = 0
+    for start, end in merged_cuts:
+        if start > last_end:
+            keep_segments.append((last_end, start))
+        last_end = end
+    if last_end < file_duration:
+        keep_segments.append((last_end, None))
+    return keep_segments
+
+def build_filter_cut_command(input_filename, keep_segments, output_filename, has_audio=True,
+                             video_codec='libx264', video_preset='medium', video_crf=23,
+                             audio_codec='aac', audio_bitrate='128k', has_video=True):
+    """
+    Build one ffmpeg command that encodes all kept segments in a single pass.
+    
+    Each segment is opened as its own input with input-side -ss/-t, so only the
+    kept ranges are decoded, and the pieces are joined by a concat filter.
+    Without has_video the graph concatenates the audio only.
+    
+    Returns:
+        list: FFmpeg command
+    """
+    cmd = ['ffmpeg', '-y']
+    for start, end in keep_segments:
+        cmd += ['-ss', str(start)]
+        if end is not None:
+            cmd += ['-t', str(end - start)]
+        cmd += ['-i', input_filename]
+    
+    filters = []
+    concat_inputs = ''
+    for i in range(len(keep_segments)):
+        if has_video:
+            filters.append(f"[{i}:v:0]setpts=PTS-STARTPTS[v{i}]")
+            concat_inputs += f"[v{i}]"
+        if has_audio:
+            filters.append(f"[{i}:a:0]asetpts=PTS-STARTPTS[a{i}]")
+            concat_inputs += f"[a{i}]"
+    
+    video_streams = 1 if has_video else 0
+    audio_streams = 1 if has_audio else 0
+    filters.append(
+        f"{concat_inputs}concat=n={len(keep_segments)}:v={video_streams}:a={audio_streams}"
+        + ("[outv]" if has_video else "") + ("[outa]" if has_audio else "")
+    )
+    
+    cmd += ['-filter_complex', ';'.join(filters)]
+    if has_video:
+        cmd += ['-map', '[outv]']
+    if has_audio:
+        cmd += ['-map', '[outa]', '-c:a', audio_codec, '-b:a', audio_bitrate]
+    if has_video:
+        cmd += [
+            '-c:v', video_codec,
+            '-preset', video_preset,
+            '-crf', str(video_crf),
+            '-pix_fmt', 'yuv420p',
+            '-vsync', 'cfr',
+            '-r', '30',
+        ]
+    cmd += ['-movflags', '+faststart', output_filename]
+    return cmd
+
+def build_smart_join_command(list_filename, input_filename, keep_segments, output_filename,
+                              has_audio=True, audio_codec='aac', audio_bitrate='128k'):
+    """
+    Build the ffmpeg command that joins video-only smart-cut segments and adds the audio.
+    
+    The segments are stream-copied through the concat demuxer. The audio of the
+    kept ranges is encoded once through a concat filter, so the joins have
+    neither gaps nor AAC priming.
+    
+    Returns:
+        list: FFmpeg command
+    """
+    cmd = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', list_filename]
+    if has_audio:
+        for start, end in keep_segments:
+            cmd += ['-ss', str(start)]
+            if end is not None:
+                cmd += ['-t', str(end - start)]
+            cmd += ['-i', input_filename]
+        concat_inputs = ''.join(f"[{i + 1}:a:0]" for i in range(len(keep_segments)))
+        cmd += [
+            '-filter_complex', f"{concat_inputs}concat=n={len(keep_segments)}:v=0:a=1[outa]",
+            '-map', '0:v:0', '-map', '[outa]',
+            '-c:a', audio_codec, '-b:a', audio_bitrate
+        ]
+    else:
+        cmd += ['-map', '0:v:0']
+    cmd += ['-c:v', 'copy', '-movflags', '+faststart', output_filename]
+    return cmd
+
 def cut_media(video_url, cuts, job_id=None, video_codec='libx264', video_preset='medium', 
-           video_crf=23, audio_codec='aac', audio_bitrate='128k'):
+           video_crf=23, audio_codec='aac', audio_bitrate='128k', accuracy='exact', engine='segments'):
     """
     Cuts specified segments from a video file with customizable encoding settings.
     
@@ -67,10 +172,21 @@ def cut_media(video_url, cuts, job_id=None, video_codec='libx264', video_preset=
         video_crf (int, optional): Constant Rate Factor for quality (0-51, default: 23)
         audio_codec (str, optional): Audio codec to use for encoding (default: 'aac')
         audio_bitrate (str, optional): Audio bitrate (default: '128k')
+        accuracy (str, optional): 'exact' re-encodes every kept segment (default),
+            'fast' stream-copies from the nearest preceding keyframes, 'smart' re-encodes
+            only the partial GOPs at segment boundaries and stream-copies the rest
+        engine (str, optional): Encoder pipeline for 'exact' accuracy: 'segments' encodes each
+            kept segment to a temp file and concatenates them (default), 'filter' encodes
+            everything in one ffmpeg pass with a concat filter graph
         
     Returns:
         str: Path to the processed local file
     """
+    if accuracy not in ACCURACY_MODES:
+        raise ValueError(f"Invalid accuracy: {accuracy}. Expected one of {', '.join(ACCURACY_MODES)}")
+    if engine not in CUT_ENGINES:
+        raise ValueError(f"Invalid engine: {engine}. Expected one of {', '.join(CUT_ENGINES)}")
+
     logger.info(f"Starting video cut operation for {video_url}")
     input_filename = download_file(video_url, os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_input"))
     logger.info(f"Downloaded video to local file: {input_filename}")
@@ -85,18 +201,10 @@ def cut_media(video_url, cuts, job_id=None, video_codec='libx264', video_preset=
         output_filename = os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_output{ext}")
         
         # Get the duration of the input file
-        probe_cmd = [
-            'ffprobe', 
-            '-v', 'error', 
-            '-show_entries', 'format=duration', 
-            '-of', 'default=noprint_wrappers=1:nokey=1',
-            input_filename
-        ]
-        duration_result = subprocess.run(probe_cmd, capture_output=True, text=True)
-        try:
-            file_duration = float(duration_result.stdout.strip())
+        file_duration = get_duration(input_filename)
+        if file_duration is not None:
             logger.info(f"File duration: {file_duration} seconds")
-        except (ValueError, IndexError):
+        else:
             logger.warning("Could not determine file duration, using a large value")
             file_duration = 86400  # 24 hours as a fallback
         
@@ -139,6 +247,8 @@ def cut_media(video_url, cuts, job_id=None, video_codec='libx264', video_preset=
         
         logger.info(f"Processing cuts: {merged_cuts}")
         
+        accuracy, probe_result = probe_for_accuracy(input_filename, accuracy)
+        
         if not merged_cuts:
             logger.info("No valid cuts to apply, copying the original file")
             cmd = [
@@ -148,6 +258,73 @@ def cut_media(video_url, cuts, job_id=None, video_codec='libx264', video_preset=
                 output_filename
             ]
             subprocess.run(cmd, check=True, capture_output=True, text=True)
+        elif accuracy in ("fast", "smart"):
+            # Keyframe-aware path: stream-copy the kept segments and concat without re-encoding
+            keep_segments = get_keep_segments(merged_cuts, file_duration)
+            
+            segment_files = []
+            for i, (start, end) in enumerate(keep_segments):
+                # Smart segments stay MPEG-TS so each keeps its in-band parameter sets through the final join
+                segment_ext = '.ts' if accuracy == "smart" else ext
+                segment_file = os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_segment_{i}{segment_ext}")
+                segment_files.append(segment_file)
+                temp_files.append(segment_file)
+                
+                if accuracy == "fast":
+                    extract_segment_fast(input_filename, start, end, segment_file, probe_result.keyframes)
+                else:
+                    temp_files.extend(extract_segment_smart(
+                        input_filename, start, end, segment_file, probe_result,
+                        os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_segment_{i}"),
+                        video_preset=video_preset, video_crf=video_crf, include_audio=False
+                    ))
+            
+            if segment_files and accuracy == "smart":
+                # Per-segment audio would offset each join by its AAC padding, so it is encoded once here
+                concat_file = os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_concat.txt")
+                temp_files.append(concat_file)
+                with open(concat_file, 'w') as f:
+                    for segment in segment_files:
+                        f.write(f"file '{segment}'\n")
+                cmd = build_smart_join_command(
+                    concat_file, input_filename, keep_segments, output_filename,
+                    has_audio=probe_result.has_audio, audio_codec=audio_codec, audio_bitrate=audio_bitrate
+                )
+                logger.info(f"Joining smart-cut segments: {' '.join(cmd)}")
+                process = subprocess.run(cmd, capture_output=True, text=True)
+                
+                if process.returncode != 0:
+                    logger.error(f"Error joining smart-cut segments: {process.stderr}")
+                    raise Exception(f"FFmpeg error: {process.stderr}")
+            elif segment_files:
+                concat_file = os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_concat.txt")
+                temp_files.append(concat_file)
+                concat_copy(segment_files, output_filename, concat_file)
+            else:
+                # No segments to keep
+                with open(output_filename, 'wb') as f:
+                    pass
+        elif engine == "filter":
+            # Single pass: one decode of the kept ranges, one encode, no intermediate files
+            keep_segments = get_keep_segments(merged_cuts, file_duration)
+            
+            if keep_segments:
+                source = probe(input_filename)
+                cmd = build_filter_cut_command(
+                    input_filename, keep_segments, output_filename, has_audio=source.has_audio,
+                    video_codec=video_codec, video_preset=video_preset, video_crf=video_crf,
+                    audio_codec=audio_codec, audio_bitrate=audio_bitrate, has_video=source.has_video
+                )
+                logger.info(f"Cutting in a single pass: {' '.join(cmd)}")
+                process = subprocess.run(cmd, capture_output=True, text=True)
+                
+                if process.returncode != 0:
+                    logger.error(f"Error during single-pass cut: {process.stderr}")
+                    raise Exception(f"FFmpeg error: {process.stderr}")
+            else:
+                # No segments to keep
+                with open(output_filename, 'wb') as f:
+                    pass
         else:
             # Switch to a different approach: extract segments and concatenate
             segment_files = []
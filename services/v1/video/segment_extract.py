@@ -0,0 +1,274 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import bisect
+import logging
+import subprocess
+from services.media_probe import probe
+
+logger = logging.getLogger(__name__)
+
+ACCURACY_MODES = ("fast", "exact", "smart")
+
+# Boundaries closer than this to a keyframe are treated as on the keyframe
+KEYFRAME_EPSILON = 0.001
+
+# Encoders that produce bitstreams compatible with stream-copied source GOPs
+_MATCHING_ENCODERS = {
+    'h264': 'libx264',
+    'hevc': 'libx265',
+}
+
+# ffprobe profile names -> encoder -profile:v values
+_X264_PROFILES = {
+    'constrained baseline': 'baseline',
+    'baseline': 'baseline',
+    'main': 'main',
+    'high': 'high',
+    'high 10': 'high10',
+    'high 4:2:2': 'high422',
+    'high 4:4:4 predictive': 'high444',
+}
+_X265_PROFILES = {
+    'main': 'main',
+    'main 10': 'main10',
+    'main still picture': 'mainstillpicture',
+}
+
+def keyframe_at_or_before(keyframes, t):
+    """Latest keyframe time <= t (0 when there is none)."""
+    index = bisect.bisect_right(keyframes, t + KEYFRAME_EPSILON) - 1
+    return keyframes[index] if index >= 0 else 0.0
+
+def keyframe_at_or_after(keyframes, t):
+    """Earliest keyframe time >= t, or None."""
+    index = bisect.bisect_left(keyframes, t - KEYFRAME_EPSILON)
+    return keyframes[index] if index < len(keyframes) else None
+
+def _run(cmd, description):
+    logger.info(f"{description}: {' '.join(cmd)}")
+    process = subprocess.run(cmd, capture_output=True, text=True)
+    if process.returncode != 0:
+        logger.error(f"Error during {description}: {process.stderr}")
+        raise Exception(f"FFmpeg error: {process.stderr}")
+
+def _timescale_args(probe_result, output_filename):
+    # Keep the source track timescale so copied and re-encoded pieces concat cleanly
+    stream = probe_result.video_stream or {}
+    time_base = stream.get('time_base', '')
+    if output_filename.lower().endswith(('.mp4', '.mov', '.m4v')) and '/' in time_base:
+        return ['-video_track_timescale', time_base.split('/')[1]]
+    return []
+
+def copy_segment(input_filename, start, end, output_filename):
+    """Stream-copy [start, end) with input-side seeking. ffmpeg starts at the keyframe at or before start."""
+    cmd = ['ffmpeg', '-y', '-ss', str(start), '-i', input_filename]
+    if end is not None:
+        cmd += ['-t', str(end - start)]
+    cmd += ['-map', '0', '-c', 'copy', '-avoid_negative_ts', 'make_zero', output_filename]
+    _run(cmd, "stream-copying segment")
+
+def concat_copy(segment_files, output_filename, list_filename):
+    """Concatenate segments without re-encoding via the concat demuxer."""
+    with open(list_filename, 'w') as f:
+        for segment in segment_files:
+            f.write(f"file '{segment}'\n")
+    cmd = [
+        'ffmpeg', '-y',
+        '-f', 'concat',
+        '-safe', '0',
+        '-i', list_filename,
+        '-c', 'copy',
+        '-movflags', '+faststart',
+        output_filename
+    ]
+    _run(cmd, "concatenating segments")
+
+def smart_cut_supported(probe_result):
+    """Smart cutting needs an encoder that matches the source video codec."""
+    return probe_result.video_codec in _MATCHING_ENCODERS
+
+def extract_segment_fast(input_filename, start, end, output_filename, keyframes):
+    """Stream-copy from the keyframe at or before start, so the output never misses requested frames."""
+    kf_start = keyframe_at_or_before(keyframes, start) if keyframes else start
+    copy_segment(input_filename, kf_start, end, output_filename)
+
+def _matching_encode_args(probe_result):
+    """Encoder arguments that reproduce the source's profile, level, pixel format and colour signalling."""
+    stream = probe_result.video_stream or {}
+    codec = probe_result.video_codec
+    args = ['-c:v', _MATCHING_ENCODERS[codec]]
+    profile = str(stream.get('profile', '')).lower()
+    level = stream.get('level')
+    if codec == 'h264':
+        if profile in _X264_PROFILES:
+            args += ['-profile:v', _X264_PROFILES[profile]]
+        if isinstance(level, int) and level > 0:
+            args += ['-level:v', f"{level / 10:.1f}"]
+    else:
+        x265_params = []
+        if profile in _X265_PROFILES:
+            args += ['-profile:v', _X265_PROFILES[profile]]
+        # general_level_idc is 30 times the level number
+        if isinstance(level, int) and level > 0:
+            x265_params.append(f"level-idc={level / 30:.1f}")
+        if x265_params:
+            args += ['-x265-params', ':'.join(x265_params)]
+    if stream.get('pix_fmt'):
+        args += ['-pix_fmt', stream['pix_fmt']]
+    for key, option in (('color_range', '-color_range'), ('color_space', '-colorspace'),
+                        ('color_primaries', '-color_primaries'), ('color_transfer', '-color_trc')):
+        value = stream.get(key)
+        if value and value != 'unknown':
+            args += [option, value]
+    return args
+
+def extract_segment_smart(input_filename, start, end, output_filename, probe_result, temp_prefix,
+                          video_preset='medium', video_crf=23, audio_codec='aac', audio_bitrate='128k',
+                          threads=None, include_audio=True):
+    """Re-encode only the partial GOPs at the segment edges and stream-copy the rest.
+
+    The pieces are video-only MPEG-TS files. The TS muxer writes the codec
+    parameter sets (SPS/PPS, and VPS for HEVC) in-band before every IDR frame,
+    so the re-encoded edges and the copied body each carry their own and can be
+    joined with the concat demuxer even though the encoder's parameter sets
+    differ from the source's. Audio is encoded once over the full range and
+    muxed in the same pass that joins the pieces, so there are no priming gaps
+    at the joins. An output_filename ending in .ts keeps the in-band parameter
+    sets, for callers that join several smart segments again.
+
+    Args:
+        input_filename (str): Local source file
+        start (float): Segment start in seconds
+        end (float or None): Segment end in seconds, None for end of file
+        output_filename (str): Destination file
+        probe_result (ProbeResult): Probe of the source including keyframes
+        temp_prefix (str): Prefix for intermediate piece files
+        threads (int, optional): Encoder threads for the re-encoded pieces
+        include_audio (bool, optional): Mux the source audio; False writes video only
+
+    Returns:
+        list: Intermediate files the caller may delete
+    """
+    keyframes = probe_result.keyframes or []
+    with_audio = include_audio and probe_result.has_audio
+
+    head_end = keyframe_at_or_after(keyframes, start)
+    if head_end is None or (end is not None and head_end >= end):
+        head_end = None
+    tail_start = keyframe_at_or_before(keyframes, end) if end is not None else None
+    if tail_start is not None and (head_end is None or tail_start <= head_end):
+        tail_start = None
+
+    encode_args = _matching_encode_args(probe_result) + ['-preset', video_preset, '-crf', str(video_crf)]
+    if threads:
+        encode_args += ['-threads', str(threads)]
+    audio_args = ['-c:a', audio_codec, '-b:a', audio_bitrate]
+    timescale_args = _timescale_args(probe_result, output_filename)
+
+    def input_args(piece_start, piece_end):
+        args = ['-ss', str(piece_start), '-i', input_filename]
+        if piece_end is not None:
+            args += ['-t', str(piece_end - piece_start)]
+        return args
+
+    if head_end is None:
+        # No keyframe inside the segment: nothing can be copied
+        cmd = ['ffmpeg', '-y'] + input_args(start, end)
+        cmd += ['-map', '0:v:0?'] + (['-map', '0:a:0?'] + audio_args if with_audio else ['-an'])
+        cmd += encode_args + timescale_args
+        cmd += ['-avoid_negative_ts', 'make_zero', output_filename]
+        _run(cmd, "re-encoding segment")
+        return []
+
+    def encode_piece(piece_start, piece_end, piece_file):
+        cmd = ['ffmpeg', '-y'] + input_args(piece_start, piece_end)
+        cmd += ['-map', '0:v:0', '-an'] + encode_args
+        cmd += ['-avoid_negative_ts', 'make_zero', '-f', 'mpegts', piece_file]
+        _run(cmd, "re-encoding boundary piece")
+
+    temp_files = []
+    try:
+        middle_file = f"{temp_prefix}_middle.ts"
+        temp_files.append(middle_file)
+        cmd = ['ffmpeg', '-y'] + input_args(head_end, tail_start)
+        cmd += ['-map', '0:v:0', '-an', '-c:v', 'copy']
+        if tail_start is None:
+            cmd += ['-avoid_negative_ts', 'make_zero', '-f', 'mpegts', middle_file]
+        else:
+            # A copy cut with -t keeps the reordered frames just past the tail keyframe, which the
+            # tail piece encodes again; the segment muxer splits exactly on that keyframe instead
+            overrun_file = f"{temp_prefix}_middle_overrun.ts"
+            temp_files.append(overrun_file)
+            cmd += [
+                '-f', 'segment',
+                '-segment_format', 'mpegts',
+                '-segment_times', str(tail_start - head_end),
+                '-reset_timestamps', '1',
+                f"{temp_prefix}_middle%d.ts"
+            ]
+        _run(cmd, "stream-copying segment body")
+        if tail_start is not None:
+            os.replace(f"{temp_prefix}_middle0.ts", middle_file)
+            if os.path.exists(f"{temp_prefix}_middle1.ts"):
+                os.replace(f"{temp_prefix}_middle1.ts", overrun_file)
+        pieces = [middle_file]
+
+        if head_end - start > KEYFRAME_EPSILON:
+            head_file = f"{temp_prefix}_head.ts"
+            temp_files.append(head_file)
+            encode_piece(start, head_end, head_file)
+            pieces.insert(0, head_file)
+
+        if tail_start is not None and end - tail_start > KEYFRAME_EPSILON:
+            tail_file = f"{temp_prefix}_tail.ts"
+            temp_files.append(tail_file)
+            encode_piece(tail_start, end, tail_file)
+            pieces.append(tail_file)
+
+        # Join the pieces and mux the audio in one pass
+        list_file = f"{temp_prefix}_pieces.txt"
+        temp_files.append(list_file)
+        with open(list_file, 'w') as f:
+            for piece in pieces:
+                f.write(f"file '{piece}'\n")
+        cmd = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', list_file]
+        if with_audio:
+            # The audio input is already bounded by -t, so no -shortest
+            cmd += input_args(start, end) + ['-map', '0:v:0', '-map', '1:a:0', '-c:v', 'copy'] + audio_args
+        else:
+            cmd += ['-map', '0:v:0', '-c:v', 'copy']
+        cmd += timescale_args + [output_filename]
+        _run(cmd, "joining segment pieces")
+        return temp_files
+    except Exception:
+        for temp_file in temp_files:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+        raise
+
+def probe_for_accuracy(input_filename, accuracy):
+    """Probe with keyframes for fast/smart, and downgrade smart to exact for unsupported codecs."""
+    if accuracy not in ("fast", "smart"):
+        return accuracy, None
+    probe_result = probe(input_filename, keyframes=True)
+    if accuracy == "smart" and not smart_cut_supported(probe_result):
+        logger.warning(f"Smart cut not supported for codec {probe_result.video_codec}, using exact mode")
+        return "exact", probe_result
+    return accuracy, probe_result
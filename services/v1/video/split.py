@@ -21,7 +21,13 @@ import json
 import subprocess
 import logging
 import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from services.file_management import download_file
+from services.media_probe import get_duration, probe
+from services.cpu_budget import cpu_budget
+from services.v1.video.segment_extract import (
+    ACCURACY_MODES, probe_for_accuracy, extract_segment_fast, extract_segment_smart
+)
 from services.cloud_storage import upload_file
 from config import LOCAL_STORAGE_PATH
 
@@ -52,8 +58,52 @@ def time_to_seconds(time_str):
     except ValueError:
         raise ValueError(f"Invalid time format: {time_str}. Expected HH:MM:SS[.mmm]")
 
+RENDER_MODES = ("parallel", "single_decode")
+
+def build_single_decode_command(input_filename, segments, output_files, has_audio=True, threads=None,
+                                video_codec='libx264', video_preset='medium', video_crf=23,
+                                audio_codec='aac', audio_bitrate='128k'):
+    """
+    Build one ffmpeg command that decodes the input once and encodes every split as its own output.
+    
+    Args:
+        input_filename (str): Local source file
+        segments (list): (start, end) tuples in seconds
+        output_files (list): Output path for each segment
+        has_audio (bool): Whether the source has an audio stream
+        threads (int, optional): Encoder thread budget for the whole command, divided
+            between the outputs since -threads is a per-output option
+        
+    Returns:
+        list: FFmpeg command
+    """
+    # Seek the input to the earliest split so nothing before it is decoded
+    offset = min(start for start, _ in segments)
+    count = len(segments)
+    
+    filters = ["[0:v:0]split=" + str(count) + "".join(f"[vs{i}]" for i in range(count))]
+    if has_audio:
+        filters.append("[0:a:0]asplit=" + str(count) + "".join(f"[as{i}]" for i in range(count)))
+    for i, (start, end) in enumerate(segments):
+        filters.append(f"[vs{i}]trim=start={start - offset}:end={end - offset},setpts=PTS-STARTPTS[v{i}]")
+        if has_audio:
+            filters.append(f"[as{i}]atrim=start={start - offset}:end={end - offset},asetpts=PTS-STARTPTS[a{i}]")
+    
+    cmd = ['ffmpeg', '-y', '-ss', str(offset), '-i', input_filename, '-filter_complex', ';'.join(filters)]
+    threads_per_output = max(1, threads // count) if threads else None
+    for i, output_filename in enumerate(output_files):
+        cmd += ['-map', f'[v{i}]']
+        if has_audio:
+            cmd += ['-map', f'[a{i}]', '-c:a', audio_codec, '-b:a', audio_bitrate]
+        cmd += ['-c:v', video_codec, '-preset', video_preset, '-crf', str(video_crf)]
+        if threads_per_output:
+            cmd += ['-threads', str(threads_per_output)]
+        cmd += [output_filename]
+    return cmd
+
 def split_video(video_url, splits, job_id=None, video_codec='libx264', video_preset='medium', 
-               video_crf=23, audio_codec='aac', audio_bitrate='128k'):
+               video_crf=23, audio_codec='aac', audio_bitrate='128k', accuracy='exact',
+               render_mode='parallel'):
     """
     Splits a video file into multiple segments with customizable encoding settings.
     
@@ -66,10 +116,20 @@ def split_video(video_url, splits, job_id=None, video_codec='libx264', video_pre
         video_crf (int, optional): Constant Rate Factor for quality (0-51, default: 23)
         audio_codec (str, optional): Audio codec to use for encoding (default: 'aac')
         audio_bitrate (str, optional): Audio bitrate (default: '128k')
+        accuracy (str, optional): 'exact' re-encodes each split (default), 'fast' stream-copies
+            from the nearest preceding keyframe, 'smart' re-encodes only the boundary GOPs
+        render_mode (str, optional): 'parallel' renders splits concurrently within the CPU
+            budget (default), 'single_decode' decodes the input once and writes every split
+            from one ffmpeg process (exact accuracy only)
         
     Returns:
         tuple: (list of output file paths, input file path)
     """
+    if accuracy not in ACCURACY_MODES:
+        raise ValueError(f"Invalid accuracy: {accuracy}. Expected one of {', '.join(ACCURACY_MODES)}")
+    if render_mode not in RENDER_MODES:
+        raise ValueError(f"Invalid render_mode: {render_mode}. Expected one of {', '.join(RENDER_MODES)}")
+
     logger.info(f"Starting video split operation for {video_url}")
     if not job_id:
         job_id = str(uuid.uuid4())
@@ -84,19 +144,10 @@ def split_video(video_url, splits, job_id=None, video_codec='libx264', video_pre
         _, ext = os.path.splitext(input_filename)
         
         # Get the duration of the input file
-        probe_cmd = [
-            'ffprobe', 
-            '-v', 'error', 
-            '-show_entries', 'format=duration', 
-            '-of', 'default=noprint_wrappers=1:nokey=1',
-            input_filename
-        ]
-        duration_result = subprocess.run(probe_cmd, capture_output=True, text=True)
-        
-        try:
-            file_duration = float(duration_result.stdout.strip())
+        file_duration = get_duration(input_filename)
+        if file_duration is not None:
             logger.info(f"File duration: {file_duration} seconds")
-        except (ValueError, IndexError):
+        else:
             logger.warning("Could not determine file duration, using a large value")
             file_duration = 86400  # 24 hours as a fallback
         
@@ -131,38 +182,93 @@ def split_video(video_url, splits, job_id=None, video_codec='libx264', video_pre
             
         logger.info(f"Processing {len(valid_splits)} valid splits")
         
-        # Process each split
-        for index, (split_index, start_seconds, end_seconds, split_data) in enumerate(valid_splits):
-            # Create output filename for this split
-            output_filename = os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_split_{index+1}{ext}")
-            
-            # Create FFmpeg command to extract the segment
-            cmd = [
-                'ffmpeg',
-                '-i', input_filename,
-                '-ss', str(start_seconds),
-                '-to', str(end_seconds),
-                '-c:v', video_codec,
-                '-preset', video_preset,
-                '-crf', str(video_crf),
-                '-c:a', audio_codec,
-                '-b:a', audio_bitrate,
-                '-avoid_negative_ts', 'make_zero',
-                output_filename
-            ]
-            
-            logger.info(f"Running FFmpeg command for split {index+1}: {' '.join(cmd)}")
-            
-            # Run the FFmpeg command
-            process = subprocess.run(cmd, capture_output=True, text=True)
+        accuracy, probe_result = probe_for_accuracy(input_filename, accuracy)
+        
+        # Output file names are fixed up front so splits can render in any order
+        output_files = [
+            os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_split_{index+1}{ext}")
+            for index in range(len(valid_splits))
+        ]
+        segments = [(start_seconds, end_seconds) for _, start_seconds, end_seconds, _ in valid_splits]
+        
+        if accuracy == "exact" and render_mode == "single_decode":
+            has_audio = probe(input_filename).has_audio
+            with cpu_budget.reserve(cpu_budget.job_share()) as threads:
+                cmd = build_single_decode_command(
+                    input_filename, segments, output_files, has_audio=has_audio, threads=threads,
+                    video_codec=video_codec, video_preset=video_preset, video_crf=video_crf,
+                    audio_codec=audio_codec, audio_bitrate=audio_bitrate
+                )
+                logger.info(f"Running single-decode FFmpeg command for {len(segments)} splits: {' '.join(cmd)}")
+                process = subprocess.run(cmd, capture_output=True, text=True)
             
             if process.returncode != 0:
-                logger.error(f"Error processing split {index+1}: {process.stderr}")
-                raise Exception(f"FFmpeg error for split {index+1}: {process.stderr}")
+                logger.error(f"Error processing splits: {process.stderr}")
+                raise Exception(f"FFmpeg error for splits: {process.stderr}")
+            logger.info(f"Successfully created {len(output_files)} splits in a single decode")
+        else:
+            workers, threads_per_job = cpu_budget.plan(len(segments))
+            logger.info(f"Rendering {len(segments)} splits with {workers} workers, {threads_per_job} threads each")
+            
+            def render_split(index, start_seconds, end_seconds):
+                output_filename = output_files[index]
+                
+                if accuracy == "fast":
+                    # Stream copy is I/O bound, it only needs one thread of the budget
+                    with cpu_budget.reserve(1):
+                        extract_segment_fast(input_filename, start_seconds, end_seconds, output_filename, probe_result.keyframes)
+                elif accuracy == "smart":
+                    with cpu_budget.reserve(threads_per_job) as threads:
+                        temp_files = extract_segment_smart(
+                            input_filename, start_seconds, end_seconds, output_filename, probe_result,
+                            os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_split_{index+1}"),
+                            video_preset=video_preset, video_crf=video_crf,
+                            audio_codec=audio_codec, audio_bitrate=audio_bitrate, threads=threads
+                        )
+                    for temp_file in temp_files:
+                        if os.path.exists(temp_file):
+                            os.remove(temp_file)
+                else:
+                    with cpu_budget.reserve(threads_per_job) as threads:
+                        # Create FFmpeg command to extract the segment (input-side seeking)
+                        cmd = [
+                            'ffmpeg', '-y',
+                            '-ss', str(start_seconds),
+                            '-i', input_filename,
+                            '-t', str(end_seconds - start_seconds),
+                            '-c:v', video_codec,
+                            '-preset', video_preset,
+                            '-crf', str(video_crf),
+                            '-c:a', audio_codec,
+                            '-b:a', audio_bitrate,
+                            '-threads', str(threads),
+                            '-avoid_negative_ts', 'make_zero',
+                            output_filename
+                        ]
+                        
+                        logger.info(f"Running FFmpeg command for split {index+1}: {' '.join(cmd)}")
+                        
+                        # Run the FFmpeg command
+                        process = subprocess.run(cmd, capture_output=True, text=True)
+                    
+                    if process.returncode != 0:
+                        logger.error(f"Error processing split {index+1}: {process.stderr}")
+                        raise Exception(f"FFmpeg error for split {index+1}: {process.stderr}")
+                
+                logger.info(f"Successfully created split {index+1}: {output_filename}")
             
-            # Add the output file to the list
-            output_files.append(output_filename)
-            logger.info(f"Successfully created split {index+1}: {output_filename}")
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(render_split, index, start_seconds, end_seconds)
+                    for index, (start_seconds, end_seconds) in enumerate(segments)
+                ]
+                try:
+                    for future in as_completed(futures):
+                        future.result()
+                except Exception:
+                    # The job has failed, don't start the splits still queued
+                    executor.shutdown(cancel_futures=True)
+                    raise
         
         # Return the list of output files and the input filename
         return output_files, input_filename
@@ -18,7 +18,7 @@
 
 import os
 import ffmpeg
-from services.file_management import download_file
+from services.media_input import resolve_media_input, ACCESS_SEEK
 from config import LOCAL_STORAGE_PATH
 
 def extract_thumbnail(video_url, job_id, second=0):
@@ -33,8 +33,9 @@ def extract_thumbnail(video_url, job_id, second=0):
     Returns:
         str: Path to the extracted thumbnail image
     """
-    # Download the video from the provided URL
-    video_path = download_file(video_url, os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_input"))
+    # Read the video straight from the URL when the server supports range requests,
+    # so only the bytes around the timestamp are fetched; otherwise download it
+    media_input = resolve_media_input(video_url, os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_input"), ACCESS_SEEK)
     
     # Set output path for the thumbnail
     thumbnail_path = os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_thumbnail.jpg")
@@ -43,14 +44,14 @@ def extract_thumbnail(video_url, job_id, second=0):
         # Extract thumbnail using ffmpeg at the specified timestamp
         (
             ffmpeg
-            .input(video_path, ss=second)  # 'ss' is the seek parameter for the timestamp
+            .input(media_input.path, ss=second, **media_input.input_kwargs())  # 'ss' is the seek parameter for the timestamp
             .output(thumbnail_path, vframes=1)  # vframes=1 extracts a single frame
             .overwrite_output()
             .run(capture_stdout=True, capture_stderr=True)
         )
         
         # Clean up the downloaded video file
-        os.remove(video_path)
+        media_input.cleanup()
         
         # Ensure the thumbnail file exists
         if not os.path.exists(thumbnail_path):
@@ -61,6 +62,5 @@ def extract_thumbnail(video_url, job_id, second=0):
     except Exception as e:
         print(f"Thumbnail extraction failed: {str(e)}")
         # Clean up any downloaded files on error
-        if os.path.exists(video_path):
-            os.remove(video_path)
+        media_input.cleanup()
         raise
@@ -21,7 +21,8 @@ import json
 import subprocess
 import logging
 import uuid
-from services.file_management import download_file
+from services.media_input import resolve_media_input, ACCESS_SEEK
+from services.media_probe import get_duration, probe_url
 from services.cloud_storage import upload_file
 from config import LOCAL_STORAGE_PATH
 
@@ -78,30 +79,30 @@ def trim_video(video_url, start=None, end=None, job_id=None, video_codec='libx26
     if not job_id:
         job_id = str(uuid.uuid4())
         
-    input_filename = download_file(video_url, os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_input"))
-    logger.info(f"Downloaded video to local file: {input_filename}")
+    # With range support the source is read in place from the trim start onwards
+    media_input = resolve_media_input(video_url, os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_input"), ACCESS_SEEK)
+    input_filename = media_input.path
     
     try:
-        # Get the file extension
-        _, ext = os.path.splitext(input_filename)
+        # Get the file extension; ffmpeg needs one to pick the output format
+        ext = media_input.extension or '.mp4'
         
         # Create output filename
         output_filename = os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_output{ext}")
         
         # Get the duration of the input file
-        probe_cmd = [
-            'ffprobe', 
-            '-v', 'error', 
-            '-show_entries', 'format=duration', 
-            '-of', 'default=noprint_wrappers=1:nokey=1',
-            input_filename
-        ]
-        duration_result = subprocess.run(probe_cmd, capture_output=True, text=True)
-        
-        try:
-            file_duration = float(duration_result.stdout.strip())
+        if media_input.streamed:
+            try:
+                file_duration = probe_url(input_filename, media_input.input_args()).duration
+            except Exception as e:
+                logger.warning(f"Could not probe {input_filename}: {e}")
+                file_duration = None
+        else:
+            file_duration = get_duration(input_filename)
+        
+        if file_duration is not None:
             logger.info(f"File duration: {file_duration} seconds")
-        except (ValueError, IndexError):
+        else:
             logger.warning("Could not determine file duration, using a large value")
             file_duration = 86400  # 24 hours as a fallback
         
@@ -122,7 +123,8 @@ def trim_video(video_url, start=None, end=None, job_id=None, video_codec='libx26
             raise ValueError(f"Invalid trim: start time ({start}) must be before end time ({end})")
         
         # Prepare FFmpeg command based on trim parameters
-        cmd = ['ffmpeg', '-i', input_filename]
+        cmd = ['ffmpeg'] + media_input.input_args()
+        duration_args = []
         
         filter_applied = False
         
@@ -130,15 +132,19 @@ def trim_video(video_url, start=None, end=None, job_id=None, video_codec='libx26
             # We need to trim the video
             logger.info(f"Trimming video from {start_seconds}s to {end_seconds}s")
             
+            # Input-side seek: ffmpeg skips straight to the start instead of decoding
+            # everything before it (still frame accurate since the video is re-encoded)
             if start_seconds > 0:
                 cmd.extend(['-ss', str(start_seconds)])
                 
             if end_seconds < file_duration:
                 duration = end_seconds - (start_seconds or 0)
-                cmd.extend(['-t', str(duration)])
+                duration_args = ['-t', str(duration)]
                 
             filter_applied = True
         
+        cmd.extend(['-i', input_filename] + duration_args)
+        
         # Add encoding parameters
         cmd.extend([
             '-c:v', video_codec,
@@ -162,15 +168,15 @@ def trim_video(video_url, start=None, end=None, job_id=None, video_codec='libx26
             logger.error(f"Error during trim: {process.stderr}")
             raise Exception(f"FFmpeg error: {process.stderr}")
         
-        # Return the path to the output file (route will handle upload)
-        return output_filename, input_filename
+        # Return the path to the output file (route will handle upload);
+        # the input is None when it was streamed rather than downloaded
+        return output_filename, media_input.local_path
         
     except Exception as e:
         logger.error(f"Video trim operation failed: {str(e)}")
         
         # Clean up all temporary files if they exist
-        if 'input_filename' in locals() and os.path.exists(input_filename):
-            os.remove(input_filename)
+        media_input.cleanup()
                 
         if 'output_filename' in locals() and os.path.exists(output_filename):
             os.remove(output_filename)
@@ -0,0 +1,185 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_SIZE = os.environ.get('WHISPER_MODEL_SIZE', 'small')
+DEFAULT_COMPUTE_TYPE = os.environ.get('WHISPER_COMPUTE_TYPE', 'int8')
+DEFAULT_DEVICE = os.environ.get('WHISPER_DEVICE', 'cpu')
+
+# Concurrent transcribe() calls a shared model serves in parallel (CTranslate2
+# workers); calls beyond this queue inside the model. CPU threads are split
+# across the workers unless WHISPER_CPU_THREADS is set.
+DEFAULT_NUM_WORKERS = max(1, int(os.environ.get('WHISPER_NUM_WORKERS', '2')))
+DEFAULT_CPU_THREADS = int(os.environ.get('WHISPER_CPU_THREADS', '0')) or max(1, (os.cpu_count() or 1) // DEFAULT_NUM_WORKERS)
+
+# Memory budget for all resident models; the least recently used model is
+# dropped once a newly loaded model would push the total over the budget.
+MEMORY_BUDGET_MB = int(os.environ.get('WHISPER_MODEL_MEMORY_BUDGET_MB', '2048'))
+
+# Approximate resident size (MB) of each model at float32; quantized compute
+# types scale this down.
+_MODEL_SIZE_MB = {
+    'tiny': 150,
+    'base': 290,
+    'small': 970,
+    'medium': 3050,
+    'large-v1': 6200,
+    'large-v2': 6200,
+    'large-v3': 6200,
+    'large': 6200,
+}
+_COMPUTE_TYPE_FACTOR = {
+    'int8': 0.3,
+    'int8_float16': 0.35,
+    'int8_float32': 0.35,
+    'float16': 0.55,
+    'float32': 1.0,
+}
+
+def estimate_model_memory_mb(model_size, compute_type):
+    """Rough memory estimate used for LRU budgeting."""
+    base = _MODEL_SIZE_MB.get(model_size.split('.')[0], _MODEL_SIZE_MB['small'])
+    return int(base * _COMPUTE_TYPE_FACTOR.get(compute_type, 1.0))
+
+class WhisperModelRegistry:
+    """Process-wide cache of faster-whisper models keyed by (model size, compute type, device)."""
+
+    def __init__(self, memory_budget_mb=MEMORY_BUDGET_MB):
+        self.memory_budget_mb = memory_budget_mb
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _load_lock(self, key):
+        with self._lock:
+            return self._load_locks.setdefault(key, threading.Lock())
+
+    def _resident_mb(self):
+        return sum(entry['memory_mb'] for entry in self._models.values())
+
+    def _evict_for(self, memory_mb):
+        # Caller holds self._lock. Models still referenced by running
+        # transcriptions stay alive until those callers release them.
+        while self._models and self._resident_mb() + memory_mb > self.memory_budget_mb:
+            key, _ = self._models.popitem(last=False)
+            logger.info(f"Evicted whisper model {key} from cache (memory budget {self.memory_budget_mb} MB)")
+
+    def get_model(self, model_size=None, compute_type=None, device=None, **model_kwargs):
+        """Return a cached WhisperModel, loading it on first use.
+
+        Args:
+            model_size (str): Model name, e.g. 'small'
+            compute_type (str): CTranslate2 compute type, e.g. 'int8'
+            device (str): 'cpu' or 'cuda'
+            **model_kwargs: Extra WhisperModel constructor arguments (only used on load)
+
+        Returns:
+            WhisperModel: A shared, thread-safe model instance
+        """
+        key = (
+            model_size or DEFAULT_MODEL_SIZE,
+            compute_type or DEFAULT_COMPUTE_TYPE,
+            device or DEFAULT_DEVICE,
+        )
+
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return entry['model']
+
+        # Load outside the registry lock so other models stay available; the
+        # per-key lock makes concurrent first requests share one load.
+        with self._load_lock(key):
+            with self._lock:
+                entry = self._models.get(key)
+                if entry is not None:
+                    self._models.move_to_end(key)
+                    self.hits += 1
+                    return entry['model']
+                self.misses += 1
+
+            from faster_whisper import WhisperModel
+
+            size, compute, dev = key
+            if os.environ.get('WHISPER_CACHE_DIR'):
+                model_kwargs.setdefault('download_root', os.environ['WHISPER_CACHE_DIR'])
+            model_kwargs.setdefault('num_workers', DEFAULT_NUM_WORKERS)
+            if dev == 'cpu':
+                model_kwargs.setdefault('cpu_threads', DEFAULT_CPU_THREADS)
+            logger.info(f"Loading faster-whisper model {size} ({compute}, {dev})")
+            model = WhisperModel(size, device=dev, compute_type=compute, **model_kwargs)
+
+            memory_mb = estimate_model_memory_mb(size, compute)
+            with self._lock:
+                self._evict_for(memory_mb)
+                self._models[key] = {'model': model, 'memory_mb': memory_mb}
+            logger.info(f"Loaded faster-whisper model {size} ({compute}, {dev}), ~{memory_mb} MB")
+            return model
+
+    def preload(self, model_size=None, compute_type=None, device=None):
+        """Load a model ahead of the first request; failures are logged, not raised."""
+        try:
+            self.get_model(model_size, compute_type, device)
+            return True
+        except Exception as e:
+            logger.warning(f"Whisper model preload failed: {e}")
+            return False
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'models': [
+                    {'model_size': k[0], 'compute_type': k[1], 'device': k[2], 'memory_mb': v['memory_mb']}
+                    for k, v in self._models.items()
+                ],
+                'resident_mb': self._resident_mb(),
+                'memory_budget_mb': self.memory_budget_mb,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+_registry = WhisperModelRegistry()
+
+def get_whisper_model(model_size=None, compute_type=None, device=None, **model_kwargs):
+    """Shortcut for the process-wide registry's get_model()."""
+    return _registry.get_model(model_size, compute_type, device, **model_kwargs)
+
+def get_model_registry():
+    return _registry
+
+def preload_whisper_model_async():
+    """Preload the default model in a background thread when WHISPER_PRELOAD is enabled."""
+    if os.environ.get('WHISPER_PRELOAD', 'false').lower() != 'true':
+        return None
+    thread = threading.Thread(target=_registry.preload, name='whisper-preload', daemon=True)
+    thread.start()
+    return thread
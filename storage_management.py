@@ -17,6 +17,7 @@ from werkzeug.utils import secure_filename
 from werkzeug.datastructures import FileStorage
 from flask import Flask, request, jsonify, send_file, abort, Blueprint
 import logging
+from services.storage_manager import storage_manager as storage_usage
 
 # 配置日誌
 logging.basicConfig(level=logging.INFO)
@@ -122,6 +123,7 @@ class StorageManager:
             
             # 保存文件
             file.save(file_path)
+            storage_usage.record_file_added(file_path, file_size)
             
             # 計算文件哈希
             file_hash = self._calculate_file_hash(file_path)
@@ -212,7 +214,9 @@ class StorageManager:
             # 刪除物理文件
             file_path = file_info['file_path']
             if os.path.exists(file_path):
+                file_size = os.path.getsize(file_path)
                 os.remove(file_path)
+                storage_usage.record_file_removed(file_path, file_size)
                 
             # 從數據庫刪除記錄
             delete_query = "DELETE FROM files WHERE id = %s"
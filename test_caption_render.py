@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試分段字幕渲染的切塊規劃與 ASS 切片
+用法: python -m pytest -q test_caption_render.py
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import subprocess
+
+import pytest
+
+from services.caption_render import plan_chunks, slice_ass
+
+ASS_HEADER = """[Script Info]
+ScriptType: v4.00+
+PlayResX: 1920
+PlayResY: 1080
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,Arial,48,&H00FFFFFF,&H00FFFFFF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,2,0,2,10,10,40,0
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+def ass_time(seconds):
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{int(hours)}:{int(minutes):02d}:{secs:05.2f}"
+
+def dialogue(start, end, text):
+    return f"Dialogue: 0,{ass_time(start)},{ass_time(end)},Default,,0,0,0,,{text}\n"
+
+def write_slices(events, chunks, extra_lines=''):
+    """寫出 ASS 文件並切片，返回每個切片的 (非 Dialogue 行, Dialogue 文本列表)"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        ass_path = os.path.join(temp_dir, 'captions.ass')
+        with open(ass_path, 'w', encoding='utf-8') as f:
+            f.write(ASS_HEADER + extra_lines)
+            for start, end, text in events:
+                f.write(dialogue(start, end, text))
+        slices = []
+        for path in slice_ass(ass_path, chunks, os.path.join(temp_dir, 'slice')):
+            with open(path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+            header = [line for line in lines if not line.startswith('Dialogue:')]
+            texts = [line.rsplit(',', 1)[1].strip() for line in lines if line.startswith('Dialogue:')]
+            slices.append((header, texts))
+        return slices
+
+def test_chunks_start_on_keyframes():
+    """每塊從關鍵幀開始，起點嚴格遞增，最後一塊到文件末尾"""
+    keyframes = [i * 2.0 for i in range(60)]
+    chunks = plan_chunks(120.0, keyframes, 4, min_chunk_seconds=20)
+    assert chunks == [(0.0, 30.0), (30.0, 60.0), (60.0, 90.0), (90.0, None)]
+
+def test_sparse_keyframes_collapse_onto_one_boundary():
+    """稀疏關鍵幀讓多個目標落在同一關鍵幀時只保留一個邊界，末尾附近的關鍵幀不單獨成塊"""
+    chunks = plan_chunks(100.0, [0.0, 50.0, 99.9995], 4, min_chunk_seconds=20)
+    assert chunks == [(0.0, 50.0), (50.0, None)]
+
+def test_chunk_count_bounded_by_min_length():
+    """塊數不超過 duration / min_chunk_seconds，太短的視頻只有一塊"""
+    keyframes = [float(i) for i in range(100)]
+    assert len(plan_chunks(100.0, keyframes, 16, min_chunk_seconds=20)) == 5
+    assert plan_chunks(15.0, keyframes[:15], 8, min_chunk_seconds=20) == [(0.0, None)]
+
+def test_plan_chunks_random():
+    """隨機關鍵幀: 邊界都是關鍵幀、遞增且不重複"""
+    rng = random.Random(7)
+    for _ in range(200):
+        duration = rng.uniform(10, 600)
+        keyframes = sorted({0.0} | {round(rng.uniform(0, duration), 3) for _ in range(rng.randint(0, 40))})
+        chunks = plan_chunks(duration, keyframes, rng.randint(1, 16), min_chunk_seconds=5)
+        starts = [start for start, _ in chunks]
+        assert starts[0] == 0.0 and chunks[-1][1] is None
+        assert all(start in keyframes for start in starts)
+        assert all(a < b for a, b in zip(starts, starts[1:]))
+        assert all(end == next_start for (_, end), next_start in zip(chunks, starts[1:]))
+
+def test_slice_keeps_header_and_boundary_events():
+    """跨越邊界的事件進入它覆蓋的每一塊；在邊界處結束或開始的事件只屬於一側"""
+    chunks = [(0.0, 10.0), (10.0, 20.0), (20.0, None)]
+    events = [
+        (1.0, 2.0, 'first'),
+        (9.0, 11.0, 'straddle'),
+        (8.0, 10.0, 'ends_on_boundary'),
+        (10.0, 12.0, 'starts_on_boundary'),
+        (5.0, 25.0, 'spans_all'),
+        (30.0, 31.0, 'last'),
+    ]
+    slices = write_slices(events, chunks, extra_lines='Comment: 0,0:00:00.00,0:00:01.00,Default,,0,0,0,,note\n')
+    assert [texts for _, texts in slices] == [
+        ['first', 'straddle', 'ends_on_boundary', 'spans_all'],
+        ['straddle', 'starts_on_boundary', 'spans_all'],
+        ['spans_all', 'last'],
+    ]
+    # 非 Dialogue 行（腳本信息、樣式、註釋）每個切片都保留
+    assert all(header == slices[0][0] for header, _ in slices)
+    assert any(line.startswith('Comment:') for line in slices[0][0])
+
+def test_slice_skips_malformed_dialogue():
+    chunks = [(0.0, 10.0), (10.0, None)]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        ass_path = os.path.join(temp_dir, 'captions.ass')
+        with open(ass_path, 'w', encoding='utf-8') as f:
+            f.write(ASS_HEADER + "Dialogue: broken\n" + dialogue(1, 2, 'ok'))
+        paths = slice_ass(ass_path, chunks, os.path.join(temp_dir, 'slice'))
+        with open(paths[0], 'r', encoding='utf-8') as f:
+            content = f.read()
+    assert 'broken' not in content and 'ok' in content
+
+def test_slice_random():
+    """隨機事件: 事件出現在起點所在塊以及它延伸進入的每一塊，且只出現在這些塊"""
+    rng = random.Random(11)
+    for _ in range(50):
+        boundaries = sorted({0.0} | {float(rng.randint(1, 99)) for _ in range(rng.randint(0, 6))})
+        chunks = list(zip(boundaries, boundaries[1:] + [None]))
+        events = []
+        for i in range(40):
+            start = rng.randint(0, 11000) / 100
+            events.append((start, start + rng.randint(0, 2000) / 100, f'e{i}'))
+        slices = write_slices(events, chunks)
+        for index, (chunk_start, chunk_end) in enumerate(chunks):
+            expected = [
+                text for start, end, text in events
+                if (chunk_start <= start and (chunk_end is None or start < chunk_end))
+                or (start < chunk_start < end)
+            ]
+            assert slices[index][1] == expected, (chunks, index)
+
+@pytest.mark.skipif(not (shutil.which('ffmpeg') and shutil.which('ffprobe')), reason="需要 ffmpeg 和 ffprobe")
+def test_segmented_render_decodes_cleanly(monkeypatch):
+    """分三塊渲染 60 秒片段: 輸出無解碼錯誤，時長與源一致且保留音頻"""
+    from services import caption_render
+    from services.media_probe import MediaProber
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source = os.path.join(temp_dir, 'source.mp4')
+        subprocess.run([
+            'ffmpeg', '-y', '-v', 'error',
+            '-f', 'lavfi', '-i', 'testsrc2=size=320x240:rate=25',
+            '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=48000',
+            '-t', '60', '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '50', '-c:a', 'aac', source
+        ], check=True, capture_output=True)
+        ass_path = os.path.join(temp_dir, 'captions.ass')
+        with open(ass_path, 'w', encoding='utf-8') as f:
+            f.write(ASS_HEADER)
+            for second in range(0, 60, 3):
+                f.write(dialogue(second, second + 4, f'line {second}'))
+
+        prober = MediaProber(cache_dir=os.path.join(temp_dir, 'probe'))
+        monkeypatch.setattr(caption_render, 'probe', prober.probe)
+        output = os.path.join(temp_dir, 'output.mp4')
+        assert caption_render.render_captions_segmented(source, ass_path, output, chunk_count=3) == 3
+
+        process = subprocess.run(['ffmpeg', '-v', 'error', '-xerror', '-i', output, '-f', 'null', '-'],
+                                 capture_output=True, text=True)
+        assert process.returncode == 0 and not process.stderr.strip(), process.stderr
+        result = prober.probe(output)
+        assert result.has_audio
+        assert abs(result.duration - 60) < 0.2
+        assert sorted(os.listdir(temp_dir)) == ['captions.ass', 'output.mp4', 'probe', 'source.mp4']
+
+if __name__ == '__main__':
+    raise SystemExit(pytest.main(['-q', __file__]))
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試 /v1/video/caption 的階段上報: 設置在下載前驗證、提供字幕時不上報轉錄、失敗時上報實際失敗的階段
+用法: python -m pytest -q test_caption_video_stages.py
+"""
+
+import pytest
+from flask import Flask
+
+import routes.v1.video.caption_video as caption_video
+from app_utils import timed_stage
+from services.authentication import API_KEY
+
+@pytest.fixture
+def route(monkeypatch, tmp_path):
+    reported = []
+    downloads = []
+
+    def fake_download(url, directory):
+        downloads.append(url)
+        path = tmp_path / 'input.mp4'
+        path.write_bytes(b'video')
+        return str(path)
+
+    monkeypatch.setattr(caption_video, 'log_job_status',
+                        lambda job_id, status: reported.append((status['stage'], status['job_status'])))
+    monkeypatch.setattr(caption_video, 'download_file', fake_download)
+
+    app = Flask(__name__)
+    app.register_blueprint(caption_video.v1_video_caption_bp)
+    client = app.test_client()
+
+    def post(payload):
+        payload = dict({"video_url": "https://example.com/video.mp4"}, **payload)
+        return client.post('/v1/video/caption', json=payload, headers={'X-API-Key': API_KEY})
+
+    return post, reported, downloads
+
+def fail_in(stage):
+    """模擬 generate_ass_captions_v1 在某個階段中失敗"""
+    def generate(*args, stage_timings=None, **kwargs):
+        for done in ('probe', 'transcribe', 'ass_build'):
+            with timed_stage(stage_timings, done):
+                pass
+            if done == stage:
+                return {"error": f"{stage} failed"}
+    return generate
+
+def test_unknown_font_is_rejected_before_download(route):
+    post, reported, downloads = route
+    response = post({"settings": {"font_family": "No Such Font"}})
+    assert response.status_code == 400
+    assert 'available_fonts' in response.get_json()
+    assert downloads == []
+    assert reported == [("validate", "failed")]
+
+def test_supplied_captions_skip_the_transcribe_stage(route, monkeypatch):
+    post, reported, downloads = route
+    monkeypatch.setattr(caption_video, 'generate_ass_captions_v1', lambda *args, **kwargs: {"error": "bad SRT"})
+    response = post({"captions": "1\n00:00:00,000 --> 00:00:01,000\nhello\n"})
+    assert response.status_code == 400
+    assert ("transcribe", "running") not in reported
+    assert reported[-2:] == [("ass_build", "running"), ("ass_build", "failed")]
+
+@pytest.mark.parametrize("stage", ["probe", "transcribe", "ass_build"])
+def test_failed_stage_is_reported(route, monkeypatch, stage):
+    post, reported, downloads = route
+    monkeypatch.setattr(caption_video, 'generate_ass_captions_v1', fail_in(stage))
+    response = post({})
+    assert response.status_code == 400
+    assert reported[-1] == (stage, "failed")
+
+if __name__ == '__main__':
+    raise SystemExit(pytest.main(['-q', __file__]))
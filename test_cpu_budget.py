@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試 CpuBudget 的分配規劃、預留上限，以及 single_decode 拆分的逐輸出線程數
+用法: python -m pytest -q test_cpu_budget.py
+"""
+
+import time
+import threading
+
+from services.cpu_budget import CpuBudget, MIN_THREADS_PER_JOB
+
+def test_plan_stays_within_budget():
+    """workers * threads 不超過總預算，workers 不超過任務數"""
+    for total in range(1, 33):
+        budget = CpuBudget(total)
+        for task_count in range(1, 40):
+            workers, threads = budget.plan(task_count)
+            assert 1 <= workers <= task_count
+            assert threads >= 1
+            assert workers * threads <= max(total, 1)
+            if total >= MIN_THREADS_PER_JOB:
+                assert threads >= MIN_THREADS_PER_JOB
+
+def test_plan_respects_max_workers():
+    workers, threads = CpuBudget(16).plan(10, max_workers=2)
+    assert workers == 2 and threads == 8
+
+def test_job_share_leaves_room_for_another_job():
+    """單個進程最多預留一半預算（至少 MIN_THREADS_PER_JOB，且不超過總數）"""
+    assert CpuBudget(1).job_share() == 1
+    assert CpuBudget(2).job_share() == 2
+    assert CpuBudget(8).job_share() == 4
+    assert CpuBudget(16).job_share() == 8
+    for total in range(4, 65):
+        assert CpuBudget(total).job_share() <= total // 2
+
+def test_reserve_clamps_and_releases():
+    budget = CpuBudget(4)
+    with budget.reserve(100) as threads:
+        assert threads == 4
+        assert budget.get_stats()['available'] == 0
+    with budget.reserve(0) as threads:
+        assert threads == 1
+    assert budget.get_stats()['available'] == 4
+
+def test_reserve_releases_on_error():
+    budget = CpuBudget(4)
+    try:
+        with budget.reserve(3):
+            raise RuntimeError('ffmpeg failed')
+    except RuntimeError:
+        pass
+    assert budget.get_stats()['available'] == 4
+
+def test_reserve_blocks_until_threads_are_free():
+    """並發預留時同時持有的線程數不超過總預算，等待者在釋放後繼續"""
+    budget = CpuBudget(6)
+    held = []
+    peak = []
+    lock = threading.Lock()
+
+    def job(threads):
+        with budget.reserve(threads) as reserved:
+            with lock:
+                held.append(reserved)
+                peak.append(sum(held))
+            time.sleep(0.01)
+            with lock:
+                held.remove(reserved)
+
+    workers = [threading.Thread(target=job, args=(n,)) for n in [4, 3, 2, 6, 1, 5, 2, 3] * 3]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=10)
+    assert not any(worker.is_alive() for worker in workers)
+    assert max(peak) <= 6
+    assert budget.get_stats()['available'] == 6
+
+def test_single_decode_threads_per_output():
+    """-threads 是逐輸出選項: 每個輸出都帶一份，按輸出數均分預留（每個至少 1）"""
+    from services.v1.video.split import build_single_decode_command
+
+    segments = [(0, 10), (20, 30), (40, 50)]
+    outputs = ['a.mp4', 'b.mp4', 'c.mp4']
+    cmd = build_single_decode_command('input.mp4', segments, outputs, threads=8)
+    thread_values = [int(cmd[i + 1]) for i, arg in enumerate(cmd) if arg == '-threads']
+    assert thread_values == [2, 2, 2]
+    # 每個 -threads 都在它所屬輸出的文件名之前、上一個輸出之後
+    positions = [cmd.index(output) for output in outputs]
+    threads_positions = [i for i, arg in enumerate(cmd) if arg == '-threads']
+    assert all(prev < pos < out for prev, pos, out in zip([0] + positions, threads_positions, positions))
+
+    cmd = build_single_decode_command('input.mp4', segments, outputs, threads=2)
+    assert [cmd[i + 1] for i, arg in enumerate(cmd) if arg == '-threads'] == ['1', '1', '1']
+    assert '-threads' not in build_single_decode_command('input.mp4', segments, outputs)
+
+if __name__ == '__main__':
+    import pytest
+    raise SystemExit(pytest.main(['-q', __file__]))
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試 /v1/video/cut 的 filter 引擎: 有無視頻流時生成的 concat 濾鏡圖
+用法: python -m pytest -q test_cut_engines.py
+"""
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from services.v1.video.cut import build_filter_cut_command
+
+needs_ffmpeg = pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='ffmpeg not installed')
+
+SEGMENTS = [(0.0, 1.0), (2.0, 3.5)]
+
+def option(cmd, name):
+    return cmd[cmd.index(name) + 1]
+
+def test_filter_graph_with_video_and_audio():
+    cmd = build_filter_cut_command('input.mp4', SEGMENTS, 'out.mp4')
+    graph = option(cmd, '-filter_complex')
+    assert '[0:v:0]setpts=PTS-STARTPTS[v0]' in graph
+    assert graph.endswith('concat=n=2:v=1:a=1[outv][outa]')
+    assert option(cmd, '-c:v') == 'libx264'
+
+def test_filter_graph_for_audio_only_source():
+    """沒有視頻流時只拼接音頻，不映射也不編碼視頻"""
+    cmd = build_filter_cut_command('input.m4a', SEGMENTS, 'out.m4a', has_video=False)
+    graph = option(cmd, '-filter_complex')
+    assert ':v:' not in graph
+    assert graph.endswith('[a0][a1]concat=n=2:v=0:a=1[outa]')
+    assert '[outv]' not in cmd
+    assert option(cmd, '-map') == '[outa]'
+    for video_option in ('-c:v', '-pix_fmt', '-vsync', '-r'):
+        assert video_option not in cmd
+
+@needs_ffmpeg
+def test_filter_cut_runs_on_audio_only_source(tmp_path):
+    source = str(tmp_path / 'input.m4a')
+    output = str(tmp_path / 'out.m4a')
+    subprocess.run([
+        'ffmpeg', '-y', '-f', 'lavfi', '-i', 'sine=frequency=440:duration=5',
+        '-c:a', 'aac', source
+    ], check=True, capture_output=True)
+
+    cmd = build_filter_cut_command(source, SEGMENTS, output, has_video=False)
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+    duration = subprocess.run([
+        'ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+        '-of', 'default=noprint_wrappers=1:nokey=1', output
+    ], capture_output=True, text=True, check=True).stdout
+    assert float(duration) == pytest.approx(2.5, abs=0.1)
+    assert os.path.getsize(output) > 0
+
+if __name__ == '__main__':
+    raise SystemExit(pytest.main(['-q', __file__]))
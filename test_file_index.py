@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試 FileIndex: 變體查找、未命中時後台重掃且不阻塞請求
+用法: python -m pytest -q test_file_index.py
+"""
+
+import os
+import time
+import threading
+
+import pytest
+
+from services.file_index import FileIndex
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'w').close()
+
+def test_prefers_nca_layout(tmp_path):
+    root = str(tmp_path)
+    touch(os.path.join(root, 'video', 'clip_trim_1.mp4'))
+    touch(os.path.join(root, 'nca', 'video', 'clip_cut_2.mp4'))
+    touch(os.path.join(root, 'other', 'clip_process_3.mp4'))
+    index = FileIndex(root=root, refresh_seconds=0)
+    assert index.find_variant('video', 'clip.mp4') == os.path.join(root, 'nca', 'video', 'clip_cut_2.mp4')
+    assert index.find_variant('video', 'clip.mov') is None
+
+def test_miss_does_not_wait_for_the_rescan(tmp_path):
+    """未命中立即返回 None，重掃在後台進行，完成後能找到其他進程寫入的文件"""
+    root = str(tmp_path)
+    index = FileIndex(root=root, refresh_seconds=0)
+    index.build()
+
+    release = threading.Event()
+    scan = index._scan
+
+    def slow_scan():
+        release.wait(5)
+        return scan()
+
+    index._scan = slow_scan
+    path = os.path.join(root, 'nca', 'video', 'late_trim_1.mp4')
+    touch(path)
+    # 掃描被阻塞時查找也會返回，說明沒有在請求線程上掃描
+    assert index.find_variant('video', 'late.mp4') is None
+    assert index.get_stats()['refreshing']
+    # 已有重掃在進行時不再啟動新的
+    assert index.refresh_async() is None
+
+    release.set()
+    for _ in range(100):
+        if not index.get_stats()['refreshing']:
+            break
+        time.sleep(0.05)
+    assert index.find_variant('video', 'late.mp4') == path
+
+def test_refresh_is_rate_limited(tmp_path):
+    index = FileIndex(root=str(tmp_path), refresh_seconds=3600)
+    index.build()
+    assert index.refresh_async() is None
+
+def test_add_during_scan_is_kept(tmp_path):
+    """掃描期間 add() 的文件在掃描結果替換索引後仍然保留"""
+    root = str(tmp_path)
+    index = FileIndex(root=root, refresh_seconds=0)
+    added = os.path.join(root, 'nca', 'video', 'new_trim_1.mp4')
+    scan = index._scan
+
+    def scan_then_add():
+        paths = scan()
+        touch(added)
+        index.add(added)
+        return paths
+
+    index._scan = scan_then_add
+    index.build()
+    index._scan = scan
+    assert index.find_variant('video', 'new.mp4') == added
+
+if __name__ == '__main__':
+    raise SystemExit(pytest.main(['-q', __file__]))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試 IntervalSet: 重疊區間合併、相接區間保持分開，以及與逐對比較的隨機對照
+用法: python -m pytest -q test_intervals.py
+"""
+
+import random
+
+from services.intervals import IntervalSet
+
+def brute_overlaps(intervals, start, end, inclusive=False):
+    """逐對比較，與 IntervalSet 之前的實現相同"""
+    if inclusive:
+        return any(start <= e and end >= s for s, e in intervals)
+    return any(start < e and end > s for s, e in intervals)
+
+def test_overlapping_intervals_are_merged():
+    """重疊的區間合併為一個，輸入順序無關"""
+    assert list(IntervalSet([(5, 8), (0, 2), (1, 3), (2.5, 4)])) == [(0, 4), (5, 8)]
+    assert list(IntervalSet([(0, 10), (2, 3)])) == [(0, 10)]
+
+def test_touching_intervals_stay_apart():
+    """只相接的區間不合併，相接點上的零長度區間不算重疊"""
+    intervals = IntervalSet([(0, 1), (1, 2)])
+    assert len(intervals) == 2
+    assert not intervals.overlaps(1, 1)
+    assert intervals.overlaps(1, 1, inclusive=True)
+
+def test_boundaries():
+    """exclusive 模式下端點相接不重疊，inclusive 模式下重疊"""
+    intervals = IntervalSet([(10, 20)])
+    assert not intervals.overlaps(5, 10)
+    assert not intervals.overlaps(20, 25)
+    assert intervals.overlaps(5, 10, inclusive=True)
+    assert intervals.overlaps(20, 25, inclusive=True)
+    assert intervals.overlaps(19.9, 30)
+    assert intervals.overlaps(12, 13)
+    assert intervals.overlaps(0, 100)
+
+def test_empty_set():
+    intervals = IntervalSet()
+    assert len(intervals) == 0
+    assert not intervals.overlaps(0, 1)
+    assert not intervals.overlaps(0, 1, inclusive=True)
+
+def test_matches_pairwise_check():
+    """隨機區間與查詢，結果與逐對比較一致（整數端點以覆蓋相接的情況）"""
+    rng = random.Random(1234)
+    for _ in range(300):
+        intervals = []
+        for _ in range(rng.randint(0, 12)):
+            start = rng.randint(0, 50)
+            intervals.append((start, start + rng.randint(0, 8)))
+        interval_set = IntervalSet(intervals)
+        for _ in range(100):
+            start = rng.randint(-2, 60)
+            end = start + rng.randint(0, 6)
+            for inclusive in (False, True):
+                assert interval_set.overlaps(start, end, inclusive) == brute_overlaps(intervals, start, end, inclusive), \
+                    (intervals, start, end, inclusive)
+
+if __name__ == '__main__':
+    import pytest
+    raise SystemExit(pytest.main(['-q', __file__]))
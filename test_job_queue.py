@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試 JobQueue: 沒有 webhook_url 時同步返回結果，帶 webhook_url 時入隊返回 202，
+記錄狀態或發送 webhook 失敗時工作線程繼續運行
+用法: python -m pytest -q test_job_queue.py
+"""
+
+import time
+
+import pytest
+from flask import Flask
+
+import services.job_queue as job_queue
+
+@pytest.fixture
+def client(monkeypatch):
+    statuses = []
+    webhooks = []
+
+    def failing_log(job_id, status):
+        statuses.append(status["job_status"])
+        if status["job_status"] in ("done", "failed"):
+            raise RuntimeError("database unavailable")
+
+    def failing_webhook(url, response):
+        webhooks.append(response["code"])
+        raise RuntimeError("webhook unreachable")
+
+    monkeypatch.setattr(job_queue, "log_job_status", failing_log)
+    monkeypatch.setattr(job_queue, "send_webhook", failing_webhook)
+
+    app = Flask(__name__)
+    queue = job_queue.JobQueue(app, workers=1)
+    queue.start()
+
+    @app.route('/task', methods=['POST'])
+    @queue.queue_task()
+    def task(job_id, data):
+        if data.get("fail"):
+            raise ValueError("ffmpeg failed")
+        return {"ok": True}, "/task", 200
+
+    return app.test_client(), queue, statuses, webhooks
+
+def wait_until_idle(queue):
+    for _ in range(100):
+        if queue.task_queue.unfinished_tasks == 0:
+            return
+        time.sleep(0.02)
+
+def test_without_webhook_runs_synchronously(client):
+    test_client, queue, statuses, webhooks = client
+    response = test_client.post('/task', json={})
+    assert response.status_code == 200
+    assert response.get_json()["response"] == {"ok": True}
+    assert statuses == ["running", "done"]
+    assert webhooks == []
+
+def test_with_webhook_is_queued(client):
+    test_client, queue, statuses, webhooks = client
+    response = test_client.post('/task', json={"webhook_url": "http://example.com/hook"})
+    assert response.status_code == 202
+    wait_until_idle(queue)
+    assert statuses == ["queued", "running", "done"]
+    assert webhooks == [200]
+
+def test_worker_survives_failed_status_and_webhook(client):
+    """任務失敗後記錄狀態和發送 webhook 都拋錯，工作線程仍處理下一個任務"""
+    test_client, queue, statuses, webhooks = client
+    hook = {"webhook_url": "http://example.com/hook"}
+    assert test_client.post('/task', json=dict(hook, fail=True)).status_code == 202
+    assert test_client.post('/task', json=hook).status_code == 202
+    wait_until_idle(queue)
+    assert webhooks == [500, 200]
+    assert all(thread.is_alive() for thread in queue.threads)
+    assert queue.get_stats()["active_jobs"] == 0
+
+if __name__ == '__main__':
+    raise SystemExit(pytest.main(['-q', __file__]))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試輸出文件的放置方式: 只有臨時目錄中的文件才會被移走或硬鏈接，其他文件複製
+用法: python -m pytest -q test_output_file_manager.py
+"""
+
+import os
+
+import pytest
+
+import services.output_file_manager as output_file_manager
+from services.output_file_manager import place_file, _is_temp_path
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    work = tmp_path / 'work'
+    user = tmp_path / 'user_templates'
+    target = tmp_path / 'output'
+    for path in (work, user, target):
+        path.mkdir()
+    monkeypatch.setattr(output_file_manager, 'LOCAL_STORAGE_PATH', str(work))
+    monkeypatch.setattr(output_file_manager.tempfile, 'gettempdir', lambda: str(tmp_path / 'system_tmp'))
+    return work, user, target
+
+def write_file(path, content=b'data'):
+    with open(path, 'wb') as f:
+        f.write(content)
+    return str(path)
+
+def test_temp_detection_uses_real_directories(dirs):
+    """路徑中含 temp 字樣不等於臨時文件，只比較實際的臨時目錄"""
+    work, user, target = dirs
+    assert _is_temp_path(os.path.join(str(work), 'job_output.mp4'))
+    assert _is_temp_path(os.path.join(str(work), 'sub', '..', 'job_output.mp4'))
+    assert not _is_temp_path(os.path.join(str(user), 'job_output.mp4'))
+    assert not _is_temp_path(str(work) + '_other/job_output.mp4')
+
+def test_kept_temp_file_is_hardlinked(dirs):
+    work, user, target = dirs
+    source = write_file(work / 'job.mp4')
+    target_path = str(target / 'job.mp4')
+    assert place_file(source, target_path, keep_source=True) == 'hardlink'
+    assert os.path.samefile(source, target_path)
+
+def test_kept_user_file_is_copied(dirs):
+    """非臨時文件不硬鏈接，之後修改源文件不影響輸出"""
+    work, user, target = dirs
+    source = write_file(user / 'template.mp4')
+    target_path = str(target / 'template.mp4')
+    assert place_file(source, target_path, keep_source=True) == 'copy'
+    assert not os.path.samefile(source, target_path)
+    write_file(source, b'changed')
+    with open(target_path, 'rb') as f:
+        assert f.read() == b'data'
+
+def test_unkept_file_is_renamed(dirs):
+    work, user, target = dirs
+    source = write_file(work / 'job.mp4')
+    target_path = str(target / 'job.mp4')
+    assert place_file(source, target_path, keep_source=False) == 'rename'
+    assert not os.path.exists(source)
+
+if __name__ == '__main__':
+    raise SystemExit(pytest.main(['-q', __file__]))
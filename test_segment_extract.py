@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試 smart 模式剪切: 只重編碼邊界 GOP，中間 GOP 直接複製，輸出需能完整解碼
+命令結構的測試不需要 ffmpeg；實際剪切的測試需要 ffmpeg/ffprobe，未安裝時跳過
+用法: python -m pytest -q test_segment_extract.py
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+
+import pytest
+
+from services.media_probe import MediaProber, ProbeResult
+from services.v1.video import segment_extract
+from services.v1.video.segment_extract import extract_segment_smart
+
+needs_ffmpeg = pytest.mark.skipif(
+    not (shutil.which('ffmpeg') and shutil.which('ffprobe')), reason="需要 ffmpeg 和 ffprobe"
+)
+
+CLIP_SECONDS = 6
+FPS = 25
+
+def generate_clip(path):
+    """生成每秒一個關鍵幀、帶音頻的測試片段"""
+    cmd = [
+        'ffmpeg', '-y', '-v', 'error',
+        '-f', 'lavfi', '-i', f'testsrc2=size=320x240:rate={FPS}',
+        '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=48000',
+        '-t', str(CLIP_SECONDS),
+        '-c:v', 'libx264', '-g', str(FPS), '-keyint_min', str(FPS), '-sc_threshold', '0',
+        '-c:a', 'aac',
+        path
+    ]
+    subprocess.run(cmd, check=True, capture_output=True)
+
+def decode_errors(path):
+    """完整解碼文件，返回 ffmpeg 報告的錯誤"""
+    process = subprocess.run(
+        ['ffmpeg', '-v', 'error', '-xerror', '-i', path, '-f', 'null', '-'],
+        capture_output=True, text=True
+    )
+    return process.returncode, process.stderr.strip()
+
+def stream_duration(path, stream):
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-select_streams', stream, '-show_entries', 'stream=duration',
+         '-of', 'csv=p=0', path],
+        capture_output=True, text=True, check=True
+    )
+    return float(result.stdout.strip())
+
+def frame_hashes(path):
+    """逐幀解碼後的 MD5，按顯示順序"""
+    result = subprocess.run(
+        ['ffmpeg', '-v', 'error', '-i', path, '-map', '0:v:0', '-f', 'framemd5', '-'],
+        capture_output=True, text=True, check=True
+    )
+    return [line.rsplit(',', 1)[1].strip() for line in result.stdout.splitlines() if not line.startswith('#')]
+
+def fake_probe(has_audio=True):
+    keyframes = [float(i) for i in range(CLIP_SECONDS)]
+    return ProbeResult(
+        format={'duration': str(CLIP_SECONDS)},
+        streams=[{'codec_type': 'video', 'codec_name': 'h264', 'profile': 'High', 'level': 30,
+                  'pix_fmt': 'yuv420p', 'time_base': '1/12800'}]
+                + ([{'codec_type': 'audio', 'codec_name': 'aac'}] if has_audio else []),
+        keyframes=keyframes
+    )
+
+def record_commands(monkeypatch):
+    """用記錄命令的假 _run 代替 ffmpeg，並創建命令輸出的文件"""
+    commands = []
+
+    def fake_run(cmd, description):
+        commands.append(cmd)
+        output = cmd[-1]
+        for path in ([output.replace('%d', '0'), output.replace('%d', '1')] if '%d' in output else [output]):
+            open(path, 'w').close()
+
+    monkeypatch.setattr(segment_extract, '_run', fake_run)
+    return commands
+
+def option(cmd, name):
+    return cmd[cmd.index(name) + 1] if name in cmd else None
+
+def test_smart_cut_copies_the_middle_gops(monkeypatch, tmp_path):
+    """只有邊界的半個 GOP 被編碼；關鍵幀之間的部分以 -c:v copy 寫成 MPEG-TS，最後一次複製拼接"""
+    commands = record_commands(monkeypatch)
+    temp_files = extract_segment_smart(
+        'source.mp4', 0.52, 4.36, str(tmp_path / 'output.mp4'), fake_probe(), str(tmp_path / 'piece')
+    )
+    copy_cmd, head_cmd, tail_cmd, join_cmd = commands
+
+    assert option(copy_cmd, '-c:v') == 'copy'
+    assert (option(copy_cmd, '-ss'), option(copy_cmd, '-segment_times')) == ('1.0', '3.0')
+    assert option(copy_cmd, '-segment_format') == 'mpegts'
+
+    for cmd, (start, end) in ((head_cmd, (0.52, 1.0)), (tail_cmd, (4.0, 4.36))):
+        assert option(cmd, '-c:v') == 'libx264'
+        assert float(option(cmd, '-ss')) == start
+        assert abs(float(option(cmd, '-t')) - (end - start)) < 1e-9
+        assert option(cmd, '-f') == 'mpegts' and cmd[-1].endswith('.ts')
+
+    # 拼接不重編碼視頻，音頻按整個範圍編碼一次
+    assert option(join_cmd, '-f') == 'concat'
+    assert option(join_cmd, '-c:v') == 'copy' and option(join_cmd, '-c:a') == 'aac'
+    assert join_cmd[-1] == str(tmp_path / 'output.mp4')
+    with open(option(join_cmd, '-i')) as f:
+        assert [line.split("'")[1].rsplit('_', 1)[1] for line in f] == ['head.ts', 'middle.ts', 'tail.ts']
+    assert all(str(tmp_path) in path for path in temp_files)
+
+def test_smart_cut_without_audio(monkeypatch, tmp_path):
+    """include_audio=False 或源沒有音頻時只拼接視頻"""
+    for probe_result, include_audio in ((fake_probe(), False), (fake_probe(has_audio=False), True)):
+        commands = record_commands(monkeypatch)
+        extract_segment_smart('source.mp4', 0.52, None, str(tmp_path / 'output.ts'), probe_result,
+                              str(tmp_path / 'piece'), include_audio=include_audio)
+        join_cmd = commands[-1]
+        assert join_cmd.count('-i') == 1 and '-c:a' not in join_cmd
+
+def test_smart_cut_without_inner_keyframe(monkeypatch, tmp_path):
+    """範圍內沒有關鍵幀時整段重編碼，不產生中間文件"""
+    commands = record_commands(monkeypatch)
+    assert extract_segment_smart('source.mp4', 1.2, 1.8, str(tmp_path / 'output.mp4'), fake_probe(),
+                                 str(tmp_path / 'piece')) == []
+    assert len(commands) == 1 and option(commands[0], '-c:v') == 'libx264'
+
+@needs_ffmpeg
+@pytest.mark.parametrize('start, end', [
+    (0.52, 4.36),   # 頭尾都在 GOP 中間
+    (1.0, 4.36),    # 起點在關鍵幀上
+    (0.52, None),   # 剪到文件末尾
+])
+def test_smart_cut_decodes_cleanly(start, end):
+    """smart 剪切的輸出無解碼錯誤，音視頻時長與請求範圍一致"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source = os.path.join(temp_dir, 'source.mp4')
+        output = os.path.join(temp_dir, 'output.mp4')
+        generate_clip(source)
+
+        probe_result = MediaProber(cache_dir=os.path.join(temp_dir, 'probe')).probe(source, keyframes=True)
+        temp_files = extract_segment_smart(
+            source, start, end, output, probe_result, os.path.join(temp_dir, 'piece')
+        )
+        for temp_file in temp_files:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+        returncode, errors = decode_errors(output)
+        assert returncode == 0 and not errors, errors
+
+        expected = (end if end is not None else CLIP_SECONDS) - start
+        assert abs(stream_duration(output, 'v:0') - expected) <= 2 / FPS
+        assert abs(stream_duration(output, 'a:0') - expected) <= 0.05
+
+@needs_ffmpeg
+def test_smart_cut_output_contains_source_frames():
+    """中間 GOP 是複製的: 解碼後逐幀與源完全相同（重編碼的邊界幀則不同）"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source = os.path.join(temp_dir, 'source.mp4')
+        output = os.path.join(temp_dir, 'output.mp4')
+        generate_clip(source)
+
+        probe_result = MediaProber(cache_dir=os.path.join(temp_dir, 'probe')).probe(source, keyframes=True)
+        extract_segment_smart(source, 0.52, 4.36, output, probe_result, os.path.join(temp_dir, 'piece'))
+
+        source_frames = frame_hashes(source)
+        output_frames = frame_hashes(output)
+        # 頭部 [0.52, 1.0) 12 幀重編碼，[1.0, 4.0) 的 75 幀複製，尾部 [4.0, 4.36) 9 幀重編碼
+        assert len(output_frames) == 12 + 75 + 9
+        assert output_frames[12:87] == source_frames[25:100]
+        assert output_frames[:12] != source_frames[13:25]
+
+if __name__ == '__main__':
+    raise SystemExit(pytest.main(['-q', __file__]))
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試存儲用量賬本: 多個進程共用賬本文件、對賬期間的增量重放、刪除時扣減
+用法: python -m pytest -q test_storage_ledger.py
+"""
+
+import os
+import time
+
+import pytest
+
+from services.storage_manager import StorageManager
+
+@pytest.fixture
+def storage_dirs(tmp_path, monkeypatch):
+    paths = {}
+    for name in ('LOCAL_STORAGE_PATH', 'WHISPER_CACHE_DIR', 'VOICE_CLONE_DIR', 'DIGITAL_HUMAN_DIR'):
+        path = tmp_path / name.lower()
+        path.mkdir()
+        monkeypatch.setenv(name, str(path))
+        paths[name] = str(path)
+    return paths
+
+def make_manager(tmp_path):
+    return StorageManager(ledger_path=str(tmp_path / 'ledger.json'))
+
+def write_file(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+
+def usage(manager, path):
+    entry = manager.get_storage_usage()["paths"][path]
+    return entry["size_bytes"], entry["file_count"]
+
+def test_workers_share_the_ledger(tmp_path, storage_dirs):
+    """一個 worker 記錄的增量，另一個 worker 讀取時可見"""
+    output = storage_dirs['LOCAL_STORAGE_PATH']
+    worker_a, worker_b = make_manager(tmp_path), make_manager(tmp_path)
+    worker_a.reconcile_usage()
+
+    path = os.path.join(output, 'nca', 'video', 'a.mp4')
+    write_file(path, 100)
+    worker_a.record_file_added(path)
+    assert usage(worker_b, output) == (100, 1)
+
+    os.remove(path)
+    worker_b.record_file_removed(path, 100)
+    assert usage(worker_a, output) == (0, 0)
+
+def test_reconcile_replays_deltas_recorded_during_the_scan(tmp_path, storage_dirs):
+    """掃描期間的增量只在掃描沒看到時重放，結果與磁盤一致"""
+    output = storage_dirs['LOCAL_STORAGE_PATH']
+    scanner, worker = make_manager(tmp_path), make_manager(tmp_path)
+    early_removed = os.path.join(output, 'early_removed.bin')
+    late_removed = os.path.join(output, 'late_removed.bin')
+    write_file(early_removed, 10)
+    write_file(late_removed, 20)
+    write_file(os.path.join(output, 'kept.bin'), 30)
+    scanner.reconcile_usage()
+    assert usage(scanner, output) == (60, 3)
+
+    early_added = os.path.join(output, 'early_added.bin')
+    late_added = os.path.join(output, 'late_added.bin')
+    scan_directory = scanner._scan_directory
+
+    def scan_with_concurrent_writes(directory, listed_at=None):
+        if directory != output:
+            return scan_directory(directory, listed_at)
+        # 目錄列出之前: 掃描會看到新文件、看不到刪掉的文件
+        write_file(early_added, 40)
+        worker.record_file_added(early_added)
+        os.remove(early_removed)
+        worker.record_file_removed(early_removed, 10)
+        # 其他 worker 不能同時開始掃描
+        assert worker.reconcile_usage(wait=False) is None
+        time.sleep(0.01)
+        result = scan_directory(directory, listed_at)
+        time.sleep(0.01)
+        # 目錄列出之後: 掃描沒看到新文件、已計入刪掉的文件
+        write_file(late_added, 50)
+        worker.record_file_added(late_added)
+        os.remove(late_removed)
+        worker.record_file_removed(late_removed, 20)
+        return result
+
+    scanner._scan_directory = scan_with_concurrent_writes
+    scanner.reconcile_usage()
+    assert usage(worker, output) == (30 + 40 + 50, 3)
+    assert usage(worker, output) == scan_directory(output)
+
+def test_cleanup_records_removed_files(tmp_path, storage_dirs):
+    output = storage_dirs['LOCAL_STORAGE_PATH']
+    manager = make_manager(tmp_path)
+    manager.temp_dir = os.path.join(output, 'temp')
+    old_file = os.path.join(manager.temp_dir, 'old.tmp')
+    write_file(old_file, 70)
+    write_file(os.path.join(manager.temp_dir, 'new.tmp'), 5)
+    os.utime(old_file, (time.time() - 48 * 3600,) * 2)
+    manager.reconcile_usage()
+
+    result = manager.cleanup_temp_files(max_age_hours=24)
+    assert result["cleaned_files"] == 1
+    assert usage(manager, output) == (5, 1)
+
+def test_moved_source_is_debited_only_when_counted(tmp_path, storage_dirs):
+    """移走的源文件只有在上次掃描前已存在時才扣減"""
+    output = storage_dirs['LOCAL_STORAGE_PATH']
+    manager = make_manager(tmp_path)
+    counted = os.path.join(output, 'job_counted.mp4')
+    write_file(counted, 10)
+    os.utime(counted, (time.time() - 3600,) * 2)
+    manager.reconcile_usage()
+
+    target = os.path.join(output, 'nca', 'video', 'counted.mp4')
+    os.makedirs(os.path.dirname(target))
+    source_mtime = os.stat(counted).st_mtime
+    os.replace(counted, target)
+    manager.record_file_moved(counted, target, 10, source_mtime)
+    assert usage(manager, output) == (10, 1)
+
+    # 對賬之後寫入的任務輸出沒有計入賬本，移走時不扣減
+    uncounted = os.path.join(output, 'job_new.mp4')
+    write_file(uncounted, 20)
+    target = os.path.join(output, 'nca', 'video', 'new.mp4')
+    source_mtime = os.stat(uncounted).st_mtime
+    os.replace(uncounted, target)
+    manager.record_file_moved(uncounted, target, 20, source_mtime)
+    assert usage(manager, output) == (30, 2)
+
+if __name__ == '__main__':
+    raise SystemExit(pytest.main(['-q', __file__]))
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試轉錄緩存鍵: 計算類型和是否分塊轉錄不同時不共用緩存
+用法: python -m pytest -q test_transcription_cache.py
+"""
+
+import pytest
+
+import services.ass_toolkit as ass_toolkit
+from services.transcription_cache import TranscriptionCache
+
+def test_key_covers_compute_type_and_chunking():
+    base = TranscriptionCache.make_key('hash', 'small', 'en', compute_type='int8', chunked=False)
+    assert base == TranscriptionCache.make_key('hash', 'small', 'en', compute_type='int8', chunked=False)
+    assert base != TranscriptionCache.make_key('hash', 'small', 'en', compute_type='float16', chunked=False)
+    assert base != TranscriptionCache.make_key('hash', 'small', 'en', compute_type='int8', chunked=True)
+
+@pytest.fixture
+def transcriber(tmp_path, monkeypatch):
+    runs = []
+
+    def fake_run(video_path, language, chunked):
+        runs.append(chunked)
+        return {"text": "chunked" if chunked else "whole", "segments": [], "language": "en"}
+
+    monkeypatch.setattr(ass_toolkit, 'transcription_cache', TranscriptionCache(cache_dir=str(tmp_path / 'cache')))
+    monkeypatch.setattr(ass_toolkit, 'content_hash', lambda path: 'a' * 64)
+    monkeypatch.setattr(ass_toolkit, 'get_duration', lambda path: 60.0)
+    monkeypatch.setattr(ass_toolkit, '_run_transcription', fake_run)
+    return runs
+
+def test_chunked_and_whole_file_results_are_cached_separately(transcriber):
+    """同一媒體先整體轉錄後分塊轉錄，第二次不能命中整體轉錄的緩存"""
+    runs = transcriber
+    assert ass_toolkit.generate_transcription('video.mp4', chunked=False)["text"] == "whole"
+    assert ass_toolkit.generate_transcription('video.mp4', chunked=True)["text"] == "chunked"
+    assert ass_toolkit.generate_transcription('video.mp4', chunked=True)["text"] == "chunked"
+    assert runs == [False, True]
+
+def test_automatic_chunking_is_decided_before_the_lookup(transcriber, monkeypatch):
+    runs = transcriber
+    monkeypatch.setattr(ass_toolkit, 'CHUNKED_TRANSCRIPTION_MIN_SECONDS', 30)
+    assert ass_toolkit.generate_transcription('video.mp4')["text"] == "chunked"
+    assert ass_toolkit.generate_transcription('video.mp4', chunked=True)["text"] == "chunked"
+    assert runs == [True]
+
+if __name__ == '__main__':
+    raise SystemExit(pytest.main(['-q', __file__]))